@@ -1,18 +1,35 @@
 import os
 import warnings
+import threading
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
 
 
 warnings.filterwarnings("ignore", category=UserWarning)
 load_dotenv()
 
-# Initialize the Azure OpenAI LLM
-llm = AzureChatOpenAI(
-    openai_api_key=os.getenv("OPENAI_API_KEY"),
-    api_version=os.getenv("OPENAI_API_VERSION"),
-    azure_endpoint=os.getenv("OPENAI_ENDPOINT"),
-    model="gpt-4o",
-    temperature=0
-    # timeout=None
-)
+_llm_lock = threading.Lock()
+
+
+def _build_llm():
+    """Initialize the Azure OpenAI LLM."""
+    from langchain_openai import AzureChatOpenAI
+
+    return AzureChatOpenAI(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        api_version=os.getenv("OPENAI_API_VERSION"),
+        azure_endpoint=os.getenv("OPENAI_ENDPOINT"),
+        model="gpt-4o",
+        temperature=0
+        # timeout=None
+    )
+
+
+def __getattr__(name: str):
+    # `llm` is built on first use, so tools that never call the model (e.g. `python -m agents.loader`)
+    # don't need the Azure OpenAI credentials. Assigning `agents.llm` beforehand replaces it.
+    if name == "llm":
+        with _llm_lock:
+            if "llm" not in globals():
+                globals()["llm"] = _build_llm()
+        return globals()["llm"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
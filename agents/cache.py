@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import weakref
+
+
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", ".cache/query_cache.db")
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1000"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "86400"))  # seconds, 0 disables expiry
+
+# Live caches of the process, their hit/miss counters are exported by agents.metrics
+cache_instances = weakref.WeakSet()
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a user question so trivially different phrasings share a cache entry.
+
+    Args:
+        question (str): The raw user question.
+
+    Returns:
+        str: Lower-cased question with collapsed whitespace and no trailing punctuation.
+    """
+    question = re.sub(r"\s+", " ", (question or "").strip().lower())
+    return question.rstrip(" ?.!")
+
+
+def fingerprint(text: str) -> str:
+    """Short, stable fingerprint of a piece of text (e.g. a schema context)."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def make_key(*parts: str) -> str:
+    """Build a cache key out of several parts."""
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class PersistentCache():
+    """LRU/TTL key-value cache persisted to a local SQLite file."""
+
+    def __init__(self, namespace: str, path: str = QUERY_CACHE_PATH,
+                 max_entries: int = QUERY_CACHE_MAX_ENTRIES, ttl: float = QUERY_CACHE_TTL):
+        """
+        Initialize the cache.
+
+        Args:
+            namespace (str): Logical name of the cache, entries of different namespaces never collide.
+            path (str): Path of the SQLite file backing the cache.
+            max_entries (int): Maximum number of entries kept for this namespace (least recently used are evicted).
+            ttl (float): Time to live of an entry in seconds, 0 disables expiry.
+        """
+
+        self.namespace = namespace
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        cache_instances.add(self)
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+
+
+    def get(self, key: str):
+        """
+        Look up a cached value.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            The cached value, or None on a miss or when the entry expired.
+        """
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+            self.hits += 1
+        return json.loads(row[0])
+
+
+    def set(self, key: str, value) -> None:
+        """
+        Store a JSON serializable value and evict the least recently used entries above `max_entries`.
+
+        Args:
+            key (str): The cache key.
+            value: The value to cache.
+        """
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now, now)
+            )
+            self._conn.execute(
+                """DELETE FROM cache WHERE namespace = ? AND key NOT IN (
+                    SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT ?
+                )""",
+                (self.namespace, self.namespace, self.max_entries)
+            )
+
+
+    def invalidate(self, *args) -> None:
+        """
+        Drop every entry of this namespace, e.g. when the schema changed.
+        Accepts (and ignores) positional arguments so it can be registered as a change callback.
+        """
+
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current size of the cache."""
+
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        return {"namespace": self.namespace, "hits": self.hits, "misses": self.misses, "size": size}
@@ -1,22 +1,91 @@
 import os
+import zlib
+import base64
 import warnings
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import plotly.io as pio
+from plotly.io.json import to_json_plotly
+from plotly.basedatatypes import BaseFigure
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_experimental.tools import PythonAstREPLTool
 from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
 from agents import llm
+from agents.cache import PersistentCache, normalize_question, make_key
+from agents.results import schema_fingerprint
+from agents.chart_spec import resolve_chart_spec, build_chart, CHART_SPEC_MIN_CONFIDENCE
+from agents.metrics import timed, llm_config
+from agents.sandbox import get_sandbox, SandboxError
 
 
 warnings.filterwarnings("ignore", category=UserWarning)
 load_dotenv()
 
+# Generated plotting code, keyed on the prompt and the columns/dtypes of `df`
+chart_code_cache = PersistentCache(namespace="chart_code")
 
-def create_chart(user_prompt: str, df: pd.DataFrame):
-    fig = ""
-    tool = PythonAstREPLTool(locals={"fig": fig}, globals={"df": df})
+# Points kept per scatter/line trace of a chart response, larger traces are downsampled (0 disables)
+CHART_MAX_TRACE_POINTS = int(os.getenv("CHART_MAX_TRACE_POINTS", "5000"))
+# zlib level of the figure payload
+CHART_COMPRESSION_LEVEL = int(os.getenv("CHART_COMPRESSION_LEVEL", "6"))
+
+# Trace attributes holding one value per point, reduced together with x and y
+_PER_POINT_ATTRIBUTES = ("x", "y", "text", "hovertext", "customdata", "ids", "marker.color", "marker.size",
+                         "marker.symbol", "marker.opacity", "error_x.array", "error_y.array")
+
+
+def _run_chart_code(code: str, df: pd.DataFrame):
+    """
+    Run plotting code against `df` in the chart sandbox and return the figure it builds, or None.
+    The code is evaluated like `PythonAstREPLTool` does, when it ends with an assignment the figure is read from `fig`.
+    """
+
+    try:
+        return get_sandbox().run(code, df)
+    except SandboxError as e:
+        print(" ❌ Chart code run failed:", e)
+        return None
+
+
+@timed("create_chart")
+def generate_chart(user_prompt: str, df: pd.DataFrame) -> tuple:
+    """
+    Create a Plotly figure for the user prompt.
+    Common requests are built locally from a resolved chart spec, otherwise cached code is reused when the
+    prompt was already answered for a DataFrame with the same columns and dtypes, and only then the LLM is asked.
+
+    Args:
+        user_prompt (str): The user's question or prompt for the chart.
+        df (pd.DataFrame): The data to plot.
+
+    Returns:
+        tuple: The Plotly figure and the Python code used to create it.
+
+    Raises:
+        ValueError: If the generated code doesn't produce a figure.
+    """
+
+    spec = resolve_chart_spec(user_prompt, df)
+    if spec and spec["confidence"] >= CHART_SPEC_MIN_CONFIDENCE:
+        try:
+            fig, code = build_chart(spec, df)
+            print(" Built chart from local spec.")
+            return fig, code
+        except Exception as e:
+            print(" ⚠️ Local chart spec failed, falling back to generated code:", e)
+
+    cache_key = make_key(normalize_question(user_prompt), schema_fingerprint(df))
+    cached = chart_code_cache.get(cache_key)
+    if cached:
+        fig = _run_chart_code(cached["code"], df)
+        if fig is not None:
+            print(" Chart code cache hit.")
+            return fig, cached["code"]
+        print(" ⚠️ Cached chart code failed, regenerating...")
+
+    # The tool only describes the code argument to the model, the code itself runs in the sandbox
+    tool = PythonAstREPLTool(locals={"fig": ""}, globals={"df": df})
     llm_with_tools = llm.bind_tools([tool], tool_choice=tool.name)
     parser = JsonOutputKeyToolsParser(key_name=tool.name, first_tool_only=True)
 
@@ -40,9 +109,173 @@ def create_chart(user_prompt: str, df: pd.DataFrame):
         ("human", "{question}")
     ])
     chain = prompt | llm_with_tools | parser
-    result = chain.invoke({"question": user_prompt}, verbose=True)
+    result = chain.invoke({"question": user_prompt}, config=llm_config({}, "create_chart"), verbose=True)
     # print("\n####################################\n")
     # print(result['query'])
     # print("\n####################################\n")
-    fig = tool.invoke(result['query'])
+    fig = _run_chart_code(result['query'], df)
+    if fig is None:
+        raise ValueError("The generated code did not produce a Plotly figure.")
+    chart_code_cache.set(cache_key, {"code": result['query']})
+    return fig, result['query']
+
+
+def create_chart(user_prompt: str, df: pd.DataFrame, max_points: int = CHART_MAX_TRACE_POINTS):
+    fig, _ = generate_chart(user_prompt, df)
+    downsample_figure(fig, max_points)
     return fig
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indexes of `threshold` points keeping the visual shape of a line.
+    The first and last points are kept, every bucket in between keeps the point forming the largest
+    triangle with the point kept before it and the average of the next bucket.
+
+    Args:
+        x (np.ndarray): Numeric x values, sorted.
+        y (np.ndarray): Numeric y values.
+        threshold (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Sorted indexes of the kept points.
+    """
+
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.nan_to_num(y.astype(float))
+    x = x.astype(float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(area.argmax()) if len(area) else start
+        kept[i + 1] = previous
+    return kept
+
+
+def density_sample(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Indexes of at most `max_points` points of a scatter, one per occupied cell of a square grid
+    over the data extent, so the covered area and the outliers stay visible.
+    """
+
+    side = max(int(np.sqrt(max_points)), 1)
+    cells = []
+    for values in (x.astype(float), y.astype(float)):
+        low, high = np.nanmin(values), np.nanmax(values)
+        span = (high - low) or 1.0
+        cells.append(np.clip(np.nan_to_num((values - low) / span * side, nan=0).astype(np.int64), 0, side - 1))
+    _, kept = np.unique(cells[0] * side + cells[1], return_index=True)
+    return np.sort(kept)
+
+
+def _numeric(values) -> np.ndarray:
+    """Numeric view of trace values for downsampling (dates as epoch ns, categories as positions), or None."""
+
+    values = np.asarray(values)
+    if values.dtype.kind in "iuf":
+        return values
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[ns]").astype(np.int64)
+    try:
+        return pd.to_datetime(values).values.astype(np.int64)
+    except (TypeError, ValueError):
+        return None
+
+
+def downsample_figure(fig: BaseFigure, max_points: int = CHART_MAX_TRACE_POINTS) -> dict:
+    """
+    Reduce scatter/line traces with more than `max_points` points in place: LTTB for traces drawn with
+    lines, density sampling for marker only traces. Per point attributes (text, colors, sizes...) are
+    reduced with them. Other trace types are left alone.
+
+    Args:
+        fig (BaseFigure): The figure.
+        max_points (int): Point budget per trace, 0 keeps full resolution.
+
+    Returns:
+        dict: Points before and after for every reduced trace index, empty when nothing was reduced.
+    """
+
+    reduced = {}
+    if max_points <= 0:
+        return reduced
+    for i, trace in enumerate(fig.data):
+        if trace.type not in ("scatter", "scattergl") or trace.x is None or trace.y is None:
+            continue
+        n = len(trace.y)
+        if n <= max_points or len(trace.x) != n:
+            continue
+        y = _numeric(trace.y)
+        x = _numeric(trace.x)
+        if y is None:
+            continue
+        if x is None:
+            x = np.arange(n)
+        if "lines" in (trace.mode or "lines"):
+            order = np.argsort(x, kind="stable")
+            kept = order[lttb(x[order], y[order], max_points)]
+        else:
+            kept = density_sample(x, y, max_points)
+        with fig.batch_update():
+            for path in _PER_POINT_ATTRIBUTES:
+                values = trace[path]
+                if values is not None and not isinstance(values, str) and np.ndim(values) >= 1 and len(values) == n:
+                    trace[path] = np.asarray(values)[kept]
+        reduced[i] = (n, len(kept))
+    return reduced
+
+
+def encode_figure(fig: BaseFigure, max_points: int = CHART_MAX_TRACE_POINTS) -> dict:
+    """
+    Compact transport form of a figure: oversized traces downsampled, numeric arrays as base64 typed arrays,
+    dates as epoch milliseconds on date axes, the JSON zlib compressed and base64 encoded.
+
+    Args:
+        fig (BaseFigure): The figure, modified in place by the downsampling.
+        max_points (int): Point budget per scatter/line trace, 0 keeps full resolution.
+
+    Returns:
+        dict: Envelope with the format, the compressed figure in `data`, the uncompressed size and the reduced traces.
+    """
+
+    reduced = downsample_figure(fig, max_points)
+    figure = fig.to_dict()
+    for trace in figure["data"]:
+        for axis in ("x", "y"):
+            values = trace.get(axis)
+            if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+                # plotly.js reads numbers on a date axis as epoch milliseconds
+                trace[axis] = values.astype("datetime64[ms]").astype(np.float64)
+                layout_axis = (trace.get(f"{axis}axis") or axis).replace(axis, f"{axis}axis", 1)
+                figure["layout"].setdefault(layout_axis, {}).setdefault("type", "date")
+    text = to_json_plotly(figure)
+    return {
+        "format": "plotly+zlib",
+        "data": base64.b64encode(zlib.compress(text.encode("utf-8"), CHART_COMPRESSION_LEVEL)).decode("ascii"),
+        "size": len(text),
+        "reduced": {str(i): list(points) for i, points in reduced.items()},
+    }
+
+
+def decode_figure(payload) -> BaseFigure:
+    """
+    Rebuild a figure from `encode_figure` output, or from plain figure JSON (older chart servers).
+
+    Raises:
+        ValueError: If the envelope format is unknown.
+    """
+
+    if isinstance(payload, str):
+        return pio.from_json(payload)
+    if payload.get("format") != "plotly+zlib":
+        raise ValueError(f"Unknown figure format: {payload.get('format')}")
+    return pio.from_json(zlib.decompress(base64.b64decode(payload["data"])).decode("utf-8"))
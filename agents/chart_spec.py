@@ -0,0 +1,198 @@
+import os
+import re
+import difflib
+import pandas as pd
+import plotly.express as px
+from typing_extensions import TypedDict, Optional
+
+
+# Minimum confidence for a locally resolved chart spec to be used instead of the LLM
+CHART_SPEC_MIN_CONFIDENCE = float(os.getenv("CHART_SPEC_MIN_CONFIDENCE", "0.8"))
+
+_CHART_TYPES = {"bar": "bar", "column": "bar", "line": "line", "scatter": "scatter",
+                "pie": "pie", "donut": "pie", "histogram": "histogram"}
+_STOP = r"(?=\s+(?:over|in|as|with|and|sorted|ordered|for|from|per|by|across|of)\b|\s*[.?!,]|\s*$)"
+_CHART_RE = re.compile(r"\b(bar|column|line|scatter|pie|donut|histogram)\b")
+_GROUP_RE = re.compile(r"\b(?:per|for each|for every|each|by|across)\s+([a-z][a-z_ ]*?)" + _STOP)
+_TIME_RE = re.compile(r"\bover time\b|\b(?:per|by|each|over)\s+(?:day|date|month|week|year)s?\b")
+_METRIC_RE = re.compile(
+    r"\b(total number of|number of|count of|distribution of|sum of|total|average|avg|mean)\s+([a-z][a-z_ ]*?)" + _STOP
+)
+_AGGREGATES = {"total number of": "count", "number of": "count", "count of": "count", "distribution of": "count",
+               "sum of": "sum", "total": "sum", "average": "mean", "avg": "mean", "mean": "mean"}
+_TIME_TOKENS = {"date", "time", "day", "month", "week", "year", "timestamp", "at"}
+_COUNT_TOKENS = {"count", "total", "num", "number", "n"}
+
+
+class ChartSpec(TypedDict):
+    """Chart resolved from the prompt without the LLM."""
+
+    chart_type: str
+    x: str
+    y: Optional[str]
+    color: Optional[str]
+    agg: Optional[str]  # "count", "sum", "mean" or None to plot the rows as they are
+    confidence: float
+
+
+def _tokens(name: str) -> list:
+    name = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(name))
+    return [t for t in re.split(r"[^a-z0-9]+", name.lower()) if t]
+
+
+def _singular(word: str) -> str:
+    return word[:-1] if word.endswith("s") and not word.endswith("ss") else word
+
+
+def _match_column(phrase: str, columns: list, exclude: tuple = ()) -> tuple:
+    """
+    Find the column named by a phrase of the prompt.
+
+    Returns:
+        tuple: The best matching column (or None) and a match score between 0 and 1.
+    """
+
+    words = [_singular(w) for w in _tokens(phrase) if w not in ("the", "a", "an")]
+    if not words:
+        return None, 0.0
+    best, best_score = None, 0.0
+    for column in columns:
+        if column in exclude:
+            continue
+        tokens = [_singular(t) for t in _tokens(column)]
+        if tokens == words:
+            score = 1.0
+        elif all(w in tokens for w in words):
+            score = 0.9 - 0.01 * (len(tokens) - len(words))
+        else:
+            score = difflib.SequenceMatcher(None, "_".join(words), "_".join(tokens)).ratio()
+            score = 0.7 if score >= 0.8 else 0.0
+        if score > best_score:
+            best, best_score = column, score
+    return best, best_score
+
+
+def _time_column(df: pd.DataFrame, exclude: tuple = ()):
+    for column in df.columns:
+        if column in exclude:
+            continue
+        if pd.api.types.is_datetime64_any_dtype(df[column]) or _TIME_TOKENS & set(_tokens(column)):
+            return column
+    return None
+
+
+def resolve_chart_spec(user_prompt: str, df: pd.DataFrame) -> Optional[ChartSpec]:
+    """
+    Parse common chart requests ("Plot a bar chart showing the total number of orders per user")
+    and match the fields they name against the columns of `df`.
+
+    Args:
+        user_prompt (str): The user's question or prompt for the chart.
+        df (pd.DataFrame): The data to plot.
+
+    Returns:
+        ChartSpec: The resolved chart with a confidence score, or None if the prompt doesn't follow a known pattern.
+    """
+
+    prompt = (user_prompt or "").lower()
+    columns = list(df.columns)
+    match = _CHART_RE.search(prompt)
+    if not match or df.empty:
+        return None
+    chart_type = _CHART_TYPES[match.group(1)]
+    confidence = 1.0
+
+    # Dimension: "per user", "by product" and/or "over time"
+    x, color = None, None
+    group = _GROUP_RE.search(prompt)
+    if group:
+        x, score = _match_column(group.group(1), columns)
+        if x is None:
+            return None
+        confidence *= score
+    if _TIME_RE.search(prompt):
+        time_column = _time_column(df, exclude=(x,))
+        if time_column is None:
+            return None
+        x, color = time_column, x
+    if x is None:
+        return None
+
+    # Metric: "total number of orders" (count), "total price" (sum), "average quantity" (mean)
+    numeric = [c for c in columns if c not in (x, color) and pd.api.types.is_numeric_dtype(df[c])]
+    metric = _METRIC_RE.search(prompt)
+    agg, noun = (_AGGREGATES[metric.group(1)], metric.group(2)) if metric else ("count", "")
+    if not metric:
+        confidence *= 0.85
+    y = None
+    if agg == "count":
+        # Already aggregated results carry the count in a column such as `total_orders` or `order_count`
+        noun_tokens = {_singular(t) for t in _tokens(noun)}
+        for column in numeric:
+            tokens = {_singular(t) for t in _tokens(column)}
+            if tokens & _COUNT_TOKENS and (tokens & noun_tokens or not noun_tokens or len(numeric) == 1):
+                y, agg = column, "sum"
+                break
+        if y is None and chart_type != "histogram":
+            # Counting rows of data that has one row per point (see CHART_MAX_POINTS) would plot 1 per point
+            one_row_per_point = not df.duplicated(subset=[c for c in (x, color) if c is not None]).any()
+            prompt_tokens = {_singular(t) for t in _tokens(prompt)}
+            named = [c for c in numeric if {_singular(t) for t in _tokens(c)} <= prompt_tokens]
+            values = named or (numeric if len(numeric) == 1 else [])
+            if values and (one_row_per_point or not metric):
+                y, agg = values[0], "sum"
+            elif one_row_per_point or not metric:
+                # Nothing says which values to plot, leave the chart to the LLM
+                confidence = min(confidence, CHART_SPEC_MIN_CONFIDENCE * 0.9)
+    else:
+        y, score = _match_column(noun, numeric)
+        if y is None:
+            return None
+        confidence *= score
+
+    if chart_type == "histogram":
+        y, agg = None, None
+    return ChartSpec(chart_type=chart_type, x=x, y=y, color=color, agg=agg, confidence=round(confidence, 3))
+
+
+def build_chart(spec: ChartSpec, df: pd.DataFrame) -> tuple:
+    """
+    Build the Plotly figure described by a chart spec with plotly.express.
+
+    Args:
+        spec (ChartSpec): The resolved chart.
+        df (pd.DataFrame): The data to plot.
+
+    Returns:
+        tuple: The Plotly figure and equivalent Python code, shown to the user like generated code.
+    """
+
+    x, y, color, agg = spec["x"], spec["y"], spec["color"], spec["agg"]
+    keys = [c for c in (x, color) if c is not None]
+    lines = []
+    data = df
+    if agg == "count":
+        y = "count"
+        data = df.groupby(keys).size().reset_index(name=y)
+        lines.append(f"data = df.groupby({keys!r}).size().reset_index(name={y!r})")
+    elif agg in ("sum", "mean"):
+        data = df.groupby(keys, as_index=False)[y].agg(agg)
+        lines.append(f"data = df.groupby({keys!r}, as_index=False)[{y!r}].agg({agg!r})")
+    else:
+        lines.append("data = df")
+    if spec["chart_type"] == "line":
+        data = data.sort_values(x)
+        lines.append(f"data = data.sort_values({x!r})")
+
+    chart_type = spec["chart_type"]
+    if chart_type == "pie":
+        fig = px.pie(data, names=x, values=y)
+        lines.append(f"fig = px.pie(data, names={x!r}, values={y!r})")
+    elif chart_type == "histogram":
+        fig = px.histogram(data, x=x, color=color)
+        lines.append(f"fig = px.histogram(data, x={x!r}, color={color!r})")
+    else:
+        fig = getattr(px, chart_type)(data, x=x, y=y, color=color)
+        lines.append(f"fig = px.{chart_type}(data, x={x!r}, y={y!r}, color={color!r})")
+    lines.append("fig")
+    return fig, "import plotly.express as px\n" + "\n".join(lines)
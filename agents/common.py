@@ -1,7 +1,15 @@
-from typing_extensions import TypedDict, Annotated
+import os
+from typing_extensions import TypedDict, Annotated, Optional
 from langgraph.graph.message import add_messages
 from agents import llm
 from agents.templates import classification_prompt
+from agents.intent import intent_classifier, INTENT_CONFIDENCE_THRESHOLD
+from agents.metrics import timed, failure, llm_config
+
+# Maximum number of points of an aggregated chart series, the result limit of chart queries
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+# Concurrent model calls and query executions of one batch of questions
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
 
 # define state for the agent
 # This is a TypedDict that defines the structure of the state dictionary used in the agent.
@@ -14,8 +22,13 @@ class State(TypedDict , total=False ):  # <--- add total=False This tells Python
     question: str
     intent: str
     query: str
+    query_valid: bool
+    query_cached: bool  # the query came from the query cache, only checked queries are stored there
     columns: list
     result: str
+    data: Optional[dict]  # columnar query result, see agents.results
+    page_token: Optional[str]  # token of the next page of a paginated result
+    trace_id: str  # correlates the stage metrics of one request, see agents.metrics
     answer: str  
     output: str
     chart_type: str
@@ -32,14 +45,51 @@ class QueryOutput(TypedDict):
 
 config_memory = {"configurable": {"thread_id": "1"}}
 
+@timed("detect_intent")
 def detect_intent(user_input: str) -> str:
+    """
+    Classify the user input as "database", "chart" or "other".
+    The local classifier answers when it is confident enough, the LLM is only called below the threshold.
+    """
+    label, confidence = intent_classifier.classify(user_input)
+    if confidence >= INTENT_CONFIDENCE_THRESHOLD:
+        return label
+    try:
+        prompt = classification_prompt.invoke({"input": user_input},config=config_memory)
+        result = llm.invoke(prompt ,config=llm_config(config_memory, "detect_intent"))
+        intent = result.content.strip().lower()
+        if intent not in ["database", "chart"]:
+            return "other"
+        return intent
+    except Exception as e:
+        print("❌ Intent detection failed:", e)
+        failure("detect_intent")
+        return "other"
+
+
+def intent_hint(user_input: str) -> str:
+    """
+    Intent known before the query is written, from the local classifier only.
+    "chart" when it is confident the question asks for a chart, "database" otherwise.
+    """
+    label, confidence = intent_classifier.classify(user_input)
+    return "chart" if label == "chart" and confidence >= INTENT_CONFIDENCE_THRESHOLD else "database"
+
+
+@timed("detect_intent")
+async def adetect_intent(user_input: str) -> str:
+    """Async counterpart of `detect_intent`, so the classification can run alongside other work."""
+    label, confidence = intent_classifier.classify(user_input)
+    if confidence >= INTENT_CONFIDENCE_THRESHOLD:
+        return label
     try:
         prompt = classification_prompt.invoke({"input": user_input},config=config_memory)
-        result = llm.invoke(prompt ,config=config_memory)
+        result = await llm.ainvoke(prompt ,config=llm_config(config_memory, "detect_intent"))
         intent = result.content.strip().lower()
         if intent not in ["database", "chart"]:
             return "other"
         return intent
     except Exception as e:
         print("❌ Intent detection failed:", e)
+        failure("detect_intent")
         return "other"
@@ -0,0 +1,267 @@
+import os
+import re
+import uuid
+import hashlib
+import sqlite3
+import pandas as pd
+
+
+# Directory of the SQLite stores built from uploaded files, one database per file content
+FILE_STORE_DIR = os.getenv("FILE_STORE_DIR", os.path.join(".cache", "file_store"))
+# Rows parsed and inserted per chunk while ingesting a file
+FILE_STORE_CHUNK_ROWS = int(os.getenv("FILE_STORE_CHUNK_ROWS", "50000"))
+# Maximum number of single column indexes created per table
+FILE_STORE_MAX_INDEXES = int(os.getenv("FILE_STORE_MAX_INDEXES", "5"))
+
+_HASH_BLOCK = 1 << 20
+_ID_RE = re.compile(r"(^id$|_id$|^id_)")
+
+
+def file_digest(fileobj) -> str:
+    """Hash the content of a binary file object in blocks and rewind it."""
+
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(_HASH_BLOCK), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()[:32]
+
+
+def table_name(filename: str) -> str:
+    """SQL friendly table name derived from the file name ("Sales 2024.csv" -> "sales_2024")."""
+
+    name = re.sub(r"[^0-9a-zA-Z]+", "_", os.path.splitext(os.path.basename(filename))[0]).strip("_").lower()
+    if not name or name[0].isdigit():
+        name = f"t_{name}"
+    return name
+
+
+def store_uri(path: str) -> str:
+    """
+    SQLAlchemy URI of a store built by `ingest_file`.
+
+    Raises:
+        ValueError: If the path is not a store of `FILE_STORE_DIR`.
+    """
+
+    path = os.path.realpath(path)
+    if os.path.dirname(path) != os.path.realpath(FILE_STORE_DIR) or not os.path.isfile(path):
+        raise ValueError(f"Unknown file store: {path}")
+    return f"sqlite:///{path}"
+
+
+def _excel_chunks(fileobj, chunk_rows: int):
+    """Stream the first sheet of a workbook in DataFrame chunks, without loading the whole sheet."""
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"column_{i}" for i, c in enumerate(header)]
+        chunk = []
+        for row in rows:
+            chunk.append(row[:len(columns)])
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _read_chunks(fileobj, filename: str, chunk_rows: int):
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return _excel_chunks(fileobj, chunk_rows)
+    return pd.read_csv(fileobj, chunksize=chunk_rows)
+
+
+def _infer_types(df: pd.DataFrame) -> dict:
+    """
+    Decide the type of every column from the first chunk.
+
+    Returns:
+        dict: Column name to "INTEGER", "REAL", "TIMESTAMP" or "TEXT".
+    """
+
+    types = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+            types[column] = "INTEGER"
+        elif pd.api.types.is_float_dtype(series):
+            # Whole numbers only read as floats because of missing values, e.g. "10.0" in the file is a REAL
+            values = series.dropna()
+            integral = series.hasnans and len(values) and (values % 1 == 0).all()
+            types[column] = "INTEGER" if integral else "REAL"
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            types[column] = "TIMESTAMP"
+        else:
+            values = series.dropna().astype(str)
+            parsed = pd.to_datetime(values, errors="coerce", format="mixed") if len(values) else values
+            if len(values) and values.str.contains(r"\d[-/:]\d", regex=True).all() and parsed.notna().mean() >= 0.95:
+                types[column] = "TIMESTAMP"
+            else:
+                types[column] = "TEXT"
+    return types
+
+
+def _widen_to_text(df: pd.DataFrame, types: dict, column: str, parsed: pd.Series = None) -> None:
+    """
+    Store a column whose values don't all parse as its type as TEXT. The values that did parse are kept
+    in `parsed` form (e.g. the normalized timestamps of the previous chunks), the others as they are.
+    """
+
+    print(f" ⚠️ Column {column} holds values that are not {types[column]}, it is stored as TEXT.")
+    types[column] = "TEXT"
+    values = df[column].astype("string")
+    df[column] = values if parsed is None else parsed.astype("string").where(parsed.notna(), values)
+
+
+def _coerce(df: pd.DataFrame, types: dict) -> pd.DataFrame:
+    """
+    Convert a chunk to the column types decided on the first chunk.
+    An INTEGER column holding fractions in this chunk is widened to REAL in `types`, a column with values
+    that don't parse as its type is widened to TEXT, so no value is replaced by NULL.
+    """
+
+    for column, sql_type in types.items():
+        if sql_type == "TIMESTAMP":
+            parsed = pd.to_datetime(df[column], errors="coerce", format="mixed").dt.strftime("%Y-%m-%d %H:%M:%S")
+        elif sql_type in ("INTEGER", "REAL"):
+            parsed = pd.to_numeric(df[column], errors="coerce")
+        else:
+            df[column] = df[column].astype("string")
+            continue
+        if (parsed.isna() & df[column].notna()).any():
+            _widen_to_text(df, types, column, parsed if sql_type == "TIMESTAMP" else None)
+        elif sql_type == "INTEGER" and not (parsed.dropna() % 1 == 0).all():
+            types[column] = "REAL"
+            df[column] = parsed
+        elif sql_type == "INTEGER":
+            df[column] = parsed.astype("Int64")
+        else:
+            df[column] = parsed
+    return df
+
+
+def _retype_table(conn: sqlite3.Connection, table: str, types: dict) -> None:
+    """Recreate a loaded table with the final column types, after a column was widened on a later chunk."""
+
+    columns = ", ".join(f'"{column}" {sql_type}' for column, sql_type in types.items())
+    conn.execute(f'CREATE TABLE "{table}__retyped" ({columns})')
+    conn.execute(f'INSERT INTO "{table}__retyped" SELECT * FROM "{table}"')
+    conn.execute(f'DROP TABLE "{table}"')
+    conn.execute(f'ALTER TABLE "{table}__retyped" RENAME TO "{table}"')
+
+
+def _index_columns(df: pd.DataFrame, types: dict, max_indexes: int) -> list:
+    """
+    Likely filter columns of a table: identifiers, dates and low cardinality text (categories).
+    """
+
+    candidates = []
+    for column, sql_type in types.items():
+        distinct = df[column].nunique(dropna=True)
+        if distinct < 2:
+            continue
+        if _ID_RE.search(str(column).lower()):
+            candidates.append((0, column))
+        elif sql_type == "TIMESTAMP":
+            candidates.append((1, column))
+        elif sql_type == "TEXT" and distinct <= max(len(df) // 2, 1):
+            candidates.append((2, column))
+    return [column for _, column in sorted(candidates, key=lambda c: c[0])[:max_indexes]]
+
+
+def ingest_file(fileobj, filename: str, chunk_rows: int = FILE_STORE_CHUNK_ROWS) -> str:
+    """
+    Load an uploaded CSV/XLSX file into a SQLite store keyed by the hash of its content.
+    The file is parsed and inserted chunk by chunk with typed columns, likely filter columns are indexed.
+    Uploading the same content again reuses the existing store.
+
+    Args:
+        fileobj: Binary file object of the upload.
+        filename (str): Name of the uploaded file, gives the table name and the format.
+        chunk_rows (int): Rows per chunk.
+
+    Returns:
+        str: Path of the SQLite store, see `store_uri`.
+
+    Raises:
+        ValueError: If the file has no rows.
+    """
+
+    os.makedirs(FILE_STORE_DIR, exist_ok=True)
+    path = os.path.join(FILE_STORE_DIR, f"{file_digest(fileobj)}.db")
+    if os.path.exists(path):
+        return path
+
+    table = table_name(filename)
+    # Sessions of the app are threads of one process, each load writes its own partial file
+    partial = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    conn = sqlite3.connect(partial)
+    try:
+        # The partial file is only renamed into place once complete, durability is not needed while loading
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        types, declared, indexes = None, None, []
+        for chunk in _read_chunks(fileobj, filename, chunk_rows):
+            if chunk.empty:
+                # A CSV with only a header still yields one empty chunk
+                continue
+            if types is None:
+                chunk.columns = [str(c) for c in chunk.columns]
+                types = _infer_types(chunk)
+                indexes = _index_columns(chunk, types, FILE_STORE_MAX_INDEXES)
+            chunk.columns = list(types)
+            chunk = _coerce(chunk, types)
+            if declared is None:
+                declared = dict(types)
+            chunk.to_sql(table, conn, if_exists="append", index=False, dtype=declared)
+        if types is None:
+            raise ValueError(f"{filename} has no rows.")
+        if types != declared:
+            _retype_table(conn, table, types)
+        for column in indexes:
+            index = re.sub(r"[^0-9a-zA-Z_]+", "_", f"idx_{table}_{column}")
+            conn.execute(f'CREATE INDEX "{index}" ON "{table}" ("{column}")')
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.close()
+        os.replace(partial, path)
+    except Exception:
+        conn.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        try:
+            fileobj.seek(0)
+        except (ValueError, OSError):
+            # The CSV reader closes the upload when parsing fails, keep the original error
+            pass
+    return path
+
+
+def preview(path: str, limit: int = 100) -> tuple:
+    """
+    First rows and row count of the table of a store, read without loading the table.
+
+    Returns:
+        tuple: The first `limit` rows as a DataFrame and the total number of rows.
+    """
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        table = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'").fetchone()[0]
+        count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        df = pd.read_sql_query(f'SELECT * FROM "{table}" LIMIT ?', conn, params=(limit,))
+        return df, count
+    finally:
+        conn.close()
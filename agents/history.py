@@ -0,0 +1,107 @@
+import os
+import gzip
+import uuid
+import shutil
+import weakref
+import pandas as pd
+import plotly.io as pio
+from plotly.basedatatypes import BaseFigure
+
+
+# Assistant results kept in memory per session, older ones are spilled to disk
+HISTORY_LIVE_TURNS = int(os.getenv("HISTORY_LIVE_TURNS", "10"))
+# Directory of the spilled results, one sub directory per session
+HISTORY_DIR = os.getenv("HISTORY_DIR", os.path.join(".cache", "history"))
+
+
+class ChatHistory():
+    """
+    Chat messages of a Streamlit session with a bounded number of live results.
+    Messages are the dicts the apps already use ({"role", "type", "content", "code"}). Once more than
+    `live_turns` assistant results are held, the oldest DataFrames are written to Parquet and figures
+    to gzipped JSON, their `content` is dropped and read back only through `load`.
+    """
+
+    def __init__(self, live_turns: int = HISTORY_LIVE_TURNS, directory: str = HISTORY_DIR):
+        self.live_turns = live_turns
+        self.directory = os.path.join(directory, uuid.uuid4().hex)
+        self.messages = []
+        self._live = []
+        # The spilled files go away with the session state holding the history
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+
+    def __iter__(self):
+        return iter(self.messages)
+
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+
+    def append(self, message: dict) -> None:
+        """
+        Add a message, spilling the oldest live results beyond `live_turns`.
+
+        Args:
+            message (dict): The chat message, assistant results get the preceding user message as `question`.
+        """
+
+        if message["role"] != "user" and message.get("content") is not None:
+            if self.messages and self.messages[-1]["role"] == "user":
+                message.setdefault("question", self.messages[-1]["content"])
+            self._live.append(message)
+        self.messages.append(message)
+        while len(self._live) > self.live_turns:
+            self._spill(self._live.pop(0))
+
+
+    def _spill(self, message: dict) -> None:
+        content = message["content"]
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, uuid.uuid4().hex)
+        try:
+            if isinstance(content, pd.DataFrame):
+                path += ".parquet"
+                content.to_parquet(path, index=False, compression="zstd")
+            elif isinstance(content, BaseFigure):
+                path += ".json.gz"
+                with gzip.open(path, "wt", encoding="utf-8") as f:
+                    f.write(pio.to_json(content))
+            else:
+                return
+        except Exception as e:
+            # Results Parquet can't store (e.g. mixed typed Mongo columns) stay in memory
+            print(" ⚠️ Spilling history result failed:", e)
+            return
+        message["path"] = path
+        message["content"] = None
+
+
+    @staticmethod
+    def is_spilled(message: dict) -> bool:
+        """Whether the result of a message was written to disk."""
+        return message.get("content") is None and bool(message.get("path"))
+
+
+    def load(self, message: dict):
+        """
+        Return the result of a message, reading it from disk if it was spilled.
+
+        Returns:
+            pd.DataFrame or plotly.graph_objects.Figure: The result.
+        """
+
+        if not self.is_spilled(message):
+            return message.get("content")
+        path = message["path"]
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return pio.from_json(f.read())
+
+
+    def clear(self) -> None:
+        """Drop all messages and their spilled files."""
+        self.messages, self._live = [], []
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,157 @@
+import os
+import re
+import zlib
+import numpy as np
+
+
+# Below this confidence the local classifier defers to the LLM
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+
+LABELS = ["database", "chart", "other"]
+
+# Labeled examples the local model is trained on, extend with `intent_classifier.add_examples`
+INTENT_EXAMPLES = [
+    ("Count the number of customers from table Customer", "database"),
+    ("What are the top 10 products by sales?", "database"),
+    ("What are the names of the top 3 users with highest total purchase amount (quantity * price)?", "database"),
+    ("List all orders placed in September", "database"),
+    ("How many orders did each user place?", "database"),
+    ("Show me the users who signed up last month", "database"),
+    ("Which product sold the most units?", "database"),
+    ("Find the average order value per user", "database"),
+    ("Give me the email addresses of female users", "database"),
+    ("What is the total revenue?", "database"),
+    ("Get the 5 most recent orders", "database"),
+    ("Which users have not placed any order?", "database"),
+    ("How many users are female?", "database"),
+    ("Which users bought Sunflower Seeds?", "database"),
+    ("Show orders placed in October", "database"),
+    ("Top 5 customers by spend", "database"),
+    ("What is the total quantity sold per product?", "database"),
+    ("Hi, which products did user 12 order?", "database"),
+    ("Thanks, now show the orders of user 7", "database"),
+    ("Which customers ordered pumpkin pie?", "database"),
+    ("What is the weather impact on sales?", "database"),
+    ("Show total sales per joke category", "database"),
+    ("create a chart or graph", "chart"),
+    ("Plot a bar chart showing the total number of orders for each user.", "chart"),
+    ("Plot a scatter chart showing the total number of orders per user.", "chart"),
+    ("Plot a line chart showing the total number of orders per user over time.", "chart"),
+    ("Plot a pie chart showing the distribution of orders by user.", "chart"),
+    ("Visualize revenue by product", "chart"),
+    ("Draw a histogram of order quantities", "chart"),
+    ("Show a graph of sales over time", "chart"),
+    ("Make a pie of orders by gender", "chart"),
+    ("Chart the monthly revenue trend", "chart"),
+    ("Tell me a joke", "other"),
+    ("Hello, how are you?", "other"),
+    ("What's the weather like today?", "other"),
+    ("Who won the football match yesterday?", "other"),
+    ("Write me a poem about the sea", "other"),
+    ("Thanks!", "other"),
+    ("What can you do?", "other"),
+    ("Translate good morning to French", "other"),
+    ("What is the capital of France?", "other"),
+    ("Who is the president of the United States?", "other"),
+    ("Explain how photosynthesis works", "other"),
+    ("Recommend a good movie", "other"),
+    ("What time is it?", "other"),
+    ("Compose a limerick about cats", "other"),
+]
+
+# Keyword rules answering unambiguous inputs with a fixed confidence
+_RULES = [
+    (re.compile(r"\b(plot|chart|graph|draw|visuali[sz]e|histogram|scatter|heatmap|dashboard)\b"
+                r"|\bpie\s+(?:chart|graph|plot|of)\b"), "chart", 0.95),
+    # Small talk only when it is the whole input, "Hi, how many orders..." or "weather impact on sales"
+    # are left to the model
+    (re.compile(r"^\s*(?:hi|hello|hey|thanks|thank you|bye"
+                r"|(?:tell|give) me (?:a|another) joke"
+                r"|(?:write|compose) (?:me )?a poem(?: about [a-z ]+)?"
+                r"|(?:what|how)(?:'s| is) the weather(?: like)?(?: today| tomorrow| now| outside)?(?: in [a-z ]+)?"
+                r")[\s!?.,]*$"), "other", 0.9),
+]
+
+
+def _features(text: str, n_features: int) -> np.ndarray:
+    """Hashed word uni/bigrams and character trigrams of a text."""
+
+    text = text.lower()
+    words = re.findall(r"[a-z0-9]+", text)
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {' '.join(words)} "
+    grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return np.array([zlib.crc32(g.encode("utf-8")) % n_features for g in grams], dtype=np.int64)
+
+
+class IntentClassifier():
+    """Keyword rules plus a small hashed n-gram linear model (multinomial logistic regression)."""
+
+    def __init__(self, examples: list = None, n_features: int = 2 ** 16, epochs: int = 30, learning_rate: float = 0.5):
+        self.n_features = n_features
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.examples = list(examples or INTENT_EXAMPLES)
+        self.fit()
+
+
+    def fit(self) -> None:
+        """Train the linear model on the labeled examples with a few SGD epochs (deterministic)."""
+
+        self.weights = np.zeros((self.n_features, len(LABELS)))
+        self.bias = np.zeros(len(LABELS))
+        data = [(_features(text, self.n_features), LABELS.index(label)) for text, label in self.examples]
+        for _ in range(self.epochs):
+            for idx, target in data:
+                probs = self._predict(idx)
+                probs[target] -= 1.0
+                step = self.learning_rate / max(len(idx), 1)
+                np.subtract.at(self.weights, idx, step * probs)
+                self.bias -= self.learning_rate * 0.1 * probs
+
+
+    def _predict(self, idx: np.ndarray) -> np.ndarray:
+        scores = self.weights[idx].sum(axis=0) + self.bias
+        scores = np.exp(scores - scores.max())
+        return scores / scores.sum()
+
+
+    def add_examples(self, examples: list) -> None:
+        """
+        Add labeled examples and retrain.
+
+        Args:
+            examples (list): (text, label) pairs, labels are "database", "chart" or "other".
+        """
+
+        for _, label in examples:
+            if label not in LABELS:
+                raise ValueError(f"Unknown intent label: {label}")
+        self.examples.extend(examples)
+        self.fit()
+
+
+    def classify(self, text: str) -> tuple:
+        """
+        Classify a user input.
+
+        Args:
+            text (str): The user input.
+
+        Returns:
+            tuple: The intent label and a confidence score between 0 and 1.
+        """
+
+        lowered = (text or "").lower()
+        for pattern, label, confidence in _RULES:
+            if pattern.search(lowered):
+                return label, confidence
+        idx = _features(lowered, self.n_features)
+        if len(idx) == 0:
+            return "other", 1.0
+        probs = self._predict(idx)
+        best = int(probs.argmax())
+        return LABELS[best], float(probs[best])
+
+
+intent_classifier = IntentClassifier()
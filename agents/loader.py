@@ -0,0 +1,208 @@
+"""
+Bulk loader of the `data_store` CSVs into the SQL database and MongoDB.
+
+    python -m agents.loader                         # both targets, upsert
+    python -m agents.loader --target sql --mode replace --batch-size 50000
+    python -m agents.loader --target mongo --workers 4
+"""
+import os
+import re
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from pymongo import MongoClient, UpdateOne, ASCENDING
+
+
+load_dotenv()
+
+DATA_DIR = os.getenv("DATA_DIR", "data_store")
+SCHEMA_FILE = os.getenv("SCHEMA_FILE", "create_tables.sql")
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "10000"))
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "1"))
+MONGO_DB_NAME = "sales"
+
+# CSV file, SQL table, Mongo collection and primary key, in load order (foreign keys first)
+LOAD_SPECS = [
+    {"file": "users.csv", "table": "Users", "collection": "users", "key": "user_id"},
+    {"file": "orders.csv", "table": "Orders", "collection": "orders", "key": "order_id"},
+]
+
+# Secondary indexes of the Mongo collections, matching the SQL indexes of create_tables.sql
+MONGO_INDEXES = {
+    "users": [("user_id", True)],
+    "orders": [("order_id", True), ("user_id", False), ("order_date", False), ("product_name", False)],
+}
+
+
+def read_batches(path: str, batch_size: int):
+    """Stream a CSV in DataFrame batches."""
+    return pd.read_csv(path, chunksize=batch_size)
+
+
+def _records(df: pd.DataFrame) -> list:
+    """Rows of a batch as dicts of Python values, missing values as None."""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def apply_schema(engine: Engine, schema_file: str = SCHEMA_FILE) -> None:
+    """Create the tables and indexes of the schema file (idempotent, the statements use IF NOT EXISTS)."""
+
+    with open(schema_file) as f:
+        script = re.sub(r"--[^\n]*", "", f.read())
+    with engine.begin() as conn:
+        for statement in script.split(";"):
+            if statement.strip():
+                conn.execute(text(statement))
+
+
+def _sql_statement(table: str, columns: list, key: str, mode: str) -> str:
+    """INSERT statement of a batch, an upsert on the primary key unless the table was emptied first."""
+
+    names = ", ".join(columns)
+    values = ", ".join(f":{c}" for c in columns)
+    statement = f"INSERT INTO {table} ({names}) VALUES ({values})"
+    if mode == "upsert":
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != key)
+        statement += f" ON CONFLICT ({key}) DO UPDATE SET {updates}"
+    return statement
+
+
+def _run_batches(batches, load, workers: int) -> int:
+    """Load batches, with up to `workers` batches in flight, and return the number of rows loaded."""
+
+    if workers <= 1:
+        return sum(load(batch) for batch in batches)
+    loaded, pending = 0, set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in batches:
+            # Bound the batches held in memory to twice the workers
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                loaded += sum(f.result() for f in done)
+            pending.add(pool.submit(load, batch))
+        loaded += sum(f.result() for f in pending)
+    return loaded
+
+
+def load_sql(engine: Engine, data_dir: str = DATA_DIR, batch_size: int = LOAD_BATCH_SIZE,
+             workers: int = LOAD_WORKERS, mode: str = "upsert") -> dict:
+    """
+    Load the CSVs into the SQL database, one transaction and one `executemany` per batch.
+
+    Args:
+        engine (Engine): Engine of the target database.
+        data_dir (str): Directory of the CSV files.
+        batch_size (int): Rows per batch.
+        workers (int): Batches loaded in parallel. SQLite serializes writers, keep 1 there.
+        mode (str): "upsert" to insert new rows and update changed ones, "replace" to empty the tables first.
+
+    Returns:
+        dict: Rows loaded per table.
+    """
+
+    apply_schema(engine)
+    if mode == "replace":
+        with engine.begin() as conn:
+            for spec in reversed(LOAD_SPECS):
+                conn.execute(text(f"DELETE FROM {spec['table']}"))
+
+    counts = {}
+    for spec in LOAD_SPECS:
+        def load(batch: pd.DataFrame, spec=spec) -> int:
+            statement = text(_sql_statement(spec["table"], list(batch.columns), spec["key"], mode))
+            with engine.begin() as conn:
+                conn.execute(statement, _records(batch))
+            return len(batch)
+
+        counts[spec["table"]] = _run_batches(read_batches(os.path.join(data_dir, spec["file"]), batch_size), load, workers)
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    return counts
+
+
+def create_mongo_indexes(db) -> None:
+    """Create the indexes of `MONGO_INDEXES` (no-op for existing ones)."""
+
+    for collection, indexes in MONGO_INDEXES.items():
+        for field, unique in indexes:
+            db[collection].create_index([(field, ASCENDING)], unique=unique)
+
+
+def load_mongo(client: MongoClient, data_dir: str = DATA_DIR, batch_size: int = LOAD_BATCH_SIZE,
+               workers: int = LOAD_WORKERS, mode: str = "upsert") -> dict:
+    """
+    Load the CSVs into MongoDB, one unordered `insert_many` or `bulk_write` of upserts per batch.
+
+    Args:
+        client (MongoClient): Client of the target server.
+        data_dir (str): Directory of the CSV files.
+        batch_size (int): Documents per batch.
+        workers (int): Batches loaded in parallel.
+        mode (str): "upsert" to insert new documents and update changed ones, "replace" to empty the collections first.
+
+    Returns:
+        dict: Documents loaded per collection.
+    """
+
+    db = client[MONGO_DB_NAME]
+    if mode == "replace":
+        for spec in LOAD_SPECS:
+            db[spec["collection"]].delete_many({})
+    create_mongo_indexes(db)
+
+    counts = {}
+    for spec in LOAD_SPECS:
+        collection = db[spec["collection"]]
+
+        def load(batch: pd.DataFrame, spec=spec, collection=collection) -> int:
+            documents = _records(batch)
+            if mode == "replace":
+                collection.insert_many(documents, ordered=False)
+            else:
+                collection.bulk_write(
+                    [UpdateOne({spec["key"]: d[spec["key"]]}, {"$set": d}, upsert=True) for d in documents],
+                    ordered=False
+                )
+            return len(documents)
+
+        counts[spec["collection"]] = _run_batches(read_batches(os.path.join(data_dir, spec["file"]), batch_size), load, workers)
+    return counts
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m agents.loader", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", choices=["sql", "mongo", "all"], default="all")
+    parser.add_argument("--sql-uri", default=os.getenv("SQL_URI", "sqlite:///sales.db"))
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI"))
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS)
+    parser.add_argument("--mode", choices=["upsert", "replace"], default="upsert")
+    args = parser.parse_args(argv)
+
+    if args.target in ("sql", "all"):
+        start = time.perf_counter()
+        engine = create_engine(args.sql_uri)
+        counts = load_sql(engine, args.data_dir, args.batch_size, args.workers, args.mode)
+        engine.dispose()
+        print(f"✅ SQL loaded {counts} in {time.perf_counter() - start:.2f}s")
+
+    if args.target in ("mongo", "all"):
+        if not args.mongo_uri:
+            parser.error("MONGO_URI environment variable or --mongo-uri is required for the mongo target.")
+        start = time.perf_counter()
+        client = MongoClient(args.mongo_uri)
+        try:
+            counts = load_mongo(client, args.data_dir, args.batch_size, args.workers, args.mode)
+        finally:
+            client.close()
+        print(f"✅ MongoDB loaded {counts} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
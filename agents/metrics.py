@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import deque
+from langchain_core.callbacks import BaseCallbackHandler
+from agents.cache import cache_instances
+
+
+# Prefix of all exported metric names
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "genai")
+# Stage spans kept per process for `/trace/{trace_id}` lookups
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2000"))
+# Port of the `/metrics` endpoint of processes that aren't MCP servers (the orchestrator), 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8004"))
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+BYTES_BUCKETS = (1024, 16384, 131072, 1048576, 8388608, 67108864)
+
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = [f'{k}="{str(v)}"'.replace("\n", " ") for k, v in sorted(labels.items())]
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter():
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_labels(dict(key))} {value}")
+        return lines
+
+
+class Histogram():
+    """Cumulative bucket histogram with labels."""
+
+    def __init__(self, name: str, help: str, buckets: tuple = SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = dict(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{self.name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+stage_seconds = Histogram(f"{METRICS_PREFIX}_stage_seconds", "Wall time of a pipeline stage.")
+stage_failures = Counter(f"{METRICS_PREFIX}_stage_failures_total", "Failed pipeline stages.")
+llm_tokens = Counter(f"{METRICS_PREFIX}_llm_tokens_total", "LLM tokens by stage and kind (prompt/completion).")
+result_rows = Histogram(f"{METRICS_PREFIX}_result_rows", "Rows of query results.", ROWS_BUCKETS)
+payload_bytes = Histogram(f"{METRICS_PREFIX}_payload_bytes", "Size of tool payloads.", BYTES_BUCKETS)
+coalesced_calls = Counter(f"{METRICS_PREFIX}_coalesced_calls_total", "Calls that shared the result of an identical call in flight.")
+
+METRICS = [stage_seconds, stage_failures, llm_tokens, result_rows, payload_bytes, coalesced_calls]
+
+_spans = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+def new_trace_id() -> str:
+    """Random ID correlating the stages of one request across servers."""
+    return uuid.uuid4().hex[:16]
+
+
+def set_trace(trace_id: str = None) -> str:
+    """Set the trace ID of the current request (task/thread context), creating one when not given."""
+    trace_id = trace_id or new_trace_id()
+    trace_id_var.set(trace_id)
+    return trace_id
+
+
+def record_stage(stage: str, seconds: float, status: str = "ok") -> None:
+    """Record the wall time of a stage, and the span of the current trace."""
+
+    stage_seconds.observe(seconds, stage=stage, status=status)
+    if status != "ok":
+        stage_failures.inc(stage=stage)
+    trace_id = trace_id_var.get()
+    if trace_id:
+        _spans.append({"trace_id": trace_id, "stage": stage, "seconds": round(seconds, 6),
+                       "status": status, "end": time.time()})
+
+
+def failure(stage: str) -> None:
+    """Count a failure handled inside a stage (the stage itself returns normally)."""
+    stage_failures.inc(stage=stage)
+
+
+def observe_rows(stage: str, rows: int) -> None:
+    result_rows.observe(rows, stage=stage)
+
+
+def observe_payload(stage: str, size: int) -> None:
+    payload_bytes.observe(size, stage=stage)
+
+
+def timed(stage: str):
+    """
+    Decorator recording the wall time of a function or coroutine function as `stage`.
+    Exceptions are recorded with status "error" and re-raised.
+    """
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start, status = time.perf_counter(), "ok"
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException:
+                    status = "error"
+                    raise
+                finally:
+                    record_stage(stage, time.perf_counter() - start, status)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start, status = time.perf_counter(), "ok"
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                status = "error"
+                raise
+            finally:
+                record_stage(stage, time.perf_counter() - start, status)
+        return wrapper
+    return decorator
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """LangChain callback counting the prompt and completion tokens of the LLM calls of a stage."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt, completion = usage.get("prompt_tokens"), usage.get("completion_tokens")
+        if prompt is None:
+            # Streaming and newer integrations only report usage on the message
+            prompt = completion = 0
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt += metadata.get("input_tokens", 0)
+                    completion += metadata.get("output_tokens", 0)
+        llm_tokens.inc(prompt or 0, stage=self.stage, kind="prompt")
+        llm_tokens.inc(completion or 0, stage=self.stage, kind="completion")
+
+
+def llm_config(config: dict, stage: str) -> dict:
+    """Copy of a runnable config with the token usage callback of a stage added."""
+    return {**config, "callbacks": [*(config.get("callbacks") or []), TokenUsageCallback(stage)]}
+
+
+def trace(trace_id: str) -> list:
+    """Recorded spans of a trace, oldest first."""
+    return [span for span in list(_spans) if span["trace_id"] == trace_id]
+
+
+def render() -> str:
+    """All metrics of the process in Prometheus text exposition format."""
+
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    name = f"{METRICS_PREFIX}_cache_lookups_total"
+    lines += [f"# HELP {name} Persistent cache lookups by result.", f"# TYPE {name} counter"]
+    for cache in list(cache_instances):
+        lines.append(f"{name}{_labels({'cache': cache.namespace, 'result': 'hit'})} {cache.hits}")
+        lines.append(f"{name}{_labels({'cache': cache.namespace, 'result': 'miss'})} {cache.misses}")
+    return "\n".join(lines) + "\n"
+
+
+def add_routes(mcp) -> None:
+    """
+    Expose `/metrics` (Prometheus text format) and `/trace/{trace_id}` (JSON spans) on a FastMCP server.
+    """
+
+    from starlette.requests import Request
+    from starlette.responses import PlainTextResponse, JSONResponse
+
+    @mcp.custom_route("/metrics", methods=["GET"])
+    async def metrics(request: Request) -> PlainTextResponse:
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+    @mcp.custom_route("/trace/{trace_id}", methods=["GET"])
+    async def trace_spans(request: Request) -> JSONResponse:
+        return JSONResponse(trace(request.path_params["trace_id"]))
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    """
+    Serve `/metrics` and `/trace/{trace_id}` from a background thread, for processes without an MCP
+    server such as the Streamlit app running the orchestrator. Started once per process.
+
+    Args:
+        port (int): Port to listen on, 0 disables the endpoint.
+        host (str): Interface to listen on.
+
+    Returns:
+        The HTTP server, or None when disabled or the port is taken.
+    """
+
+    global _metrics_server
+    if port <= 0:
+        return None
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = render().encode("utf-8"), "text/plain; version=0.0.4"
+            elif self.path.startswith("/trace/"):
+                body, content_type = json.dumps(trace(self.path[len("/trace/"):])).encode("utf-8"), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, port), Handler)
+            except OSError as e:
+                print(f" ⚠️ Metrics endpoint not started on port {port}:", e)
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _metrics_server
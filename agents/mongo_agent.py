@@ -1,15 +1,30 @@
 import os
+import json
 import warnings
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage
 from langchain.prompts import ChatPromptTemplate
 from langchain_mongodb.agent_toolkit import MongoDBDatabase
-from langchain_mongodb.agent_toolkit.tool import QueryMongoDBCheckerTool, QueryMongoDBDatabaseTool
-from pymongo import MongoClient
-from fastmcp import FastMCP
+from langchain_mongodb.agent_toolkit.tool import QueryMongoDBCheckerTool
+import asyncio
+import threading
+import pandas as pd
+from pymongo import AsyncMongoClient
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from fastmcp import FastMCP, Context
 from agents import llm
-from agents.templates import mongodb_query_generator_prompt, user_prompt
-from agents.common import State, QueryOutput
+from agents.templates import mongodb_query_generator_prompt, mongodb_chart_query_instructions, user_prompt
+from agents.common import State, QueryOutput, CHART_MAX_POINTS, BATCH_MAX_CONCURRENCY
+from agents.cache import PersistentCache, normalize_question, make_key
+from agents.schema import get_mongo_schema_context
+from agents.results import encode_frame
+from agents.result_cache import ResultCache, ResultCollector, normalize_pipeline, iter_slices
+from agents.mongo_query import parse_aggregate
+from agents.validation import validate_mongo, extract_query, LLM_QUERY_CHECK
+from agents.paging import PageStore, PAGE_SIZE
+from agents.singleflight import SingleFlight
+from agents.metrics import timed, failure, observe_rows, llm_config, set_trace, add_routes, trace_id_var
 
 
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -19,6 +34,13 @@ load_dotenv()
 config_memory = {"configurable": {"thread_id": "1"}}
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = "sales"
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+
+query_cache = PersistentCache(namespace="mongo")
+result_cache = ResultCache(namespace="mongo_results")
+page_store = PageStore()
+in_flight = SingleFlight("run_mongo")
 
 mongo_mcp = FastMCP(name="MongoDBAgent", host="0.0.0", port=8002)
 
@@ -32,14 +54,88 @@ class MongoDBAgent():
         print("Initializing MongoDB Agent...")
         if not MONGO_URI:
             raise ValueError("MONGO_URI environment variable is not set.")
-        self.db = MongoDBDatabase(
-            client=MongoClient(MONGO_URI),
-            database=MONGO_DB_NAME
+        self.schema = get_mongo_schema_context(
+            MONGO_URI,
+            MONGO_DB_NAME,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE
         )
-
         self.llm = llm
+        self.cache = query_cache
+        self.results = result_cache
+        self.schema.on_change(self.cache.invalidate)
+        self.schema.on_change(self.results.invalidate)
+        self._async_client = None
+
+
+    @property
+    def db(self) -> MongoDBDatabase:
+        """Database handle shared through the schema context provider."""
+        return self.schema.db
+
+
+    @property
+    def async_client(self) -> AsyncMongoClient:
+        """Async client (and pool) used by the async pipeline, created on first use."""
+        if self._async_client is None:
+            self._async_client = AsyncMongoClient(
+                MONGO_URI,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE
+            )
+        return self._async_client
+
+
+    def _result_key(self, collection: str, pipeline: list) -> str:
+        """Result cache key of an aggregation on this database."""
+        return make_key(MONGO_DB_NAME, normalize_pipeline(collection, pipeline))
+
+
+    def _cache_key(self, state: State) -> str:
+        """Query cache key of the question and intent of the state, for the current schema."""
+        intent = "chart" if state.get("intent") == "chart" else "database"
+        return make_key(normalize_question(self._question(state)), intent, MONGO_DB_NAME, self.schema.fingerprint)
+
+
+    def _remember(self, state: State, verdict: dict) -> dict:
+        """
+        Cache the query of the state once it passed the checks (the corrected one when the checker
+        rewrote it), so invalid queries are never served from the cache.
+        """
+        if verdict.get("query_valid") is True and not state.get("query_cached"):
+            query = verdict.get("query", state["query"])
+            self.cache.set(self._cache_key(state), {"query": query, "columns": state.get("columns", [])})
+        return verdict
+
+
+    def _question(self, state: State) -> str:
+        """Read the question from the state, falling back to the last human message."""
+        question = state.get("question")
+        if not question:
+            messages = state.get("messages", [])
+            if messages and isinstance(messages[-1], HumanMessage):
+                question = messages[-1].content
+        return question
+
+
+    def _query_prompt(self, question: str, db_context: str, intent: str = None):
+        """Build the query generation prompt, asking for the aggregated chart series for chart intents."""
+        system_prompt = mongodb_query_generator_prompt + (mongodb_chart_query_instructions if intent == "chart" else "")
+        query_prompt_template = ChatPromptTemplate([
+            ("system", system_prompt),
+            ("user", user_prompt)
+        ])
+        return query_prompt_template.invoke(
+            {
+                "top_k": CHART_MAX_POINTS if intent == "chart" else 100,
+                "db_context": db_context,
+                "input": question,
+            },
+            config=config_memory
+        )
 
 
+    @timed("write_query")
     def write_query(self, state: State) -> dict:
         """
         Generate MongoDB query to fetch information.
@@ -55,46 +151,73 @@ class MongoDBAgent():
             ValueError: If the user prompt is not provided or if the query generation fails.
         """
 
-        print(f" Generating query..." )
+        print(" Generating query..." )
         try:
-            question = state.get("question")
-            if not question:
-                messages = state.get("messages", [])
-                if messages and isinstance(messages[-1], HumanMessage):
-                    question = messages[-1].content
-
-            query_prompt_template = ChatPromptTemplate([
-                ("system", mongodb_query_generator_prompt),
-                ("user", user_prompt)
-            ])
-
-            prompt = query_prompt_template.invoke(
-                {
-                    "top_k": 100,
-                    "db_context": self.db.get_context(),
-                    "input": question,
-                },
-                config=config_memory
-            )
+            question = self._question(state)
+            # Refresh the schema version (and fingerprint) before looking up the cache
+            self.schema.get_context()
+            intent = "chart" if state.get("intent") == "chart" else "database"
+            cache_key = self._cache_key(state)
+            cached = self.cache.get(cache_key)
+            if cached:
+                print(" Query cache hit.")
+                return {"query": cached["query"], "query_cached": True}
+
+            # Only the tables relevant to the question are described in the prompt
+            db_context = self.schema.get_context(question)
+            prompt = self._query_prompt(question, db_context, intent)
+            structured_llm = self.llm.with_structured_output(QueryOutput)
+            result = structured_llm.invoke(prompt, config=llm_config(config_memory, "write_query"))
+            print(" Generated query successfully.")
+            return {"query": result["query"], "query_cached": False}
+        except Exception as e:
+            print(" ❌ Query Generation failure:\n", e)
+            failure("write_query")
+            return {"query": ""}
+
+
+    @timed("write_query")
+    async def awrite_query(self, state: State) -> dict:
+        """Async counterpart of `write_query`."""
+
+        print(" Generating query..." )
+        try:
+            question = self._question(state)
+            # the schema probe is a blocking round trip, keep it off the event loop
+            await asyncio.to_thread(self.schema.get_context)
+            intent = "chart" if state.get("intent") == "chart" else "database"
+            cache_key = self._cache_key(state)
+            cached = self.cache.get(cache_key)
+            if cached:
+                print(" Query cache hit.")
+                return {"query": cached["query"], "query_cached": True}
+
+            # Only the tables relevant to the question are described in the prompt
+            db_context = await asyncio.to_thread(self.schema.get_context, question)
+            prompt = self._query_prompt(question, db_context, intent)
             structured_llm = self.llm.with_structured_output(QueryOutput)
-            result = structured_llm.invoke(prompt, config=config_memory)
+            result = await structured_llm.ainvoke(prompt, config=llm_config(config_memory, "write_query"))
             print(" Generated query successfully.")
-            return {"query": result["query"]}
+            return {"query": result["query"], "query_cached": False}
         except Exception as e:
             print(" ❌ Query Generation failure:\n", e)
+            failure("write_query")
             return {"query": ""}
 
 
+    @timed("check_query")
     def check_query(self, state: State) -> dict:
         """
         Check MongoDB query for correctness.
-        This method uses a language model to validate the generated MongoDB query.
+        The aggregation pipeline is first validated structurally, the language model checker
+        is only called when that fails or LLM_QUERY_CHECK is "always".
 
         Args:
             state (State): The state containing the generated MongoDB query.
 
         Returns:
-            dict: A dictionary containing the result of the query check.
+            dict: A dictionary containing the result of the query check, the validity flag and, when the
+                LLM checker rewrote it, the corrected query.
 
         Raises:
             ValueError: If the query is not valid or if the query check fails.
@@ -103,51 +226,359 @@ class MongoDBAgent():
         try:
             print(" Checking query...")
             if not state.get("query"):
-                return {"result": "No query to check."}
+                return {"result": "No query to check.", "query_valid": False}
+            if state.get("query_cached") and LLM_QUERY_CHECK != "always":
+                # Only queries that passed the checks are cached
+                print(" Cached query, already checked.")
+                return {"result": state["query"], "query_valid": True}
+            collections = self.db.get_usable_collection_names()
+            is_valid, error = validate_mongo(state["query"], collections)
+            if is_valid and LLM_QUERY_CHECK != "always":
+                print(" Query passed local validation.")
+                return self._remember(state, {"result": state["query"], "query_valid": True})
+            if error:
+                print(" Local validation:", error)
+
             execute_query_tool = QueryMongoDBCheckerTool(
                 db=self.db,
                 llm=self.llm,
                 description='\n    Check if the query is correct.\n    If the query is not correct, an error message will be returned.\n    If an error is returned, rewrite the query, check the query, and try again.\n    '
             )
-            result = execute_query_tool.invoke(state["query"], config=config_memory)
-            # flag to indicate if the query is valid
-            is_valid = False
-            if result.content[1:7] == "python" or result.content[3:9] == "python" or result.content[1:5] == "json" or result.content[3:7] == "json":
-                is_valid = True
+            result = execute_query_tool.invoke(state["query"], config=llm_config(config_memory, "check_query"))
+            return self._remember(state, self._checker_verdict(state, result.content, collections))
+        except Exception as e:
+            print(" ❌ Query Check failure:\n", e)
+            failure("check_query")
+            return {"result": ""}
+
+
+    @timed("check_query")
+    async def acheck_query(self, state: State) -> dict:
+        """Async counterpart of `check_query`."""
+
+        try:
+            print(" Checking query...")
+            if not state.get("query"):
+                return {"result": "No query to check.", "query_valid": False}
+            if state.get("query_cached") and LLM_QUERY_CHECK != "always":
+                # Only queries that passed the checks are cached
+                print(" Cached query, already checked.")
+                return {"result": state["query"], "query_valid": True}
+            collections = self.db.get_usable_collection_names()
+            is_valid, error = validate_mongo(state["query"], collections)
+            if is_valid and LLM_QUERY_CHECK != "always":
+                print(" Query passed local validation.")
+                return self._remember(state, {"result": state["query"], "query_valid": True})
+            if error:
+                print(" Local validation:", error)
 
-            return {"result": result}
+            execute_query_tool = QueryMongoDBCheckerTool(
+                db=self.db,
+                llm=self.llm,
+                description='\n    Check if the query is correct.\n    If the query is not correct, an error message will be returned.\n    If an error is returned, rewrite the query, check the query, and try again.\n    '
+            )
+            result = await execute_query_tool.ainvoke(state["query"], config=llm_config(config_memory, "check_query"))
+            return self._remember(state, self._checker_verdict(state, result.content, collections))
         except Exception as e:
             print(" ❌ Query Check failure:\n", e)
+            failure("check_query")
             return {"result": ""}
 
 
+    def _checker_verdict(self, state: State, content: str, collections: list) -> dict:
+        """Turn the answer of the LLM checker into the validity flag and the (possibly rewritten) query."""
+
+        # flag to indicate if the query is valid
+        is_valid = False
+        if content[1:7] == "python" or content[3:9] == "python" or content[1:5] == "json" or content[3:7] == "json":
+            is_valid = True
+        query = extract_query(content) if is_valid else state["query"]
+        is_valid, _ = validate_mongo(query, collections)
+
+        return {"result": content, "query": query, "query_valid": is_valid}
+
+
+    @timed("execute_query")
     def execute_query(self, state: State) -> dict:
         """
         Execute MongoDB query.
-        This method executes the validated MongoDB query and returns the result.
+        This method executes the validated MongoDB query and returns the result as a typed columnar envelope.
         
         Args:
             state (State): The state containing the validated MongoDB query.
 
         Returns:
-            dict: A dictionary containing the result of the executed query.
+            dict: A dictionary containing the columnar result of the executed query (see `agents.results`).
 
         Raises:
             ValueError: If the query execution fails.
         """
         try:
+            if state.get("query_valid") is False:
+                print(" ❌ Skipping execution of invalid query.")
+                return {"data": None}
             print(" Executing query...")
-            execute_query_tool = QueryMongoDBDatabaseTool(
-                db=self.db,
-                description = '\n    Execute a MongoDB query against the database and get back the result..\n    If the query is not correct, an error message will be returned.\n    If an error is returned, rewrite the query, check the query, and try again.\n    '
-            )
-            return {"result": execute_query_tool.invoke(state["query"],config=config_memory)}
+            collection, pipeline = parse_aggregate(state["query"])
+            if collection not in self.db.get_usable_collection_names():
+                raise ValueError(f"Collection {collection} does not exist!")
+            # Results of the current data version are served from memory
+            version, key = self.schema.data_version(), self._result_key(collection, pipeline)
+            df = self.results.get(key, version)
+            if df is not None:
+                print(" Result cache hit.")
+            else:
+                df = pd.DataFrame(list(self.schema.client[MONGO_DB_NAME][collection].aggregate(pipeline)))
+                self.results.set(key, df, version)
+            observe_rows("execute_query", len(df))
+            return {"data": encode_frame(df)}
         except Exception as e:
             print(" ❌ Query Execution failure:\n", e)
-            return {"result": ""}
+            failure("execute_query")
+            return {"data": None}
+
+
+    @timed("execute_query")
+    async def aexecute_query(self, state: State) -> dict:
+        """Async counterpart of `execute_query`, running on the async driver."""
+
+        try:
+            if state.get("query_valid") is False:
+                print(" ❌ Skipping execution of invalid query.")
+                return {"data": None}
+            print(" Executing query...")
+            collection, pipeline = parse_aggregate(state["query"])
+            if collection not in self.db.get_usable_collection_names():
+                raise ValueError(f"Collection {collection} does not exist!")
+            version, key = await asyncio.to_thread(self.schema.data_version), self._result_key(collection, pipeline)
+            df = self.results.get(key, version)
+            if df is not None:
+                print(" Result cache hit.")
+            else:
+                cursor = await self.async_client[MONGO_DB_NAME][collection].aggregate(pipeline)
+                df = pd.DataFrame(await cursor.to_list())
+                self.results.set(key, df, version)
+            observe_rows("execute_query", len(df))
+            return {"data": encode_frame(df)}
+        except Exception as e:
+            print(" ❌ Query Execution failure:\n", e)
+            failure("execute_query")
+            return {"data": None}
+
+
+    def execute_query_pages(self, state: State, page_size: int = PAGE_SIZE):
+        """
+        Execute MongoDB query and yield the result in pages read from the cursor in batches,
+        so the first documents are available before the whole result is fetched.
+
+        Args:
+            state (State): The state containing the validated MongoDB query.
+            page_size (int): Documents per page, also used as the cursor batch size.
+
+        Yields:
+            pd.DataFrame: The pages of the result, a single empty page when there are no documents.
+        """
+
+        if state.get("query_valid") is False:
+            print(" ❌ Skipping execution of invalid query.")
+            return
+        print(" Executing query...")
+        collection, pipeline = parse_aggregate(state["query"])
+        if collection not in self.db.get_usable_collection_names():
+            raise ValueError(f"Collection {collection} does not exist!")
+        version, key = self.schema.data_version(), self._result_key(collection, pipeline)
+        cached = self.results.get(key, version)
+        if cached is not None:
+            print(" Result cache hit.")
+            yield from iter_slices(cached, page_size)
+            return
+        # The pages are kept to cache the result once the cursor is exhausted
+        collector = ResultCollector(self.results, key, version)
+        page, empty = [], True
+        for document in self.schema.client[MONGO_DB_NAME][collection].aggregate(pipeline, batchSize=page_size):
+            page.append(document)
+            if len(page) == page_size:
+                empty = False
+                frame = pd.DataFrame(page)
+                collector.add(frame)
+                yield frame
+                page = []
+        if page or empty:
+            frame = pd.DataFrame(page)
+            collector.add(frame)
+            yield frame
+        collector.store()
+
+
+    async def aexecute_query_pages(self, state: State, page_size: int = PAGE_SIZE):
+        """Async counterpart of `execute_query_pages`, streaming from the async driver."""
+
+        if state.get("query_valid") is False:
+            print(" ❌ Skipping execution of invalid query.")
+            return
+        print(" Executing query...")
+        collection, pipeline = parse_aggregate(state["query"])
+        if collection not in self.db.get_usable_collection_names():
+            raise ValueError(f"Collection {collection} does not exist!")
+        version, key = await asyncio.to_thread(self.schema.data_version), self._result_key(collection, pipeline)
+        cached = self.results.get(key, version)
+        if cached is not None:
+            print(" Result cache hit.")
+            for frame in iter_slices(cached, page_size):
+                yield frame
+            return
+        collector = ResultCollector(self.results, key, version)
+        cursor = await self.async_client[MONGO_DB_NAME][collection].aggregate(pipeline, batchSize=page_size)
+        page, empty = [], True
+        async for document in cursor:
+            page.append(document)
+            if len(page) == page_size:
+                empty = False
+                frame = pd.DataFrame(page)
+                collector.add(frame)
+                yield frame
+                page = []
+        if page or empty:
+            frame = pd.DataFrame(page)
+            collector.add(frame)
+            yield frame
+        collector.store()
+
+
+    @timed("write_query_batch")
+    async def awrite_queries(self, states: list, max_concurrency: int = BATCH_MAX_CONCURRENCY) -> list:
+        """
+        Batched counterpart of `awrite_query`: the questions missing from the cache are sent to the
+        language model in one `abatch`, with at most `max_concurrency` calls in flight.
+
+        Args:
+            states (list): The states containing the user prompts, distinct questions are expected.
+            max_concurrency (int): Maximum number of concurrent model calls.
+
+        Returns:
+            list: One dictionary with the generated MongoDB query per state, in the order of `states`.
+        """
+
+        await asyncio.to_thread(self.schema.get_context)
+        results, pending = [None] * len(states), []
+        for i, state in enumerate(states):
+            intent = "chart" if state.get("intent") == "chart" else "database"
+            cache_key = self._cache_key(state)
+            cached = self.cache.get(cache_key)
+            if cached:
+                results[i] = {"query": cached["query"], "query_cached": True}
+            else:
+                pending.append((i, cache_key, intent))
+        if not pending:
+            return results
+
+        print(f" Generating {len(pending)} queries..." )
+        prompts = []
+        for i, _, intent in pending:
+            question = self._question(states[i])
+            db_context = await asyncio.to_thread(self.schema.get_context, question)
+            prompts.append(self._query_prompt(question, db_context, intent))
+        structured_llm = self.llm.with_structured_output(QueryOutput)
+        config = llm_config({**config_memory, "max_concurrency": max_concurrency}, "write_query")
+        outputs = await structured_llm.abatch(prompts, config=config, return_exceptions=True)
+        for (i, _, _), output in zip(pending, outputs):
+            if isinstance(output, Exception):
+                print(" ❌ Query Generation failure:\n", output)
+                failure("write_query")
+                results[i] = {"query": ""}
+                continue
+            results[i] = {"query": output["query"], "query_cached": False}
+        return results
+
+
+    async def arun_batch(self, questions: list, intent: str = "database", max_concurrency: int = BATCH_MAX_CONCURRENCY):
+        """
+        Answer a batch of questions: identical questions are answered once, the queries are written with
+        batched model calls, then checked and executed concurrently over the connection pool.
+
+        Args:
+            questions (list): The user's questions.
+            intent (str): "chart" to return the aggregated chart series instead of raw documents.
+            max_concurrency (int): Maximum number of concurrent model calls and query executions.
+
+        Yields:
+            tuple: The positions in `questions` a result answers and its state, in order of completion.
+        """
+
+        positions = {}
+        for i, question in enumerate(questions):
+            positions.setdefault(normalize_question(question), []).append(i)
+        states = [State(question=questions[indexes[0]], intent=intent, trace_id=trace_id_var.get())
+                  for indexes in positions.values()]
+        for state, result in zip(states, await self.awrite_queries(states, max_concurrency)):
+            state.update(result)
+
+        # Executions beyond the pool size would only wait for a connection
+        semaphore = asyncio.Semaphore(max(min(max_concurrency, MONGO_MAX_POOL_SIZE), 1))
+
+        async def run(indexes: list, state: State) -> tuple:
+            async with semaphore:
+                state.update(await self.acheck_query(state))
+                state.update(await self.aexecute_query(state))
+            return indexes, state
+
+        tasks = [asyncio.create_task(run(indexes, state)) for indexes, state in zip(positions.values(), states)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+    def invalidate_cache(self) -> None:
+        """Drop all cached queries, to be called when the database schema changes."""
+        self.cache.invalidate()
+
+
+    def invalidate_results(self) -> None:
+        """Drop all cached query results, e.g. after a load the data version can't see."""
+        self.results.invalidate()
+
+
+    def ping(self) -> bool:
+        """Check that the MongoDB server answers."""
+        self.schema.client.admin.command("ping")
+        return True
+
+
+_agent = None
+_agent_lock = threading.Lock()
+
+
+def get_agent() -> MongoDBAgent:
+    """
+    Return the MongoDBAgent shared by all tool calls of this server.
+    The agent (and its connection pool) is built on first use and then reused.
+    """
+
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = MongoDBAgent(llm=llm)
+    return _agent
+
+
+@mongo_mcp.custom_route("/ready", methods=["GET"])
+async def ready(request: Request) -> JSONResponse:
+    """Readiness check: the agent is built and the database answers."""
+    try:
+        await asyncio.to_thread(lambda: get_agent().ping())
+        return JSONResponse({"status": "ready"})
+    except Exception as e:
+        return JSONResponse({"status": "not ready", "error": str(e)}, status_code=503)
+
+
+add_routes(mongo_mcp)
+
 
 @mongo_mcp.tool()
-def run_mongo(query: str) -> State:
+async def run_mongo(query: str, page_size: int = 0, intent: str = "database", trace_id: str = None) -> State:
     """
     Run a MongoDB query.
     This function initializes the MongoDBAgent, generates a query based on the user's input,
@@ -155,27 +586,123 @@ def run_mongo(query: str) -> State:
 
     Args:
         query (str): The user's question or prompt for the MongoDB query.
+        page_size (int): When positive, only the first page of documents is returned together with a
+            `page_token` to read the following pages with `fetch_page`.
+        intent (str): "chart" to return the aggregated series of the chart instead of raw documents.
+        trace_id (str): ID correlating the stage metrics of one request across servers.
     """
     
-    mongodb_agent = MongoDBAgent(llm=llm)
+    mongodb_agent = get_agent()
     state = State()
     state["question"] = query
+    state["intent"] = intent
+    state["trace_id"] = set_trace(trace_id)
+
+    async def pipeline() -> State:
+        result = State(state)
+        result.update(await mongodb_agent.awrite_query(result))
+        # print("✅ write_query output:", result['query'])
 
-    result = mongodb_agent.write_query(state)
-    state.update(result)
-    # print("✅ write_query output:", result['query'])
+        # Check query
+        result.update(await mongodb_agent.acheck_query(result))
 
-    # Check query
-    result1 = mongodb_agent.check_query(state)
-    state.update(result1)
-    # print("✅ check_query output:", result1)
+        # Execute query, paginated results get a cursor per caller below
+        if page_size <= 0:
+            result.update(await mongodb_agent.aexecute_query(result))
+        return result
 
-    # Execute query
-    result2 = mongodb_agent.execute_query(state)
-    state.update(result2)
-    # print("✅ execute_query output:", result2["result"], "/n", type(result2["result"]))
+    # Identical questions in flight share one pipeline run (and its LLM calls and query)
+    key = make_key(normalize_question(query), intent, MONGO_DB_NAME, page_size > 0)
+    state.update({**await in_flight.do(key, pipeline), "trace_id": state["trace_id"]})
 
+    if page_size > 0:
+        try:
+            page, token = await page_store.start(mongodb_agent.aexecute_query_pages(state, page_size), page_size)
+            state.update({"data": encode_frame(page) if page is not None else None, "page_token": token})
+        except Exception as e:
+            print(" ❌ Query Execution failure:\n", e)
+            state.update({"data": None, "page_token": None})
     return state
 
+@mongo_mcp.tool()
+async def fetch_page(page_token: str, trace_id: str = None) -> dict:
+    """
+    Read the next page of a paginated `run_mongo` result.
+
+    Args:
+        page_token (str): The `page_token` returned with the previous page.
+        trace_id (str): ID correlating the stage metrics of one request across servers.
+
+    Returns:
+        dict: The columnar page in `data` and the token of the next page in `page_token` (None when done).
+    """
+
+    set_trace(trace_id)
+    page, token = await page_store.next(page_token)
+    return {"data": encode_frame(page) if page is not None else None, "page_token": token}
+
+@mongo_mcp.tool()
+async def close_page(page_token: str, trace_id: str = None) -> dict:
+    """
+    Close the cursor of a paginated `run_mongo` result that won't be read to the end.
+
+    Args:
+        page_token (str): The `page_token` returned with the last page read.
+        trace_id (str): ID correlating the stage metrics of one request across servers.
+
+    Returns:
+        dict: `closed` is False when the cursor was already closed or expired.
+    """
+
+    set_trace(trace_id)
+    return {"closed": await page_store.close(page_token)}
+
+@mongo_mcp.tool()
+async def invalidate_results() -> dict:
+    """
+    Drop the cached query results, e.g. after loading data.
+
+    Returns:
+        dict: The result cache statistics before the results were dropped.
+    """
+
+    mongo_agent = get_agent()
+    stats = mongo_agent.results.stats()
+    mongo_agent.invalidate_results()
+    return stats
+
+@mongo_mcp.tool()
+async def run_mongo_batch(queries: list[str], intent: str = "database", max_concurrency: int = BATCH_MAX_CONCURRENCY,
+                          trace_id: str = None, ctx: Context = None) -> list:
+    """
+    Answer a batch of questions using the MongoDBAgent, writing the queries with batched model calls and
+    running them concurrently. As each result completes, a progress notification is sent whose message
+    is that result as JSON (the same item as in the returned list).
+
+    Args:
+        queries (list[str]): The user's questions, identical ones are answered once.
+        intent (str): "chart" to return the aggregated series of the charts instead of raw documents.
+        max_concurrency (int): Maximum number of concurrent model calls and query executions.
+        trace_id (str): ID correlating the stage metrics of one request across servers.
+
+    Returns:
+        list: The states of the results in order of completion, each with the positions in `queries`
+            it answers in `indexes`.
+    """
+
+    mongodb_agent = get_agent()
+    set_trace(trace_id)
+    results, answered = [], 0
+    async for indexes, state in mongodb_agent.arun_batch(queries, intent, max_concurrency):
+        item = {"indexes": indexes, **state}
+        results.append(item)
+        answered += len(indexes)
+        if ctx is not None:
+            # The notification carries the result itself, clients don't wait for the slowest question
+            await ctx.report_progress(answered, len(queries), json.dumps(item, default=str))
+    return results
+
 if __name__ == "__main__":
+    # Build the agent and open the connection pool before accepting requests
+    get_agent().ping()
     mongo_mcp.run(transport="http")
@@ -0,0 +1,45 @@
+import re
+from bson import json_util
+
+
+_AGGREGATE_RE = re.compile(r"^\s*db\.([A-Za-z_][\w.-]*?)\.aggregate\(\s*(.*)\)\s*;?\s*$", re.DOTALL)
+_BARE_KEY_RE = re.compile(r"([{,]\s*)([$A-Za-z_][\w$.]*)\s*:")
+
+
+def _loads(text: str):
+    """Parse a shell style pipeline, tolerating unquoted keys and single quotes."""
+
+    try:
+        return json_util.loads(text)
+    except ValueError:
+        relaxed = _BARE_KEY_RE.sub(r'\1"\2":', text.replace("'", '"'))
+        return json_util.loads(relaxed)
+
+
+def parse_aggregate(command: str) -> tuple:
+    """
+    Split a `db.collectionName.aggregate([...])` command into collection and pipeline.
+
+    Args:
+        command (str): The MongoDB query generated by the agent.
+
+    Returns:
+        tuple: The collection name and the aggregation pipeline (list of stages).
+
+    Raises:
+        ValueError: If the command is not an aggregate call or the pipeline can't be parsed.
+    """
+
+    match = _AGGREGATE_RE.match((command or "").strip().strip("`"))
+    if not match:
+        raise ValueError(f"Invalid command format: {command}")
+    collection, body = match.groups()
+    try:
+        pipeline = _loads(body)
+    except ValueError as e:
+        raise ValueError(f"Invalid aggregation pipeline: {e}")
+    if isinstance(pipeline, dict):
+        pipeline = [pipeline]
+    if not isinstance(pipeline, list):
+        raise ValueError("The aggregation pipeline must be a list of stages.")
+    return collection, pipeline
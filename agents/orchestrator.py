@@ -1,6 +1,21 @@
+import os
+import json
+import time
+import asyncio
+import threading
 from fastmcp import Client
+from fastmcp.exceptions import ToolError
 import pandas as pd
-import plotly.io as pio
+from agents.results import encode_frame, decode_frame
+from agents.chart_agent import decode_figure
+from agents.common import adetect_intent, intent_hint
+from agents.paging import PAGE_SIZE
+from agents.metrics import trace_id_var, set_trace, record_stage, observe_payload, start_metrics_server
+from agents.cache import normalize_question, make_key
+from agents.singleflight import SingleFlight
+
+# Payload format of the DataFrame sent to the chart server, "ref" when both run on the same host
+CHART_TRANSPORT = os.getenv("CHART_TRANSPORT", "arrow")
 
 config = {
     "mcpServers": {
@@ -12,7 +27,167 @@ config = {
 
 client = Client(config)        
 
-async def orchestrate(db_choice: str, query: str, intent: str):
+# Reconnection attempts of the persistent sessions held by OrchestratorService
+MCP_RECONNECT_ATTEMPTS = int(os.getenv("MCP_RECONNECT_ATTEMPTS", "2"))
+
+# Server and tool answering the questions of each database choice, uploads are queried by the SQL agent
+DATA_TOOLS = {"SQL": ("SQL", "run_sql"), "MongoDB": ("Mongo", "run_mongo"), "File Upload": ("SQL", "run_sql")}
+
+# Tools whose concurrent identical calls share one reply, paginated calls keep a cursor per caller
+COALESCED_TOOLS = {"run_sql", "run_mongo", "create_chart"}
+in_flight = SingleFlight("orchestrator")
+
+
+def _data_arguments(db_choice: str, query: str, intent: str, database: str) -> dict:
+    arguments = {"query": query, "intent": intent}
+    if db_choice == "File Upload":
+        arguments["database"] = database
+    return arguments
+
+
+def _with_trace(arguments: dict) -> dict:
+    """Tool arguments carrying the trace ID of the current request, if any."""
+    trace_id = trace_id_var.get()
+    return {"trace_id": trace_id, **arguments} if trace_id else arguments
+
+
+async def _instrumented(tool: str, call):
+    """Await an MCP call, recording its wall time and reply size as stage `mcp_<tool>`."""
+
+    start, status = time.perf_counter(), "ok"
+    try:
+        response = await call
+        if response.content:
+            observe_payload(f"mcp_{tool}", len(response.content[0].text))
+        return response
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        record_stage(f"mcp_{tool}", time.perf_counter() - start, status)
+
+
+def _flight_key(server: str, tool: str, arguments: dict):
+    """Key of a coalesced call: normalized question, server, tool and the other arguments (intent, data source...)."""
+
+    if tool not in COALESCED_TOOLS or arguments.get("page_size"):
+        return None
+    question = arguments.get("query") or arguments.get("user_prompt")
+    rest = {k: v for k, v in arguments.items() if k not in ("query", "user_prompt", "trace_id")}
+    return make_key(server, tool, normalize_question(question), json.dumps(rest, sort_keys=True, default=str))
+
+
+async def _call_once(server: str, tool: str, arguments: dict, call):
+    """Await `call()`, sharing the reply with the concurrent identical calls of coalesced tools."""
+    key = _flight_key(server, tool, arguments)
+    return await (in_flight.do(key, call) if key else call())
+
+
+async def call_tool(server: str, tool: str, arguments: dict):
+    """Call a tool of one of the configured servers, opening a session for the call."""
+    async def call():
+        async with client:
+            # tools = await client.list_tools()
+            # print(tools)
+            return await _instrumented(tool, client.call_tool(f"{server}_{tool}", _with_trace(arguments)))
+    return await _call_once(server, tool, arguments, call)
+
+
+async def fetch_data(db_choice: str, query: str, call_tool=call_tool, intent: str = "database", database: str = None):
+    """
+    Run the data pipeline of the selected database for a question.
+
+    Args:
+        db_choice (str): The database choice ("SQL", "MongoDB", or "File Upload").
+        query (str): The user's question.
+        call_tool (callable): Coroutine function (server, tool, arguments) used to reach the MCP servers.
+        intent (str): "chart" to fetch the aggregated series of the chart instead of raw rows.
+        database (str): Store of the uploaded file (see `agents.file_store`) for "File Upload".
+
+    Returns:
+        pd.DataFrame: The query result, or None if the database choice has no backend.
+    """
+
+    if db_choice not in DATA_TOOLS or (db_choice == "File Upload" and not database):
+        return None
+    server, tool = DATA_TOOLS[db_choice]
+    response = await call_tool(server, tool, _data_arguments(db_choice, query, intent, database))
+    state = json.loads(response.content[0].text)
+    return decode_frame(state.get("data"))
+
+
+async def iter_pages(db_choice: str, query: str, page_size: int = PAGE_SIZE, call_tool=call_tool, intent: str = "database",
+                     database: str = None):
+    """
+    Run the data pipeline of the selected database and yield the result page by page, so the
+    first rows can be shown while the following ones are still being read.
+
+    Args:
+        db_choice (str): The database choice ("SQL", "MongoDB", or "File Upload").
+        query (str): The user's question.
+        page_size (int): Rows per page.
+        call_tool (callable): Coroutine function (server, tool, arguments) used to reach the MCP servers.
+        intent (str): "chart" to fetch the aggregated series of the chart instead of raw rows.
+        database (str): Store of the uploaded file (see `agents.file_store`) for "File Upload".
+
+    Yields:
+        pd.DataFrame: The pages of the query result, nothing if the database choice has no backend.
+    """
+
+    if db_choice not in DATA_TOOLS or (db_choice == "File Upload" and not database):
+        return
+    server, tool = DATA_TOOLS[db_choice]
+    arguments = _data_arguments(db_choice, query, intent, database)
+    response = await call_tool(server, tool, {**arguments, "page_size": page_size})
+    page = json.loads(response.content[0].text)
+    try:
+        while True:
+            if page.get("data"):
+                yield decode_frame(page["data"])
+            if not page.get("page_token"):
+                return
+            response = await call_tool(server, "fetch_page", {"page_token": page["page_token"]})
+            page = json.loads(response.content[0].text)
+    finally:
+        # A caller stopping early gives the server side cursor (and its connection) back right away
+        if page.get("page_token"):
+            try:
+                await call_tool(server, "close_page", {"page_token": page["page_token"]})
+            except Exception as e:
+                print(" ❌ Closing the page cursor failed:", e)
+
+
+async def render_chart(query: str, df: pd.DataFrame, call_tool=call_tool, full_resolution: bool = False):
+    """
+    Create a chart for the question from the fetched data using the ChartAgent.
+
+    Args:
+        query (str): The user's question.
+        df (pd.DataFrame): The data to plot.
+        call_tool (callable): Coroutine function (server, tool, arguments) used to reach the MCP servers.
+        full_resolution (bool): Keep every point of large scatter/line traces instead of downsampling them.
+
+    Returns:
+        plotly.graph_objects.Figure: The chart.
+        str: The Python code used to create the chart.
+    """
+
+    if df is None or df.empty:
+        raise ValueError("DataFrame is empty. Cannot create chart without data.")
+
+    arguments = {"user_prompt": query, "data": encode_frame(df, CHART_TRANSPORT)}
+    if full_resolution:
+        arguments["max_points"] = 0
+    response = await call_tool("Chart", "create_chart", arguments)
+    evaulated_response = json.loads(response.content[0].text)
+    if evaulated_response[0] is None:
+        raise ValueError("The chart server could not create the chart.")
+    fig = decode_figure(evaulated_response[0])
+    query_code = evaulated_response[1]
+    return fig, query_code
+
+
+async def orchestrate(db_choice: str, query: str, intent: str, call_tool=call_tool, database: str = None):
     """
     Orchestrates the query execution based on the selected database and intent.
 
@@ -20,41 +195,202 @@ async def orchestrate(db_choice: str, query: str, intent: str):
         db_choice (str): The database choice ("SQL", "MongoDB", or "File Upload").
         query (str): The query to execute.
         intent (str): The intent of the query (e.g., "chart", "dataframe").
+        call_tool (callable): Coroutine function (server, tool, arguments) used to reach the MCP servers.
+        database (str): Store of the uploaded file (see `agents.file_store`) for "File Upload".
     
     Returns:
         pd.DataFrame or plotly.graph_objects.Figure: The result of the query execution.
         str: The generated Python code for chart creation if intent is "chart".
     """
 
-    df, fig = None, None
-    async with client:
-        # tools = await client.list_tools()
-        # print(tools)
-        if db_choice == "SQL":
-            response = await client.call_tool("SQL_run_sql", {"query": query})
-            state = eval(response.content[0].text)
-            df = pd.DataFrame(data=eval(state.get("result")), columns=state.get("columns"))
-        elif db_choice == "MongoDB":
-            response = await client.call_tool("Mongo_run_mongo", {"query": query})
-            state = eval(response.content[0].text)
-            df = pd.DataFrame(data=eval(state.get("result")))
-
+    df = await fetch_data(db_choice, query, call_tool, intent, database)
     if intent == "chart":
-        if df is None:
-            raise ValueError("DataFrame is empty. Cannot create chart without data.")
-    
-        # Create chart using the ChartAgent
-        if df.empty:
-            raise ValueError("DataFrame is empty. Cannot create chart without data.")
-        
-        async with client:
-            response = await client.call_tool("Chart_create_chart", {
-                "user_prompt": query,
-                "df": df.to_dict(orient="records")
-            })
-            evaulated_response = eval(response.content[0].text)
-            fig = pio.from_json(evaulated_response[0])
-            query_code = evaulated_response[1]
-        return fig, query_code
+        return await render_chart(query, df, call_tool)
     else:
         return df, None
+
+
+async def answer(db_choice: str, query: str, call_tool=call_tool, database: str = None):
+    """
+    Detects the intent of the question while the data pipeline is already running, then
+    joins both before the chart step. The data fetch doesn't depend on the intent, so the
+    intent classification is taken off the critical path.
+
+    Args:
+        db_choice (str): The database choice ("SQL", "MongoDB", or "File Upload").
+        query (str): The user's question.
+        call_tool (callable): Coroutine function (server, tool, arguments) used to reach the MCP servers.
+        database (str): Store of the uploaded file (see `agents.file_store`) for "File Upload".
+
+    Returns:
+        str: The detected intent ("database", "chart" or "other").
+        pd.DataFrame or plotly.graph_objects.Figure: The result, None for "other".
+        str: The generated Python code for chart creation if intent is "chart".
+    """
+
+    if trace_id_var.get() is None:
+        set_trace()
+    # The final intent isn't known yet, a confident local "chart" already gets the aggregated series
+    intent_task = asyncio.create_task(adetect_intent(query))
+    data_task = asyncio.create_task(fetch_data(db_choice, query, call_tool, intent_hint(query), database))
+
+    intent = await intent_task
+    if intent not in ("database", "chart"):
+        # Nothing to show, don't wait for (or keep) the data
+        data_task.cancel()
+        return intent, None, None
+
+    df = await data_task
+    if intent == "chart":
+        fig, code = await render_chart(query, df, call_tool)
+        return intent, fig, code
+    return intent, df, None
+
+
+
+class OrchestratorService():
+    """
+    Long-lived orchestrator owning one background event loop and a persistent MCP session per server.
+    Streamlit reruns submit work to it instead of paying for a new event loop and session handshakes
+    on every message.
+    """
+
+    def __init__(self, servers: dict = None):
+        """
+        Start the background event loop.
+
+        Args:
+            servers (dict): Server name to {"url": ...} mapping, defaults to the `config` servers.
+        """
+
+        self.servers = servers or config["mcpServers"]
+        self._clients = {}
+        self._locks = {}
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="orchestrator-loop", daemon=True)
+        self._thread.start()
+        # The mcp_<tool> and detect_intent timings of this process, the MCP servers expose their own
+        start_metrics_server()
+
+
+    async def _session(self, server: str) -> Client:
+        """Return the connected client of a server, (re)connecting when needed."""
+
+        lock = self._locks.setdefault(server, asyncio.Lock())
+        async with lock:
+            session = self._clients.get(server)
+            if session is None or not session.is_connected():
+                session = Client(self.servers[server]["url"])
+                await session.__aenter__()
+                self._clients[server] = session
+            return session
+
+
+    async def _reset(self, server: str) -> None:
+        session = self._clients.pop(server, None)
+        if session is not None:
+            try:
+                await session.close()
+            except Exception as e:
+                print(f"⚠️ Closing {server} session failed:", e)
+
+
+    async def call_tool(self, server: str, tool: str, arguments: dict):
+        """
+        Call a tool over the persistent session of a server, reconnecting on transport failures.
+        Concurrent identical calls of the data and chart tools share one reply.
+
+        Args:
+            server (str): Server name ("SQL", "Mongo" or "Chart").
+            tool (str): Tool name on that server.
+            arguments (dict): Tool arguments.
+
+        Returns:
+            The MCP tool result.
+        """
+
+        return await _call_once(server, tool, arguments, lambda: self._call_tool(server, tool, arguments))
+
+
+    async def _call_tool(self, server: str, tool: str, arguments: dict):
+        for attempt in range(MCP_RECONNECT_ATTEMPTS + 1):
+            try:
+                session = await self._session(server)
+                return await _instrumented(tool, session.call_tool(tool, _with_trace(arguments)))
+            except ToolError:
+                raise
+            except Exception as e:
+                await self._reset(server)
+                if attempt == MCP_RECONNECT_ATTEMPTS:
+                    raise
+                print(f"⚠️ {server} session failed, reconnecting:", e)
+
+
+    @staticmethod
+    async def _traced(coro, trace_id: str):
+        """Run a coroutine as part of a trace, its MCP calls carry the trace ID."""
+        if trace_id:
+            set_trace(trace_id)
+        return await coro
+
+
+    def submit(self, coro):
+        """
+        Schedule a coroutine on the background loop.
+
+        Returns:
+            concurrent.futures.Future: Future of the coroutine result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+    def answer(self, db_choice: str, query: str, database: str = None, timeout: float = None):
+        """Blocking `answer` over the persistent sessions, see the module level `answer`."""
+        return self.submit(answer(db_choice, query, self.call_tool, database)).result(timeout)
+
+
+    def detect_intent(self, query: str):
+        """
+        Start the intent detection of a question on the background loop.
+
+        Returns:
+            concurrent.futures.Future: Future of the intent.
+        """
+        return self.submit(adetect_intent(query))
+
+
+    def iter_pages(self, db_choice: str, query: str, page_size: int = PAGE_SIZE, intent: str = "database",
+                   database: str = None, trace_id: str = None, timeout: float = None):
+        """Blocking generator over `iter_pages` on the persistent sessions, one page per step."""
+
+        pages = iter_pages(db_choice, query, page_size, self.call_tool, intent, database)
+        try:
+            while True:
+                page = self.submit(self._traced(anext(pages, None), trace_id)).result(timeout)
+                if page is None:
+                    return
+                yield page
+        finally:
+            # Stopping early closes the local generator, which closes the server side cursor
+            self.submit(pages.aclose()).result(timeout)
+
+
+    def render_chart(self, query: str, df: pd.DataFrame, trace_id: str = None, full_resolution: bool = False,
+                     timeout: float = None):
+        """Blocking `render_chart` over the persistent sessions, see the module level `render_chart`."""
+        coro = render_chart(query, df, self.call_tool, full_resolution)
+        return self.submit(self._traced(coro, trace_id)).result(timeout)
+
+
+    def orchestrate(self, db_choice: str, query: str, intent: str, database: str = None, timeout: float = None):
+        """Blocking `orchestrate` over the persistent sessions, see the module level `orchestrate`."""
+        return self.submit(orchestrate(db_choice, query, intent, self.call_tool, database)).result(timeout)
+
+
+    def close(self) -> None:
+        """Close the sessions and stop the background loop."""
+        async def close_all():
+            for server in list(self._clients):
+                await self._reset(server)
+        self.submit(close_all()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,155 @@
+import os
+import time
+import uuid
+import asyncio
+import pandas as pd
+
+
+# Rows per page of paginated query results
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "1000"))
+# Seconds an unread cursor is kept open before it is closed
+PAGE_TOKEN_TTL = float(os.getenv("PAGE_TOKEN_TTL", "300"))
+# Maximum number of cursors kept open per server, the oldest is closed first
+MAX_OPEN_CURSORS = int(os.getenv("MAX_OPEN_CURSORS", "100"))
+# Seconds between sweeps closing expired cursors, also when no request comes in
+PAGE_SWEEP_INTERVAL = float(os.getenv("PAGE_SWEEP_INTERVAL", "10"))
+
+
+class PageStore():
+    """
+    Open result cursors of paginated tool calls, addressed by page token.
+    Each cursor is an async iterator of DataFrame pages, only the pages asked for are fetched.
+    Cursors are closed when read to the end, by `close`, when they reach their TTL (a background
+    sweep runs every `sweep_interval` seconds) or when `max_open` is reached (oldest first).
+    """
+
+    def __init__(self, ttl: float = PAGE_TOKEN_TTL, max_open: int = MAX_OPEN_CURSORS,
+                 sweep_interval: float = PAGE_SWEEP_INTERVAL):
+        """
+        Args:
+            ttl (float): Seconds an unread cursor is kept open.
+            max_open (int): Maximum number of open cursors, keep it within the connection pool of the
+                database when cursors hold a pooled connection.
+            sweep_interval (float): Seconds between sweeps closing expired cursors.
+        """
+
+        self.ttl = ttl
+        self.max_open = max(max_open, 1)
+        self.sweep_interval = sweep_interval
+        self._cursors = {}
+        self._lock = asyncio.Lock()
+        self._sweeper = None
+
+
+    async def _close(self, token: str) -> None:
+        entry = self._cursors.pop(token, None)
+        if entry is not None:
+            await entry["pages"].aclose()
+
+
+    async def _expire(self) -> None:
+        now = time.monotonic()
+        for token in [t for t, entry in self._cursors.items() if entry["expires"] < now]:
+            await self._close(token)
+        while len(self._cursors) >= self.max_open:
+            await self._close(next(iter(self._cursors)))
+
+
+    async def _sweep(self) -> None:
+        """Close expired cursors periodically, so abandoned ones give their connection back in time."""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                async with self._lock:
+                    now = time.monotonic()
+                    for token in [t for t, entry in self._cursors.items() if entry["expires"] < now]:
+                        await self._close(token)
+            except Exception as e:
+                print(" ❌ Page cursor sweep failure:", e)
+
+
+    def _start_sweeper(self) -> None:
+        """Start the sweep task on the running loop, once."""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep())
+
+
+    async def _read(self, token: str, entry: dict) -> tuple:
+        """Read the next page of a cursor and keep the cursor only when more rows may follow."""
+
+        try:
+            page = await anext(entry["pages"], None)
+        except Exception:
+            await entry["pages"].aclose()
+            raise
+        if page is None or len(page) < entry["page_size"]:
+            await entry["pages"].aclose()
+            return page, None
+        entry["expires"] = time.monotonic() + self.ttl
+        async with self._lock:
+            self._cursors[token] = entry
+        return page, token
+
+
+    async def start(self, pages, page_size: int) -> tuple:
+        """
+        Register a cursor and read its first page.
+
+        Args:
+            pages (AsyncIterator[pd.DataFrame]): The pages of the result.
+            page_size (int): Rows per page, a shorter page ends the cursor.
+
+        Returns:
+            tuple: The first page (None if there are no rows) and the token of the next page (None when done).
+        """
+
+        self._start_sweeper()
+        async with self._lock:
+            await self._expire()
+        entry = {"pages": pages, "page_size": page_size}
+        return await self._read(uuid.uuid4().hex, entry)
+
+
+    async def next(self, token: str) -> tuple:
+        """
+        Read the next page of a cursor.
+
+        Args:
+            token (str): The page token returned with the previous page.
+
+        Returns:
+            tuple: The page (None if there are no more rows) and the token of the next page (None when done).
+
+        Raises:
+            ValueError: If the token is unknown or expired.
+        """
+
+        async with self._lock:
+            await self._expire()
+            entry = self._cursors.pop(token, None)
+        if entry is None:
+            raise ValueError("Unknown or expired page token.")
+        return await self._read(token, entry)
+
+
+    async def close(self, token: str) -> bool:
+        """
+        Close a cursor the caller stopped reading, giving its connection back right away.
+
+        Args:
+            token (str): The page token returned with the last page read.
+
+        Returns:
+            bool: True if a cursor was closed, False if the token was unknown or already expired.
+        """
+
+        async with self._lock:
+            found = token in self._cursors
+            await self._close(token)
+        return found
+
+
+def concat_pages(pages: list) -> pd.DataFrame:
+    """Concatenate DataFrame pages, skipping empty ones."""
+    pages = [page for page in pages if page is not None]
+    return pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
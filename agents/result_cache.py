@@ -0,0 +1,196 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+import pandas as pd
+import pyarrow as pa
+from agents.cache import cache_instances
+from agents.results import encode_frame, decode_frame
+
+
+# Bytes of executed query results kept in memory per process, 0 disables the result cache
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 2 ** 20)))
+# Results larger than this are never cached, so one big export doesn't evict every dashboard
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_MAX_ENTRY_BYTES", str(32 * 2 ** 20)))
+
+_SQL_QUOTED_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normalize SQL text so formatting differences share a result cache entry.
+    Whitespace runs outside of quoted literals and identifiers are collapsed and the trailing `;` is dropped.
+
+    Args:
+        query (str): The SQL query.
+
+    Returns:
+        str: The normalized query.
+    """
+
+    parts = _SQL_QUOTED_RE.split((query or "").strip().rstrip(";").strip())
+    return "".join(part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts))
+
+
+def normalize_pipeline(collection: str, pipeline: list) -> str:
+    """Canonical text of a Mongo aggregation, stage and key order are kept as they are significant."""
+    return collection + ":" + json.dumps(pipeline, separators=(",", ":"), default=str)
+
+
+def iter_slices(df: pd.DataFrame, page_size: int):
+    """Yield a cached result in pages like the cursors do, a single empty page when there are no rows."""
+
+    if df.empty:
+        yield df
+        return
+    for start in range(0, len(df), page_size):
+        yield df.iloc[start:start + page_size].reset_index(drop=True)
+
+
+class ResultCache():
+    """
+    Byte bounded in-memory LRU of executed query results, stored as Arrow tables (or JSON columns when a
+    result can't be expressed in Arrow, its values then come back in their wire form, e.g. ObjectIds as
+    strings). Every entry remembers the data version of its database when the
+    query ran and is only served while the database still reports that version, see `data_version` of the
+    schema context providers. `invalidate` drops everything, e.g. after a load or a schema change.
+    """
+
+    def __init__(self, namespace: str, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 max_entry_bytes: int = RESULT_CACHE_MAX_ENTRY_BYTES):
+        """
+        Initialize the cache.
+
+        Args:
+            namespace (str): Name of the cache in the metrics.
+            max_bytes (int): Total size of the cached results, least recently used ones are evicted.
+            max_entry_bytes (int): Size above which a result isn't cached.
+        """
+
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        cache_instances.add(self)
+
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+
+    def get(self, key: str, version: str):
+        """
+        Look up a cached result.
+
+        Args:
+            key (str): The cache key, e.g. `make_key` of the database and the normalized query.
+            version (str): The current data version of the database.
+
+        Returns:
+            pd.DataFrame: A copy of the cached result, or None on a miss or when the data changed since.
+        """
+
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != version:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        value = entry[1]
+        return value.to_pandas() if isinstance(value, pa.Table) else decode_frame(value)
+
+
+    def set(self, key: str, df: pd.DataFrame, version: str) -> None:
+        """
+        Store a result and evict the least recently used ones above `max_bytes`.
+
+        Args:
+            key (str): The cache key.
+            df (pd.DataFrame): The result.
+            version (str): The data version of the database read before the query ran, a result
+                computed while the data changed is then never served.
+        """
+
+        if not self.enabled or df is None:
+            return
+        try:
+            value = pa.Table.from_pandas(df, preserve_index=False)
+            size = value.nbytes
+        except (pa.ArrowException, TypeError, ValueError):
+            # Mixed typed object columns (e.g. Mongo documents) are kept as JSON columns
+            value = encode_frame(df, "columns")
+            size = len(json.dumps(value["data"], default=str))
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (version, value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+
+    def _drop(self, key: str) -> None:
+        """Remove an entry, caller holds the lock."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+
+    def invalidate(self, *args) -> None:
+        """
+        Drop every cached result.
+        Accepts (and ignores) positional arguments so it can be registered as a change callback.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+    def stats(self) -> dict:
+        """Return hit/miss counters, number of entries and bytes of the cache."""
+
+        with self._lock:
+            size = len(self._entries)
+        return {"namespace": self.namespace, "hits": self.hits, "misses": self.misses, "size": size, "bytes": self.bytes}
+
+
+class ResultCollector():
+    """Keeps the pages of a streamed result so the whole of it can be cached once the cursor is exhausted."""
+
+    def __init__(self, cache: ResultCache, key: str, version: str):
+        self.cache = cache
+        self.key = key
+        self.version = version
+        self.pages = [] if cache.enabled else None
+        self.size = 0
+
+
+    def add(self, page: pd.DataFrame) -> None:
+        """Keep a page, giving up once the result is too large to be cached."""
+        if self.pages is None:
+            return
+        self.size += int(page.memory_usage(index=False).sum())
+        if self.size > self.cache.max_entry_bytes:
+            self.pages = None
+        else:
+            self.pages.append(page)
+
+
+    def store(self) -> None:
+        """Cache the complete result."""
+        if self.pages:
+            self.cache.set(self.key, pd.concat(self.pages, ignore_index=True), self.version)
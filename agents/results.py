@@ -0,0 +1,152 @@
+import os
+import io
+import uuid
+import base64
+import datetime
+import tempfile
+import pandas as pd
+import pyarrow as pa
+from agents.cache import fingerprint
+
+
+# Wire format of query results: "columns" (compact JSON column arrays), "arrow" (base64 Arrow IPC stream),
+# "parquet" (base64 Parquet bytes) or "ref" (Arrow file in SPILL_DIR)
+RESULT_FORMAT = os.getenv("RESULT_FORMAT", "columns")
+# Directory of "ref" payloads shared by processes on the same host, shared memory when available
+SPILL_DIR = os.getenv("SPILL_DIR", "/dev/shm/genai" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "genai"))
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def _json_column(series: pd.Series) -> list:
+    """Convert a column to a list of JSON native values."""
+
+    if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_timedelta64_dtype(series):
+        return [None if pd.isna(v) else v.isoformat() for v in series]
+    values = series.tolist()
+    if series.dtype == object or series.hasnans:
+        values = [
+            None if v is None or (isinstance(v, float) and v != v)
+            else v if isinstance(v, _JSON_SCALARS)
+            else v.isoformat() if isinstance(v, (datetime.date, datetime.time))
+            else str(v)
+            for v in values
+        ]
+    return values
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """Fingerprint of the column names and dtypes of a DataFrame, independent of its rows."""
+    return fingerprint(repr([(str(c), str(t)) for c, t in df.dtypes.items()]))
+
+
+def content_fingerprint(df: pd.DataFrame) -> str:
+    """Fingerprint of the columns and the values of a DataFrame, the same whatever envelope carried it."""
+
+    try:
+        rows = pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes().hex()
+    except TypeError:
+        # Unhashable values (e.g. nested Mongo documents) are hashed in their JSON form
+        rows = repr({str(c): _json_column(df[c]) for c in df.columns})
+    return fingerprint(schema_fingerprint(df) + rows)
+
+
+def encode_frame(df: pd.DataFrame, fmt: str = RESULT_FORMAT) -> dict:
+    """
+    Encode a DataFrame as a typed columnar result envelope.
+
+    Args:
+        df (pd.DataFrame): The query result.
+        fmt (str): "columns" for JSON column arrays, "arrow" for a base64 Arrow IPC stream,
+            "parquet" for base64 Parquet bytes or "ref" for an Arrow file written to `SPILL_DIR`
+            (only usable when producer and consumer share a host).
+
+    Returns:
+        dict: Envelope with the format, column names, dtypes, row count and the column data (or its path).
+    """
+
+    envelope = {
+        "format": fmt,
+        "columns": [str(c) for c in df.columns],
+        "dtypes": [str(t) for t in df.dtypes],
+        "num_rows": len(df),
+    }
+    if fmt in ("arrow", "parquet", "ref"):
+        try:
+            if fmt == "parquet":
+                buffer = io.BytesIO()
+                df.to_parquet(buffer, index=False)
+                envelope["data"] = base64.b64encode(buffer.getvalue()).decode("ascii")
+                return envelope
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if fmt == "ref":
+                os.makedirs(SPILL_DIR, exist_ok=True)
+                path = os.path.join(SPILL_DIR, f"{uuid.uuid4().hex}.arrow")
+                with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+                envelope["path"] = path
+                return envelope
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            envelope["data"] = base64.b64encode(sink.getvalue().to_pybytes()).decode("ascii")
+            return envelope
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            # Mixed typed object columns (e.g. Mongo documents) can't always be expressed in Arrow
+            print(" ⚠️ Arrow encoding failed, falling back to columns:", e)
+            envelope["format"] = "columns"
+
+    envelope["data"] = [_json_column(df.iloc[:, i]) for i in range(df.shape[1])]
+    return envelope
+
+
+def decode_frame(envelope: dict, consume: bool = False) -> pd.DataFrame:
+    """
+    Rebuild a DataFrame from a result envelope produced by `encode_frame`.
+
+    Args:
+        envelope (dict): The result envelope.
+        consume (bool): Delete the spill file of a "ref" envelope once it has been read.
+
+    Returns:
+        pd.DataFrame: The query result, empty if there is no result.
+
+    Raises:
+        ValueError: If the envelope format is unknown or a "ref" points outside `SPILL_DIR`.
+    """
+
+    if not envelope:
+        return pd.DataFrame()
+
+    fmt = envelope.get("format")
+    if fmt == "arrow":
+        reader = pa.ipc.open_stream(base64.b64decode(envelope["data"]))
+        return reader.read_all().to_pandas()
+    if fmt == "parquet":
+        return pd.read_parquet(io.BytesIO(base64.b64decode(envelope["data"])))
+    if fmt == "ref":
+        path = os.path.realpath(envelope["path"])
+        if os.path.dirname(path) != os.path.realpath(SPILL_DIR):
+            raise ValueError(f"Refusing to read result outside of {SPILL_DIR}: {path}")
+        with pa.memory_map(path, "r") as source:
+            df = pa.ipc.open_file(source).read_all().to_pandas()
+        if consume:
+            os.remove(path)
+        return df
+    if fmt != "columns":
+        raise ValueError(f"Unknown result format: {fmt}")
+
+    columns, dtypes = envelope["columns"], envelope["dtypes"]
+    df = pd.DataFrame(dict(zip(range(len(columns)), envelope["data"])))
+    if df.empty and columns:
+        df = pd.DataFrame(columns=range(len(columns)))
+    for i, dtype in enumerate(dtypes):
+        try:
+            if dtype.startswith("datetime64"):
+                df[i] = pd.to_datetime(df[i])
+            elif dtype != "object":
+                df[i] = df[i].astype(dtype)
+        except (TypeError, ValueError):
+            pass
+    df.columns = columns
+    return df
@@ -0,0 +1,244 @@
+import os
+import ast
+import time
+import queue
+import threading
+import multiprocessing
+import pandas as pd
+import plotly.io as pio
+from plotly.basedatatypes import BaseFigure
+from agents.results import encode_frame, decode_frame
+
+
+# Worker processes running generated chart code, charts of different users render in parallel
+CHART_SANDBOX_WORKERS = int(os.getenv("CHART_SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Wall clock seconds a chart code run may take before its worker is killed
+CHART_SANDBOX_TIMEOUT = float(os.getenv("CHART_SANDBOX_TIMEOUT", "30"))
+# Address space (MB) a run may allocate on top of the warmed up worker, 0 disables the limit
+CHART_SANDBOX_MEMORY_MB = int(os.getenv("CHART_SANDBOX_MEMORY_MB", "1024"))
+# Runs after which a worker is replaced, so leaks of generated code don't accumulate
+CHART_SANDBOX_MAX_RUNS = int(os.getenv("CHART_SANDBOX_MAX_RUNS", "200"))
+# "forkserver" forks the workers from a clean process with pandas and plotly already imported
+CHART_SANDBOX_START_METHOD = os.getenv("CHART_SANDBOX_START_METHOD", "forkserver")
+
+
+class SandboxError(RuntimeError):
+    """The chart code could not be run to completion (timeout, memory limit or a crashed worker)."""
+
+
+def _limit_memory(memory_mb: int) -> None:
+    """Cap the address space of the worker at its current size plus `memory_mb`."""
+
+    if memory_mb <= 0:
+        return
+    try:
+        import resource
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        limit = current + memory_mb * 2 ** 20
+        resource.setrlimit(resource.RLIMIT_AS, (limit if hard == resource.RLIM_INFINITY else min(limit, hard), hard))
+    except (ImportError, OSError, ValueError) as e:
+        # No RLIMIT_AS (or /proc) on this platform, the timeout still applies
+        print(" ⚠️ Chart sandbox memory limit not applied:", e)
+
+
+def execute_chart_code(code: str, df: pd.DataFrame):
+    """
+    Run plotting code against `df` like `PythonAstREPLTool`: the statements are executed and the last
+    expression evaluated. The figure is that value, or `fig` when the code ends with an assignment.
+
+    Returns:
+        plotly.graph_objects.Figure: The figure, or None if the code didn't build one.
+    """
+
+    tree = ast.parse(code)
+    namespace = {"df": df, "fig": ""}
+    value = None
+    body, last = tree.body[:-1], tree.body[-1:]
+    exec(compile(ast.Module(body=body, type_ignores=[]), "<chart>", "exec"), namespace)
+    if last and isinstance(last[0], ast.Expr):
+        value = eval(compile(ast.Expression(body=last[0].value), "<chart>", "eval"), namespace)
+    elif last:
+        exec(compile(ast.Module(body=last, type_ignores=[]), "<chart>", "exec"), namespace)
+    fig = value if isinstance(value, BaseFigure) else namespace.get("fig")
+    return fig if isinstance(fig, BaseFigure) else None
+
+
+def _worker_main(conn, memory_mb: int) -> None:
+    """Worker loop: receive (code, envelope), answer {"figure": json or None, "error": str or None}."""
+
+    # Imported (and the templates and validators loaded) once per worker instead of on the first run
+    import plotly.express
+    pio.to_json(plotly.express.bar(x=[0], y=[0]))
+    _limit_memory(memory_mb)
+    try:
+        conn.send("ready")
+        while True:
+            message = conn.recv()
+            if message is None:
+                return
+            code, envelope = message
+            try:
+                fig = execute_chart_code(code, decode_frame(envelope, consume=True))
+                if fig is None:
+                    conn.send({"figure": None, "error": "The code did not produce a Plotly figure."})
+                else:
+                    conn.send({"figure": pio.to_json(fig), "error": None})
+            except MemoryError:
+                conn.send({"figure": None, "error": f"Chart code exceeded the {memory_mb} MB memory limit.", "recycle": True})
+            except Exception as e:
+                conn.send({"figure": None, "error": f"{type(e).__name__}: {e}"})
+    except (EOFError, OSError):
+        # The pool went away or gave up on this worker
+        return
+
+
+class _Worker():
+    def __init__(self, context, memory_mb: int):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, memory_mb), daemon=True)
+        self.process.start()
+        child.close()
+        self.runs = 0
+
+
+    def wait_ready(self, timeout: float) -> None:
+        if not self.conn.poll(timeout) or self.conn.recv() != "ready":
+            raise SandboxError("Chart sandbox worker failed to start.")
+
+
+    def stop(self, kill: bool = False) -> None:
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+            self.process.join(1)
+        except (OSError, ValueError):
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class ChartSandbox():
+    """
+    Pool of pre-warmed worker processes running generated chart code.
+    Each run gets a wall clock timeout and a memory limit, a worker that times out, crashes or runs out of
+    memory is killed and replaced in the background. The DataFrame is handed over as an Arrow file in shared
+    memory (a "ref" envelope, see `agents.results`), only the figure JSON comes back over the pipe.
+    """
+
+    def __init__(self, workers: int = CHART_SANDBOX_WORKERS, timeout: float = CHART_SANDBOX_TIMEOUT,
+                 memory_mb: int = CHART_SANDBOX_MEMORY_MB, max_runs: int = CHART_SANDBOX_MAX_RUNS,
+                 start_method: str = CHART_SANDBOX_START_METHOD):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_runs = max_runs
+        if start_method not in multiprocessing.get_all_start_methods():
+            start_method = "spawn"
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            self._context.set_forkserver_preload(["agents.sandbox"])
+        self._idle = queue.Queue()
+        self._closed = False
+        started = [_Worker(self._context, memory_mb) for _ in range(max(workers, 1))]
+        for worker in started:
+            worker.wait_ready(60)
+            self._idle.put(worker)
+
+
+    def _replace(self, worker: _Worker, kill: bool) -> None:
+        """Stop a worker and start its replacement without blocking the caller."""
+
+        def replace():
+            worker.stop(kill)
+            if self._closed:
+                return
+            try:
+                fresh = _Worker(self._context, self.memory_mb)
+                fresh.wait_ready(60)
+                self._idle.put(fresh)
+            except Exception as e:
+                print(" ❌ Chart sandbox worker restart failed:", e)
+
+        threading.Thread(target=replace, name="chart-sandbox-restart", daemon=True).start()
+
+
+    def run(self, code: str, df: pd.DataFrame, timeout: float = None):
+        """
+        Run chart code against `df` in a worker process.
+
+        Args:
+            code (str): The plotting code, `df` is its input.
+            df (pd.DataFrame): The data to plot.
+            timeout (float): Wall clock seconds for the run, defaults to the sandbox timeout.
+
+        Returns:
+            plotly.graph_objects.Figure: The figure, or None if the code failed or didn't build one.
+
+        Raises:
+            SandboxError: If the run timed out, hit the memory limit or its worker died.
+        """
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        try:
+            # Waiting for a free worker counts towards the timeout
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise SandboxError(f"No chart sandbox worker free within {timeout:.0f}s.")
+
+        envelope = encode_frame(df, "ref")
+        try:
+            worker.conn.send((code, envelope))
+            if not worker.conn.poll(max(deadline - time.monotonic(), 0)):
+                self._replace(worker, kill=True)
+                raise SandboxError(f"Chart code timed out after {timeout:.0f}s.")
+            reply = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            self._replace(worker, kill=True)
+            raise SandboxError(f"Chart sandbox worker died: {e}")
+        finally:
+            if envelope.get("path") and os.path.exists(envelope["path"]):
+                os.remove(envelope["path"])
+
+        worker.runs += 1
+        if self._closed:
+            worker.stop()
+        elif reply.get("recycle") or worker.runs >= self.max_runs:
+            self._replace(worker, kill=False)
+        else:
+            self._idle.put(worker)
+        if reply.get("recycle"):
+            raise SandboxError(reply["error"])
+        if reply["error"]:
+            print(" ❌ Chart code failed:", reply["error"])
+            return None
+        return pio.from_json(reply["figure"])
+
+
+    def close(self) -> None:
+        """Stop the idle workers, busy ones are stopped when their run ends."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+_sandbox = None
+_sandbox_lock = threading.Lock()
+
+
+def get_sandbox() -> ChartSandbox:
+    """Return the chart sandbox of the process, starting its workers on first use."""
+
+    global _sandbox
+    if _sandbox is None:
+        with _sandbox_lock:
+            if _sandbox is None:
+                _sandbox = ChartSandbox()
+    return _sandbox
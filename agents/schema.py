@@ -0,0 +1,401 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from sqlalchemy import text, inspect
+from sqlalchemy.engine import Engine
+from langchain_community.utilities.sql_database import SQLDatabase
+from langchain_mongodb.agent_toolkit import MongoDBDatabase
+from pymongo import MongoClient
+from agents.cache import fingerprint
+from agents.schema_index import SchemaIndex, count_tokens
+
+
+# How often (in seconds) the schema version is re-checked, 0 checks on every call
+SCHEMA_CHECK_INTERVAL = float(os.getenv("SCHEMA_CHECK_INTERVAL", "5"))
+# Tables/collections described in the query prompt, the schema is only pruned when it has more
+SCHEMA_TOP_K = int(os.getenv("SCHEMA_TOP_K", "5"))
+# How often (in seconds) row counts are re-read where the database has no cheap data version
+DATA_CHECK_INTERVAL = float(os.getenv("DATA_CHECK_INTERVAL", "1"))
+# Follow a MongoDB change stream for the data version (needs a replica set, counts are polled otherwise)
+MONGO_CHANGE_STREAM = os.getenv("MONGO_CHANGE_STREAM", "true").lower() in ("1", "true", "yes")
+
+_REFERENCES_RE = re.compile(r'REFERENCES\s+"?([A-Za-z_][A-Za-z0-9_]*)"?', re.IGNORECASE)
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+class SchemaContextProvider():
+    """
+    Builds the schema context text handed to the query generator once and caches it.
+    The text is rebuilt only when the schema version reported by the database changes.
+    With a question, only the description of the most relevant tables/collections is returned.
+    """
+
+    def __init__(self, check_interval: float = SCHEMA_CHECK_INTERVAL, top_k: int = SCHEMA_TOP_K):
+        self.check_interval = check_interval
+        self.top_k = top_k
+        self.version = None
+        self.fingerprint = None
+        self.tokens_saved = 0
+        self.last_pruning = None
+        self._context = None
+        self._blocks = {}
+        self._index = None
+        self._full_tokens = None
+        self._checked_at = 0.0
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._counts_lock = threading.Lock()
+
+
+    def _current_version(self) -> str:
+        """Cheap probe returning a value that changes whenever the schema changes."""
+        raise NotImplementedError
+
+
+    def _build_blocks(self) -> dict:
+        """Expensive step reflecting the schema and sampling rows, one description per table/collection."""
+        raise NotImplementedError
+
+
+    def _assemble(self, blocks: dict, names: list):
+        """Schema context made of the descriptions of the given tables/collections."""
+        raise NotImplementedError
+
+
+    def _related(self, blocks: dict, name: str) -> list:
+        """Tables/collections a query on `name` is likely to join with."""
+        return []
+
+
+    def _row_counts(self, tables: list = None) -> str:
+        """Fingerprint of the row counts of the given tables/collections, all of them by default."""
+        raise NotImplementedError
+
+
+    def _polled_counts(self, tables: list = None) -> str:
+        """
+        `_row_counts`, re-read at most every DATA_CHECK_INTERVAL seconds per set of tables/collections.
+        Concurrent callers wait for the one reading the counts instead of repeating the work.
+        """
+
+        key = tuple(sorted(tables)) if tables is not None else None
+        with self._counts_lock:
+            now = time.monotonic()
+            counts, counted_at = self._counts.get(key, (None, 0.0))
+            if counts is None or now - counted_at >= DATA_CHECK_INTERVAL:
+                counts = self._row_counts(tables)
+                self._counts[key] = (counts, now)
+            return counts
+
+
+    def data_version(self) -> str:
+        """
+        Cheap probe returning a value that changes whenever the data changes, cached query results
+        (see `agents.result_cache`) are only served while it stays the same.
+        """
+        return self._polled_counts()
+
+
+    def _refresh(self) -> None:
+        """Rebuild the descriptions and their index if the schema version changed, caller holds the lock."""
+        now = time.monotonic()
+        if self._context is not None and now - self._checked_at < self.check_interval:
+            return
+
+        version = self._current_version()
+        self._checked_at = now
+        if self._context is None or version != self.version:
+            changed = self._context is not None
+            if changed:
+                print(" Schema change detected, rebuilding schema context...")
+            self._blocks = self._build_blocks()
+            self._context = self._assemble(self._blocks, list(self._blocks))
+            self._index = SchemaIndex(self._blocks)
+            self._full_tokens = None
+            self.version = version
+            self.fingerprint = fingerprint(str(self._context))
+            if changed:
+                for callback in self._callbacks:
+                    callback(self)
+
+
+    def get_context(self, question: str = None):
+        """
+        Return the cached schema context, rebuilding it if the schema changed.
+
+        Args:
+            question (str): The user's question. When given and the schema has more than `top_k`
+                tables/collections, only the best matching ones (and the tables they reference) are described.
+
+        Returns:
+            The schema context.
+        """
+
+        with self._lock:
+            self._refresh()
+            context, blocks, index = self._context, self._blocks, self._index
+            if not question or len(blocks) <= self.top_k:
+                return context
+            if self._full_tokens is None:
+                self._full_tokens = count_tokens(str(context))
+            full_tokens = self._full_tokens
+
+        names = index.select(question, self.top_k)
+        for name in list(names):
+            names += [related for related in self._related(blocks, name) if related in blocks and related not in names]
+        pruned = self._assemble(blocks, names)
+        pruned_tokens = count_tokens(str(pruned))
+        self.last_pruning = {
+            "kept": names,
+            "total": len(blocks),
+            "full_tokens": full_tokens,
+            "pruned_tokens": pruned_tokens,
+        }
+        self.tokens_saved += max(full_tokens - pruned_tokens, 0)
+        print(f" Schema pruning kept {len(names)}/{len(blocks)}: {pruned_tokens} instead of {full_tokens} tokens "
+              f"(saved {full_tokens - pruned_tokens}, {self.tokens_saved} in total).")
+        return pruned
+
+
+    def on_change(self, callback) -> None:
+        """
+        Register a callback invoked with the provider after the schema changed.
+
+        Args:
+            callback (callable): Function taking the provider as only argument.
+        """
+
+        with self._lock:
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+
+
+class SQLSchemaContext(SchemaContextProvider):
+    """Schema context provider for SQLAlchemy databases."""
+
+    def __init__(self, engine: Engine, check_interval: float = SCHEMA_CHECK_INTERVAL):
+        super().__init__(check_interval)
+        self.engine = engine
+        self.db = SQLDatabase(engine=engine)
+        self._data_conn = None
+        self._data_lock = threading.Lock()
+
+
+    def _current_version(self) -> str:
+        with self.engine.connect() as conn:
+            if self.engine.dialect.name == "sqlite":
+                return str(conn.execute(text("PRAGMA schema_version")).scalar())
+            # Other dialects: the list of tables and their columns stands in for a version number
+            inspector = inspect(conn)
+            tables = sorted(inspector.get_table_names())
+            return fingerprint(repr([(t, [c["name"] for c in inspector.get_columns(t)]) for t in tables]))
+
+
+    def _build_blocks(self) -> dict:
+        # SQLDatabase reflects the metadata on creation, a fresh one is needed once the schema changed
+        if self.version is not None:
+            self.db = SQLDatabase(engine=self.engine)
+        return {table: self.db.get_table_info([table]) for table in self.db.get_usable_table_names()}
+
+
+    def _assemble(self, blocks: dict, names: list) -> str:
+        return "\n\n".join(blocks[name] for name in names)
+
+
+    def _related(self, blocks: dict, name: str) -> list:
+        return _REFERENCES_RE.findall(blocks.get(name, ""))
+
+
+    def _table_names(self) -> list:
+        """Names of the tables, from the cached descriptions when they were built."""
+        if self._blocks:
+            return list(self._blocks)
+        with self.engine.connect() as conn:
+            return inspect(conn).get_table_names()
+
+
+    def referenced_tables(self, query: str) -> list:
+        """
+        Tables whose name appears in the query text, None when it names none of them (e.g. it reads a view),
+        the data version then covers every table.
+        """
+
+        names = [
+            table for table in self._table_names()
+            if re.search(rf"(?<![\w$]){re.escape(table)}(?![\w$])", query or "", re.IGNORECASE)
+        ]
+        return names or None
+
+
+    def _row_counts(self, tables: list = None) -> str:
+        with self.engine.connect() as conn:
+            if self.engine.dialect.name == "postgresql":
+                # Catalog statistics instead of scans, they also move on updates and deletes
+                rows = conn.execute(text(
+                    "SELECT relname, n_tup_ins, n_tup_upd, n_tup_del FROM pg_stat_user_tables"
+                )).fetchall()
+                counts = sorted(tuple(row) for row in rows if tables is None or row[0] in tables)
+            else:
+                preparer = self.engine.dialect.identifier_preparer
+                counts = [
+                    (table, conn.execute(text(f"SELECT COUNT(*) FROM {preparer.quote(table)}")).scalar())
+                    for table in sorted(tables if tables is not None else inspect(conn).get_table_names())
+                ]
+        return fingerprint(repr(counts))
+
+
+    def data_version(self, query: str = None) -> str:
+        """
+        SQLite: `PRAGMA data_version` of a dedicated connection, which changes whenever another connection
+        (or process) commits. PostgreSQL: the insert/update/delete counters of `pg_stat_user_tables`, which
+        lag behind commits by up to a second. Other databases: the row counts of the tables, which miss in
+        place updates.
+
+        Args:
+            query (str): The query the version is for, only the tables it references are then counted.
+        """
+
+        database = self.engine.url.database
+        if self.engine.dialect.name != "sqlite" or not database or database == ":memory:":
+            return self._polled_counts(self.referenced_tables(query) if query else None)
+        with self._data_lock:
+            if self._data_conn is None:
+                # Never used for writes, its own commits wouldn't move the version
+                self._data_conn = sqlite3.connect(database, check_same_thread=False)
+            return str(self._data_conn.execute("PRAGMA data_version").fetchone()[0])
+
+
+    def close(self) -> None:
+        """Close the data version connection and the pooled connections of the engine."""
+        with self._data_lock:
+            if self._data_conn is not None:
+                self._data_conn.close()
+                self._data_conn = None
+        self.engine.dispose()
+
+
+class MongoSchemaContext(SchemaContextProvider):
+    """Schema context provider for MongoDB databases."""
+
+    def __init__(self, client: MongoClient, database: str, check_interval: float = SCHEMA_CHECK_INTERVAL):
+        super().__init__(check_interval)
+        self.client = client
+        self.database = database
+        self.db = MongoDBDatabase(client=client, database=database)
+        self._changes = None
+        self._watcher = None
+
+
+    def _current_version(self) -> str:
+        mongo_db = self.client[self.database]
+        listing = []
+        for name in sorted(mongo_db.list_collection_names()):
+            indexes = sorted(str(index["key"]) for index in mongo_db[name].list_indexes())
+            listing.append((name, indexes))
+        return fingerprint(repr(listing))
+
+
+    def _build_blocks(self) -> dict:
+        if self.version is not None:
+            self.db = MongoDBDatabase(client=self.client, database=self.database)
+        return {name: self.db.get_collection_info([name]) for name in self.db.get_usable_collection_names()}
+
+
+    def _row_counts(self, tables: list = None) -> str:
+        mongo_db = self.client[self.database]
+        names = sorted(tables if tables is not None else mongo_db.list_collection_names())
+        counts = [(name, mongo_db[name].estimated_document_count()) for name in names]
+        return fingerprint(repr(counts))
+
+
+    def _watch(self) -> None:
+        """Count the events of a change stream on the database until it fails."""
+        try:
+            with self.client[self.database].watch() as stream:
+                self._changes = 0
+                for _ in stream:
+                    self._changes += 1
+        except Exception as e:
+            print(" ⚠️ Mongo change stream unavailable, polling document counts instead:", e)
+        finally:
+            self._changes = None
+
+
+    def data_version(self) -> str:
+        """
+        Number of events seen on a change stream of the database when the server supports them (replica
+        sets), the estimated document counts of the collections otherwise (which miss in place updates).
+        """
+
+        if MONGO_CHANGE_STREAM and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name="mongo-change-stream", daemon=True)
+            self._watcher.start()
+        changes = self._changes
+        return f"stream:{changes}" if changes is not None else self._polled_counts()
+
+
+    def _assemble(self, blocks: dict, names: list) -> dict:
+        # Same shape as MongoDBDatabase.get_context
+        return {
+            "collection_info": "\n\n".join(blocks[name] for name in names),
+            "collection_names": ", ".join(names),
+        }
+
+
+def get_sql_schema_context(engine: Engine) -> SQLSchemaContext:
+    """
+    Return the process wide schema context provider for a SQL database.
+
+    Args:
+        engine (Engine): SQLAlchemy engine of the database, only used when no provider exists yet.
+
+    Returns:
+        SQLSchemaContext: The provider shared by all agents pointing to the same database.
+    """
+
+    key = ("sql", engine.url.render_as_string(hide_password=False))
+    with _providers_lock:
+        if key not in _providers:
+            _providers[key] = SQLSchemaContext(engine)
+        return _providers[key]
+
+
+def release_sql_schema_context(engine: Engine) -> None:
+    """
+    Forget the schema context provider of a SQL database and close its connections, e.g. when the
+    agent of an uploaded file store is evicted.
+
+    Args:
+        engine (Engine): SQLAlchemy engine of the database.
+    """
+
+    key = ("sql", engine.url.render_as_string(hide_password=False))
+    with _providers_lock:
+        provider = _providers.pop(key, None)
+    if provider is not None:
+        provider.close()
+
+
+def get_mongo_schema_context(uri: str, database: str, **client_kwargs) -> MongoSchemaContext:
+    """
+    Return the process wide schema context provider for a MongoDB database.
+
+    Args:
+        uri (str): Connection URI of the MongoDB server.
+        database (str): Name of the database.
+        **client_kwargs: Extra MongoClient options (e.g. pool sizes), only used when no provider exists yet.
+
+    Returns:
+        MongoSchemaContext: The provider shared by all agents pointing to the same database.
+    """
+
+    key = ("mongo", uri, database)
+    with _providers_lock:
+        if key not in _providers:
+            _providers[key] = MongoSchemaContext(MongoClient(uri, **client_kwargs), database)
+        return _providers[key]
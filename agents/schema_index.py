@@ -0,0 +1,110 @@
+import os
+import re
+import math
+from collections import Counter
+
+
+# Term weight of the table/collection name and of the column/field names relative to sample values
+NAME_WEIGHT = 3
+COLUMN_WEIGHT = 2
+# Matches scoring below this fraction of the best match are not worth their prompt tokens
+MIN_SCORE_RATIO = float(os.getenv("SCHEMA_MIN_SCORE_RATIO", "0.2"))
+
+_STOPWORDS = {
+    "a", "all", "an", "and", "are", "as", "at", "by", "did", "do", "does", "each", "for", "from", "get", "give",
+    "has", "have", "how", "in", "is", "it", "list", "many", "me", "most", "much", "of", "on", "or", "per",
+    "show", "the", "their", "them", "to", "top", "was", "were", "what", "which", "who", "with",
+}
+
+# Column lines of a CREATE TABLE ("user_id INTEGER NOT NULL") and field lines of a Mongo schema ("user_id: int")
+_COLUMN_RE = re.compile(r'^\s*"?([A-Za-z_][A-Za-z0-9_]*)"?\s+[A-Z]{3,}\b', re.MULTILINE)
+_FIELD_RE = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_.\[\]]*)\s*:", re.MULTILINE)
+
+_encoding = None
+
+
+def tokens(text: str) -> list:
+    """Lower cased, singular word tokens of a text, identifiers split on case and underscores."""
+
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words]
+
+
+def count_tokens(text: str) -> int:
+    """LLM token count of a text (tiktoken when installed, about 4 characters per token otherwise)."""
+
+    global _encoding
+    try:
+        if _encoding is None:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    except Exception:
+        return len(text) // 4
+
+
+class SchemaIndex():
+    """
+    BM25 index over the schema description of every table or collection, built once per schema version.
+    The name of the object and of its columns/fields weigh more than comments and sample values.
+    """
+
+    def __init__(self, blocks: dict, k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            blocks (dict): Table or collection name to its schema description (DDL, comments, sample rows).
+        """
+
+        self.k1 = k1
+        self.b = b
+        self.names = list(blocks)
+        self.docs = []
+        for name, text in blocks.items():
+            terms = Counter(tokens(text))
+            columns = _COLUMN_RE.findall(text) + _FIELD_RE.findall(text)
+            for term in tokens(" ".join(columns)):
+                terms[term] += COLUMN_WEIGHT
+            for term in tokens(name):
+                terms[term] += NAME_WEIGHT
+            self.docs.append(terms)
+        self.lengths = [sum(doc.values()) for doc in self.docs]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        df = Counter(term for doc in self.docs for term in doc)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+
+
+    def scores(self, question: str) -> dict:
+        """BM25 score of every table or collection for a question."""
+
+        terms = [t for t in tokens(question) if t not in _STOPWORDS and t in self.idf]
+        result = {}
+        for name, doc, length in zip(self.names, self.docs, self.lengths):
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term, 0)
+                if tf:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+                    score += self.idf[term] * tf * (self.k1 + 1) / norm
+            result[name] = score
+        return result
+
+
+    def select(self, question: str, top_k: int, min_ratio: float = MIN_SCORE_RATIO) -> list:
+        """
+        Names of the `top_k` best matching tables or collections.
+
+        Args:
+            question (str): The user's question.
+            top_k (int): Maximum number of names.
+            min_ratio (float): Names scoring below this fraction of the best score are left out.
+
+        Returns:
+            list: The matching names by decreasing score, all names when nothing matches.
+        """
+
+        scored = sorted(self.scores(question).items(), key=lambda item: -item[1])
+        best = scored[0][1] if scored else 0.0
+        selected = [name for name, score in scored[:top_k] if score > 0 and score >= best * min_ratio]
+        return selected or list(self.names)
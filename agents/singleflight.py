@@ -0,0 +1,50 @@
+import asyncio
+from agents.metrics import coalesced_calls
+
+
+class SingleFlight():
+    """
+    Coalesces concurrent identical calls: while a call is in flight, callers with the same key await
+    its result instead of starting their own. Nothing is cached, the key is released once the call ends.
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name (str): Name of the coalesced calls in the metrics.
+        """
+
+        self.name = name
+        self._calls = {}
+
+
+    async def do(self, key: str, call):
+        """
+        Run `call()` unless a call with the same key is in flight on this event loop, then share its result.
+
+        Args:
+            key (str): Identity of the call, e.g. `make_key` of the normalized question, data source and intent.
+            call (callable): Coroutine function without arguments starting the call.
+
+        Returns:
+            The result of the call, the same object for all coalesced callers (treat it as read-only).
+
+        Raises:
+            Exception: Whatever the call raised, for all coalesced callers.
+        """
+
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        if task is not None and task.get_loop() is loop:
+            coalesced_calls.inc(call=self.name)
+        else:
+            task = loop.create_task(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._calls.pop(key, None) if self._calls.get(key) is done else None)
+        # A caller going away doesn't cancel the call the others are waiting for
+        return await asyncio.shield(task)
+
+
+    def in_flight(self) -> int:
+        """Number of calls currently in flight."""
+        return len(self._calls)
@@ -1,15 +1,33 @@
 import os
+import json
 import warnings
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage
 from langchain.prompts import ChatPromptTemplate
 from langchain_community.utilities.sql_database import SQLDatabase
-from langchain_community.tools.sql_database.tool import QuerySQLCheckerTool, QuerySQLDatabaseTool
-from sqlalchemy import create_engine
-from fastmcp import FastMCP
+from langchain_community.tools.sql_database.tool import QuerySQLCheckerTool
+import asyncio
+import threading
+from collections import OrderedDict
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from fastmcp import FastMCP, Context
 from agents import llm
-from agents.templates import sql_query_generator_prompt, user_prompt
-from agents.common import State, QueryOutput
+from agents.templates import sql_query_generator_prompt, sql_chart_query_instructions, user_prompt
+from agents.common import State, QueryOutput, CHART_MAX_POINTS, BATCH_MAX_CONCURRENCY
+from agents.cache import PersistentCache, normalize_question, make_key
+from agents.schema import get_sql_schema_context, release_sql_schema_context
+from agents.results import encode_frame
+from agents.result_cache import ResultCache, ResultCollector, normalize_sql, iter_slices
+from agents.validation import validate_sql, extract_query, LLM_QUERY_CHECK
+from agents.paging import PageStore, PAGE_SIZE, MAX_OPEN_CURSORS
+from agents.singleflight import SingleFlight
+from agents.metrics import timed, failure, observe_rows, llm_config, set_trace, add_routes, trace_id_var
+from agents.file_store import store_uri
 
 
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -18,6 +36,29 @@ load_dotenv()
 
 config_memory = {"configurable": {"thread_id": "1"}}
 SQL_URI = os.getenv("SQL_URI")
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "5"))
+SQL_MAX_OVERFLOW = int(os.getenv("SQL_MAX_OVERFLOW", "10"))
+SQL_POOL_TIMEOUT = float(os.getenv("SQL_POOL_TIMEOUT", "30"))
+# Agents (engine pools and schema contexts) of uploaded file stores kept open, least recently used are closed
+SQL_MAX_FILE_AGENTS = int(os.getenv("SQL_MAX_FILE_AGENTS", "8"))
+
+# Async drivers used for SQL_URI when SQL_ASYNC_URI isn't set
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "mysql": "mysql+aiomysql"}
+
+
+def async_uri(uri: str) -> str:
+    """Map a sync SQLAlchemy URI to the same database with an async driver."""
+    url = make_url(uri)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)).render_as_string(hide_password=False)
+
+
+SQL_ASYNC_URI = os.getenv("SQL_ASYNC_URI") or (async_uri(SQL_URI) if SQL_URI else None)
+
+query_cache = PersistentCache(namespace="sql")
+result_cache = ResultCache(namespace="sql_results")
+# Every open cursor holds a pooled connection, keep one connection free for the other queries
+page_store = PageStore(max_open=min(MAX_OPEN_CURSORS, SQL_POOL_SIZE + SQL_MAX_OVERFLOW - 1))
+in_flight = SingleFlight("run_sql")
 
 sql_mcp = FastMCP(name="SQLAgent", host="0.0.0.0", port=8001)
 
@@ -25,17 +66,106 @@ sql_mcp = FastMCP(name="SQLAgent", host="0.0.0.0", port=8001)
 class SQLAgent():
     """SQL Agent to handle SQL queries."""
 
-    def __init__(self, llm):
-        """Initialize the SQL Agent."""
+    def __init__(self, llm, uri: str = None):
+        """
+        Initialize the SQL Agent.
+
+        Args:
+            llm: The chat model writing and checking the queries.
+            uri (str): SQLAlchemy URI of the database, defaults to SQL_URI (e.g. `store_uri` of an uploaded file).
+        """
 
         print("Initializing SQL Agent...")
-        if not SQL_URI:
+        self.uri = uri or SQL_URI
+        if not self.uri:
             raise ValueError("SQL_URI environment variable is not set.")
 
-        self.db = SQLDatabase(engine=create_engine(SQL_URI))
+        self.schema = get_sql_schema_context(create_engine(
+            self.uri,
+            pool_size=SQL_POOL_SIZE,
+            max_overflow=SQL_MAX_OVERFLOW,
+            pool_timeout=SQL_POOL_TIMEOUT,
+            pool_pre_ping=True
+        ))
         self.llm = llm
+        self.cache = query_cache
+        self.results = result_cache
+        self.schema.on_change(self.cache.invalidate)
+        self.schema.on_change(self.results.invalidate)
+        self._async_engine = None
+
+
+    @property
+    def db(self) -> SQLDatabase:
+        """Database handle shared through the schema context provider."""
+        return self.schema.db
+
+
+    @property
+    def async_engine(self) -> AsyncEngine:
+        """Async engine (and pool) used by the async pipeline, created on first use."""
+        if self._async_engine is None:
+            self._async_engine = create_async_engine(
+                SQL_ASYNC_URI if self.uri == SQL_URI else async_uri(self.uri),
+                pool_size=SQL_POOL_SIZE,
+                max_overflow=SQL_MAX_OVERFLOW,
+                pool_timeout=SQL_POOL_TIMEOUT,
+                pool_pre_ping=True
+            )
+        return self._async_engine
+
+
+    def _result_key(self, state: State) -> str:
+        """Result cache key of the query of the state on this database."""
+        return make_key(self.uri, normalize_sql(state["query"]))
+
 
+    def _cache_key(self, state: State) -> str:
+        """Query cache key of the question and intent of the state, for the current schema."""
+        intent = "chart" if state.get("intent") == "chart" else "database"
+        return make_key(normalize_question(self._question(state)), intent, self.db.dialect, self.schema.fingerprint)
 
+
+    def _remember(self, state: State, verdict: dict) -> dict:
+        """
+        Cache the query of the state once it passed the checks (the corrected one when the checker
+        rewrote it), so invalid queries are never served from the cache.
+        """
+        if verdict.get("query_valid") is True and not state.get("query_cached"):
+            query = verdict.get("query", state["query"])
+            self.cache.set(self._cache_key(state), {"query": query, "columns": state.get("columns", [])})
+        return verdict
+
+
+    def _question(self, state: State) -> str:
+        """Read the question from the state, falling back to the last human message."""
+        question = state.get("question")
+        if not question:
+            messages = state.get("messages", [])
+            if messages and isinstance(messages[-1], HumanMessage):
+                question = messages[-1].content
+        return question
+
+
+    def _query_prompt(self, question: str, db_context: str, intent: str = None):
+        """Build the query generation prompt, asking for the aggregated chart series for chart intents."""
+        system_prompt = sql_query_generator_prompt + (sql_chart_query_instructions if intent == "chart" else "")
+        query_prompt_template = ChatPromptTemplate([
+            ("system", system_prompt),
+            ("user", user_prompt)
+        ])
+        return query_prompt_template.invoke(
+            {
+                "dialect": self.db.dialect,
+                "top_k": CHART_MAX_POINTS if intent == "chart" else 100,
+                "db_context": db_context,
+                "input": question,
+            },
+            config=config_memory
+        )
+
+
+    @timed("write_query")
     def write_query(self, state: State) -> dict:
         """
         Generate SQL query to fetch information.
@@ -51,47 +181,73 @@ class SQLAgent():
             ValueError: If the user prompt is not provided or if the query generation fails.
         """
 
-        print(f" Generating query..." )
+        print(" Generating query..." )
         try:
-            question = state.get("question")
-            if not question:
-                messages = state.get("messages", [])
-                if messages and isinstance(messages[-1], HumanMessage):
-                    question = messages[-1].content
-
-            query_prompt_template = ChatPromptTemplate([
-                ("system", sql_query_generator_prompt),
-                ("user", user_prompt)
-            ])
-
-            prompt = query_prompt_template.invoke(
-                {
-                    "dialect": self.db.dialect,
-                    "top_k": 100,
-                    "db_context": self.db.get_table_info(),
-                    "input": question,
-                },
-                config=config_memory
-            )
+            question = self._question(state)
+            # Refresh the schema version (and fingerprint) before looking up the cache
+            self.schema.get_context()
+            intent = "chart" if state.get("intent") == "chart" else "database"
+            cache_key = self._cache_key(state)
+            cached = self.cache.get(cache_key)
+            if cached:
+                print(" Query cache hit.")
+                return {"query": cached["query"], "columns": cached["columns"], "query_cached": True}
+
+            # Only the tables relevant to the question are described in the prompt
+            db_context = self.schema.get_context(question)
+            prompt = self._query_prompt(question, db_context, intent)
             structured_llm = self.llm.with_structured_output(QueryOutput)
-            result = structured_llm.invoke(prompt, config=config_memory)
+            result = structured_llm.invoke(prompt, config=llm_config(config_memory, "write_query"))
             print(" Generated query successfully.")
-            return {"query": result["query"], "columns": result["columns"]}
+            return {"query": result["query"], "columns": result["columns"], "query_cached": False}
         except Exception as e:
             print(" ❌ Query Generation failure:\n", e)
+            failure("write_query")
             return {"query": ""}
 
 
+    @timed("write_query")
+    async def awrite_query(self, state: State) -> dict:
+        """Async counterpart of `write_query`."""
+
+        print(" Generating query..." )
+        try:
+            question = self._question(state)
+            # the schema probe is a blocking round trip, keep it off the event loop
+            await asyncio.to_thread(self.schema.get_context)
+            intent = "chart" if state.get("intent") == "chart" else "database"
+            cache_key = self._cache_key(state)
+            cached = self.cache.get(cache_key)
+            if cached:
+                print(" Query cache hit.")
+                return {"query": cached["query"], "columns": cached["columns"], "query_cached": True}
+
+            # Only the tables relevant to the question are described in the prompt
+            db_context = await asyncio.to_thread(self.schema.get_context, question)
+            prompt = self._query_prompt(question, db_context, intent)
+            structured_llm = self.llm.with_structured_output(QueryOutput)
+            result = await structured_llm.ainvoke(prompt, config=llm_config(config_memory, "write_query"))
+            print(" Generated query successfully.")
+            return {"query": result["query"], "columns": result["columns"], "query_cached": False}
+        except Exception as e:
+            print(" ❌ Query Generation failure:\n", e)
+            failure("write_query")
+            return {"query": ""}
+
+
+    @timed("check_query")
     def check_query(self, state: State) -> dict:
         """
         Check SQL query for correctness.
-        This method uses a language model to validate the generated SQL query.
+        The query is first prepared locally on a read-only connection, the language model checker
+        is only called when that fails, isn't possible or LLM_QUERY_CHECK is "always".
 
         Args:
             state (State): The state containing the generated SQL query.
         
         Returns:
-            dict: A dictionary containing the result of the query check.
+            dict: A dictionary containing the result of the query check, the validity flag and, when the
+                LLM checker rewrote it, the corrected query.
         
         Raises:
             ValueError: If the query is not provided or if the query check fails.
@@ -100,73 +256,511 @@ class SQLAgent():
         try:
             print(" Checking query...")
             if not state.get("query"):
-                return {"result": "No query to check."}
+                return {"result": "No query to check.", "query_valid": False}
+            if state.get("query_cached") and LLM_QUERY_CHECK != "always":
+                # Only queries that passed the checks are cached
+                print(" Cached query, already checked.")
+                return {"result": state["query"], "query_valid": True}
+            is_valid, error = validate_sql(self.schema.engine, state["query"])
+            if is_valid and LLM_QUERY_CHECK != "always":
+                print(" Query passed local validation.")
+                return self._remember(state, {"result": state["query"], "query_valid": True})
+            if error:
+                print(" Local validation:", error)
+
             execute_query_tool = QuerySQLCheckerTool(
                 db=self.db,
                 llm=self.llm
             )
-            result = execute_query_tool.invoke(state["query"], config=config_memory)
-            # flag to indicate if the query is valid
-            is_valid = False
-            if result[1:4] == "sql" or result[3:6] == "sql":
-                is_valid = True
+            result = execute_query_tool.invoke(state["query"], config=llm_config(config_memory, "check_query"))
+            return self._remember(state, self._checker_verdict(state, result))
+        except Exception as e:
+            print(" ❌ Query Check failure:\n", e)
+            failure("check_query")
+            return {"result": ""}
+
+
+    @timed("check_query")
+    async def acheck_query(self, state: State) -> dict:
+        """Async counterpart of `check_query`."""
+
+        try:
+            print(" Checking query...")
+            if not state.get("query"):
+                return {"result": "No query to check.", "query_valid": False}
+            if state.get("query_cached") and LLM_QUERY_CHECK != "always":
+                # Only queries that passed the checks are cached
+                print(" Cached query, already checked.")
+                return {"result": state["query"], "query_valid": True}
+            is_valid, error = await asyncio.to_thread(validate_sql, self.schema.engine, state["query"])
+            if is_valid and LLM_QUERY_CHECK != "always":
+                print(" Query passed local validation.")
+                return self._remember(state, {"result": state["query"], "query_valid": True})
+            if error:
+                print(" Local validation:", error)
 
-            return {"result": result}
+            execute_query_tool = QuerySQLCheckerTool(
+                db=self.db,
+                llm=self.llm
+            )
+            result = await execute_query_tool.ainvoke(state["query"], config=llm_config(config_memory, "check_query"))
+            return self._remember(state, await asyncio.to_thread(self._checker_verdict, state, result))
         except Exception as e:
             print(" ❌ Query Check failure:\n", e)
+            failure("check_query")
             return {"result": ""}
 
 
+    def _checker_verdict(self, state: State, result: str) -> dict:
+        """Turn the answer of the LLM checker into the validity flag and the (possibly rewritten) query."""
+
+        # flag to indicate if the query is valid
+        is_valid = False
+        if result[1:4] == "sql" or result[3:6] == "sql":
+            is_valid = True
+        query = extract_query(result) if is_valid else state["query"]
+        local_valid, _ = validate_sql(self.schema.engine, query)
+        if local_valid is not None:
+            is_valid = local_valid
+        elif not is_valid:
+            # no verdict from either checker, let the database decide
+            is_valid = None
+
+        return {"result": result, "query": query, "query_valid": is_valid}
+
+
+    @timed("execute_query")
     def execute_query(self, state: State) -> dict:
         """
         Execute SQL query.
-        This method executes the validated SQL query and returns the result.
+        This method executes the validated SQL query and returns the result as a typed columnar envelope.
 
         Args:
             state (State): The state containing the validated SQL query.
 
         Returns:
-            dict: A dictionary containing the result of the executed query.
+            dict: A dictionary containing the columnar result of the executed query (see `agents.results`).
         """
         try:
+            if state.get("query_valid") is False:
+                print(" ❌ Skipping execution of invalid query.")
+                return {"data": None}
             print(" Executing query...")
-            execute_query_tool = QuerySQLDatabaseTool(
-                db=self.db
-            )
-            return {"result": execute_query_tool.run(state["query"],config=config_memory)}
+            # Results of the current data version are served from memory
+            version, key = self.schema.data_version(state["query"]), self._result_key(state)
+            df = self.results.get(key, version)
+            if df is not None:
+                print(" Result cache hit.")
+            else:
+                with self.schema.engine.connect() as conn:
+                    cursor = conn.execute(text(state["query"]))
+                    df = pd.DataFrame(cursor.fetchall(), columns=list(cursor.keys()))
+                self.results.set(key, df, version)
+            observe_rows("execute_query", len(df))
+            return {"data": encode_frame(df)}
         except Exception as e:
             print(" ❌ Query Execution failure:\n", e)
-            return {"result": ""}
+            failure("execute_query")
+            return {"data": None}
+
+
+    @timed("execute_query")
+    async def aexecute_query(self, state: State) -> dict:
+        """Async counterpart of `execute_query`, running on the async engine."""
+
+        try:
+            if state.get("query_valid") is False:
+                print(" ❌ Skipping execution of invalid query.")
+                return {"data": None}
+            print(" Executing query...")
+            version, key = await asyncio.to_thread(self.schema.data_version, state["query"]), self._result_key(state)
+            df = self.results.get(key, version)
+            if df is not None:
+                print(" Result cache hit.")
+            else:
+                async with self.async_engine.connect() as conn:
+                    cursor = await conn.execute(text(state["query"]))
+                    df = pd.DataFrame(cursor.fetchall(), columns=list(cursor.keys()))
+                self.results.set(key, df, version)
+            observe_rows("execute_query", len(df))
+            return {"data": encode_frame(df)}
+        except Exception as e:
+            print(" ❌ Query Execution failure:\n", e)
+            failure("execute_query")
+            return {"data": None}
+
+
+    def execute_query_pages(self, state: State, page_size: int = PAGE_SIZE):
+        """
+        Execute SQL query and yield the result in pages read from a server side cursor,
+        so the first rows are available before the whole result is fetched.
+
+        Args:
+            state (State): The state containing the validated SQL query.
+            page_size (int): Rows per page.
+
+        Yields:
+            pd.DataFrame: The pages of the result, a single empty page when there are no rows.
+        """
+
+        if state.get("query_valid") is False:
+            print(" ❌ Skipping execution of invalid query.")
+            return
+        print(" Executing query...")
+        version, key = self.schema.data_version(state["query"]), self._result_key(state)
+        cached = self.results.get(key, version)
+        if cached is not None:
+            print(" Result cache hit.")
+            yield from iter_slices(cached, page_size)
+            return
+        # The pages are kept to cache the result once the cursor is exhausted
+        collector = ResultCollector(self.results, key, version)
+        with self.schema.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(state["query"]))
+            columns = list(result.keys())
+            empty = True
+            for partition in result.partitions(page_size):
+                empty = False
+                page = pd.DataFrame(partition, columns=columns)
+                collector.add(page)
+                yield page
+            if empty:
+                collector.add(pd.DataFrame(columns=columns))
+                yield pd.DataFrame(columns=columns)
+        collector.store()
+
+
+    async def aexecute_query_pages(self, state: State, page_size: int = PAGE_SIZE):
+        """Async counterpart of `execute_query_pages`, streaming from the async engine."""
+
+        if state.get("query_valid") is False:
+            print(" ❌ Skipping execution of invalid query.")
+            return
+        print(" Executing query...")
+        version, key = await asyncio.to_thread(self.schema.data_version, state["query"]), self._result_key(state)
+        cached = self.results.get(key, version)
+        if cached is not None:
+            print(" Result cache hit.")
+            for page in iter_slices(cached, page_size):
+                yield page
+            return
+        collector = ResultCollector(self.results, key, version)
+        async with self.async_engine.connect() as conn:
+            result = await conn.stream(text(state["query"]))
+            columns = list(result.keys())
+            empty = True
+            async for partition in result.partitions(page_size):
+                empty = False
+                page = pd.DataFrame(partition, columns=columns)
+                collector.add(page)
+                yield page
+            if empty:
+                collector.add(pd.DataFrame(columns=columns))
+                yield pd.DataFrame(columns=columns)
+        collector.store()
+
+
+    @timed("write_query_batch")
+    async def awrite_queries(self, states: list, max_concurrency: int = BATCH_MAX_CONCURRENCY) -> list:
+        """
+        Batched counterpart of `awrite_query`: the questions missing from the cache are sent to the
+        language model in one `abatch`, with at most `max_concurrency` calls in flight.
+
+        Args:
+            states (list): The states containing the user prompts, distinct questions are expected.
+            max_concurrency (int): Maximum number of concurrent model calls.
+
+        Returns:
+            list: One dictionary with the generated SQL query and columns per state, in the order of `states`.
+        """
+
+        await asyncio.to_thread(self.schema.get_context)
+        results, pending = [None] * len(states), []
+        for i, state in enumerate(states):
+            intent = "chart" if state.get("intent") == "chart" else "database"
+            cache_key = self._cache_key(state)
+            cached = self.cache.get(cache_key)
+            if cached:
+                results[i] = {"query": cached["query"], "columns": cached["columns"], "query_cached": True}
+            else:
+                pending.append((i, cache_key, intent))
+        if not pending:
+            return results
+
+        print(f" Generating {len(pending)} queries..." )
+        prompts = []
+        for i, _, intent in pending:
+            question = self._question(states[i])
+            db_context = await asyncio.to_thread(self.schema.get_context, question)
+            prompts.append(self._query_prompt(question, db_context, intent))
+        structured_llm = self.llm.with_structured_output(QueryOutput)
+        config = llm_config({**config_memory, "max_concurrency": max_concurrency}, "write_query")
+        outputs = await structured_llm.abatch(prompts, config=config, return_exceptions=True)
+        for (i, _, _), output in zip(pending, outputs):
+            if isinstance(output, Exception):
+                print(" ❌ Query Generation failure:\n", output)
+                failure("write_query")
+                results[i] = {"query": ""}
+                continue
+            results[i] = {"query": output["query"], "columns": output["columns"], "query_cached": False}
+        return results
+
+
+    async def arun_batch(self, questions: list, intent: str = "database", max_concurrency: int = BATCH_MAX_CONCURRENCY):
+        """
+        Answer a batch of questions: identical questions are answered once, the queries are written with
+        batched model calls, then checked and executed concurrently over the connection pool.
+
+        Args:
+            questions (list): The user's questions.
+            intent (str): "chart" to return the aggregated chart series instead of raw rows.
+            max_concurrency (int): Maximum number of concurrent model calls and query executions.
+
+        Yields:
+            tuple: The positions in `questions` a result answers and its state, in order of completion.
+        """
+
+        positions = {}
+        for i, question in enumerate(questions):
+            positions.setdefault(normalize_question(question), []).append(i)
+        states = [State(question=questions[indexes[0]], intent=intent, trace_id=trace_id_var.get())
+                  for indexes in positions.values()]
+        for state, result in zip(states, await self.awrite_queries(states, max_concurrency)):
+            state.update(result)
+
+        # Executions beyond the pool size would only wait for a connection
+        semaphore = asyncio.Semaphore(max(min(max_concurrency, SQL_POOL_SIZE + SQL_MAX_OVERFLOW), 1))
+
+        async def run(indexes: list, state: State) -> tuple:
+            async with semaphore:
+                state.update(await self.acheck_query(state))
+                state.update(await self.aexecute_query(state))
+            return indexes, state
+
+        tasks = [asyncio.create_task(run(indexes, state)) for indexes, state in zip(positions.values(), states)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+    def invalidate_cache(self) -> None:
+        """Drop all cached queries, to be called when the database schema changes."""
+        self.cache.invalidate()
+
+
+    def invalidate_results(self) -> None:
+        """Drop all cached query results, e.g. after a load the data version can't see."""
+        self.results.invalidate()
+
+
+    def close(self) -> None:
+        """Close the connection pools and the schema context of the database, the agent may still reconnect."""
+        release_sql_schema_context(self.schema.engine)
+        if self._async_engine is not None:
+            engine, self._async_engine = self._async_engine, None
+            try:
+                task = asyncio.get_running_loop().create_task(engine.dispose())
+            except RuntimeError:
+                asyncio.run(engine.dispose())
+            else:
+                # The loop only keeps a weak reference to its tasks
+                _dispose_tasks.add(task)
+                task.add_done_callback(_disposed)
+
+
+    def ping(self) -> bool:
+        """Check that a pooled connection to the database can be used."""
+        with self.schema.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+
+
+_agents = OrderedDict()
+_agent_lock = threading.Lock()
+_dispose_tasks = set()
+
+
+def _disposed(task: asyncio.Task) -> None:
+    """Forget a finished async engine disposal and report its failure."""
+    _dispose_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(" ❌ Closing the async connection pool failed:\n", task.exception())
+
+
+def get_agent(database: str = None) -> SQLAgent:
+    """
+    Return the SQLAgent shared by all tool calls of this server.
+    The agent (and its connection pool) is built on first use and then reused. Only the
+    SQL_MAX_FILE_AGENTS most recently used agents of uploaded file stores are kept, older ones are closed.
+
+    Args:
+        database (str): Path of an uploaded file store (see `agents.file_store`), None for SQL_URI.
+
+    Raises:
+        ValueError: If `database` is not a file store.
+    """
+
+    uri = store_uri(database) if database else None
+    evicted = []
+    with _agent_lock:
+        if uri not in _agents:
+            _agents[uri] = SQLAgent(llm=llm, uri=uri)
+        _agents.move_to_end(uri)
+        agent = _agents[uri]
+        stores = [key for key in _agents if key is not None]
+        for key in stores[:max(len(stores) - SQL_MAX_FILE_AGENTS, 0)]:
+            evicted.append(_agents.pop(key))
+    for old_agent in evicted:
+        old_agent.close()
+    return agent
+
+
+@sql_mcp.custom_route("/ready", methods=["GET"])
+async def ready(request: Request) -> JSONResponse:
+    """Readiness check: the agent is built and the database answers."""
+    try:
+        await asyncio.to_thread(lambda: get_agent().ping())
+        return JSONResponse({"status": "ready"})
+    except Exception as e:
+        return JSONResponse({"status": "not ready", "error": str(e)}, status_code=503)
+
+
+add_routes(sql_mcp)
+
 
 @sql_mcp.tool()
-def run_sql(query: str) -> State:
+async def run_sql(query: str, page_size: int = 0, intent: str = "database", database: str = None,
+                  trace_id: str = None) -> State:
     """
     Run SQL query using the SQLAgent.
     
     Args:
         query (str): The SQL query to be executed.
+        page_size (int): When positive, only the first page of rows is returned together with a
+            `page_token` to read the following pages with `fetch_page`.
+        intent (str): "chart" to return the aggregated series of the chart instead of raw rows.
+        database (str): Path of an uploaded file store to query instead of SQL_URI.
+        trace_id (str): ID correlating the stage metrics of one request across servers.
     """
 
-    # Example usage of the SQLAgent
-    sql_agent = SQLAgent(llm=llm)
+    sql_agent = get_agent(database)
     state = State()
     state["question"] = query
+    state["intent"] = intent
+    state["trace_id"] = set_trace(trace_id)
 
-    result = sql_agent.write_query(state)
-    state.update(result)
-    # print("✅ write_query output:", result['query'])
+    async def pipeline() -> State:
+        result = State(state)
+        result.update(await sql_agent.awrite_query(result))
+        # print("✅ write_query output:", result['query'])
 
-    # Check SQL query
-    result1 = sql_agent.check_query(state)
-    state.update(result1)
-    # print("✅ check_query output:", result1)
+        # Check SQL query
+        result.update(await sql_agent.acheck_query(result))
 
-    # Execute SQL query
-    result2 = sql_agent.execute_query(state)
-    state.update(result2)
-    # print("✅ execute_query output:", result2["result"], "\n Columns:", state.get("columns", []))
+        # Execute SQL query, paginated results get a cursor per caller below
+        if page_size <= 0:
+            result.update(await sql_agent.aexecute_query(result))
+        return result
 
+    # Identical questions in flight share one pipeline run (and its LLM calls and query)
+    key = make_key(normalize_question(query), intent, sql_agent.uri, page_size > 0)
+    state.update({**await in_flight.do(key, pipeline), "trace_id": state["trace_id"]})
+
+    if page_size > 0:
+        try:
+            page, token = await page_store.start(sql_agent.aexecute_query_pages(state, page_size), page_size)
+            state.update({"data": encode_frame(page) if page is not None else None, "page_token": token})
+        except Exception as e:
+            print(" ❌ Query Execution failure:\n", e)
+            state.update({"data": None, "page_token": None})
     return state
 
+@sql_mcp.tool()
+async def fetch_page(page_token: str, trace_id: str = None) -> dict:
+    """
+    Read the next page of a paginated `run_sql` result.
+
+    Args:
+        page_token (str): The `page_token` returned with the previous page.
+        trace_id (str): ID correlating the stage metrics of one request across servers.
+
+    Returns:
+        dict: The columnar page in `data` and the token of the next page in `page_token` (None when done).
+    """
+
+    set_trace(trace_id)
+    page, token = await page_store.next(page_token)
+    return {"data": encode_frame(page) if page is not None else None, "page_token": token}
+
+@sql_mcp.tool()
+async def close_page(page_token: str, trace_id: str = None) -> dict:
+    """
+    Close the cursor of a paginated `run_sql` result that won't be read to the end.
+
+    Args:
+        page_token (str): The `page_token` returned with the last page read.
+        trace_id (str): ID correlating the stage metrics of one request across servers.
+
+    Returns:
+        dict: `closed` is False when the cursor was already closed or expired.
+    """
+
+    set_trace(trace_id)
+    return {"closed": await page_store.close(page_token)}
+
+@sql_mcp.tool()
+async def invalidate_results(database: str = None) -> dict:
+    """
+    Drop the cached query results, e.g. after loading data.
+
+    Args:
+        database (str): Path of an uploaded file store, None for SQL_URI. The results of all databases are dropped.
+
+    Returns:
+        dict: The result cache statistics before the results were dropped.
+    """
+
+    sql_agent = get_agent(database)
+    stats = sql_agent.results.stats()
+    sql_agent.invalidate_results()
+    return stats
+
+@sql_mcp.tool()
+async def run_sql_batch(queries: list[str], intent: str = "database", database: str = None,
+                        max_concurrency: int = BATCH_MAX_CONCURRENCY, trace_id: str = None, ctx: Context = None) -> list:
+    """
+    Answer a batch of questions using the SQLAgent, writing the queries with batched model calls and
+    running them concurrently. As each result completes, a progress notification is sent whose message
+    is that result as JSON (the same item as in the returned list).
+
+    Args:
+        queries (list[str]): The user's questions, identical ones are answered once.
+        intent (str): "chart" to return the aggregated series of the charts instead of raw rows.
+        database (str): Path of an uploaded file store to query instead of SQL_URI.
+        max_concurrency (int): Maximum number of concurrent model calls and query executions.
+        trace_id (str): ID correlating the stage metrics of one request across servers.
+
+    Returns:
+        list: The states of the results in order of completion, each with the positions in `queries`
+            it answers in `indexes`.
+    """
+
+    sql_agent = get_agent(database)
+    set_trace(trace_id)
+    results, answered = [], 0
+    async for indexes, state in sql_agent.arun_batch(queries, intent, max_concurrency):
+        item = {"indexes": indexes, **state}
+        results.append(item)
+        answered += len(indexes)
+        if ctx is not None:
+            # The notification carries the result itself, clients don't wait for the slowest question
+            await ctx.report_progress(answered, len(queries), json.dumps(item, default=str))
+    return results
+
 if __name__ == "__main__":
+    # Build the agent and warm up the pool before accepting requests
+    get_agent().ping()
     sql_mcp.run(transport="http")
@@ -28,6 +28,22 @@ Refer the database context below to construct your query.
 {db_context}
 """
 
+sql_chart_query_instructions = """
+The result will be plotted as a chart, so return the series the chart needs instead of raw rows:
+- aggregate in the query with GROUP BY, binning (CASE or arithmetic on the value) or time buckets (e.g. strftime / date_trunc) so every result row is one point of the chart,
+- name the dimension and measure columns after what they represent (e.g. `user_name`, `order_month`, `total_orders`),
+- order the result by the dimension on the x axis,
+- return at most {top_k} points.
+"""
+
+mongodb_chart_query_instructions = """
+The result will be plotted as a chart, so return the series the chart needs instead of raw documents:
+- aggregate in the pipeline with $group, $bucket / $bucketAuto or time buckets ($dateTrunc) so every result document is one point of the chart,
+- $project the dimension and measure fields with names describing what they represent (e.g. `user_name`, `order_month`, `total_orders`), without `_id`,
+- $sort by the dimension on the x axis,
+- return at most {top_k} points.
+"""
+
 agent_system_prompt = """Answer the following questions as best you can. You have access to the following tools:
 {tools}
 
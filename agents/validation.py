@@ -0,0 +1,97 @@
+import os
+import re
+import sqlite3
+from sqlalchemy.engine import Engine
+from agents.mongo_query import parse_aggregate
+
+
+# When to ask the LLM checker: "on_failure" (only when local validation fails or isn't possible) or "always"
+LLM_QUERY_CHECK = os.getenv("LLM_QUERY_CHECK", "on_failure")
+
+_FENCED_RE = re.compile(r"```[a-zA-Z]*\s*(.*?)```", re.DOTALL)
+_READ_ONLY_SQL_RE = re.compile(r"^\s*(select|with|explain)\b", re.IGNORECASE)
+# Actions a read query may compile to, anything else (writes, DDL, ATTACH, PRAGMA...) is denied
+_READ_ONLY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+MONGO_READ_STAGES = {
+    "$addFields", "$bucket", "$bucketAuto", "$count", "$densify", "$facet", "$fill", "$geoNear",
+    "$graphLookup", "$group", "$limit", "$lookup", "$match", "$project", "$redact", "$replaceRoot",
+    "$replaceWith", "$sample", "$search", "$searchMeta", "$set", "$setWindowFields", "$skip", "$sort",
+    "$sortByCount", "$unionWith", "$unset", "$unwind", "$vectorSearch",
+}
+
+
+def extract_query(text: str) -> str:
+    """Return the query inside the first fenced code block of an LLM answer, or the stripped answer."""
+
+    match = _FENCED_RE.search(text or "")
+    return (match.group(1) if match else text or "").strip()
+
+
+def _read_only_authorizer(action: int, *args) -> int:
+    """sqlite3 authorizer letting only reads through, also when they're hidden behind a CTE."""
+    return sqlite3.SQLITE_OK if action in _READ_ONLY_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def validate_sql(engine: Engine, query: str) -> tuple:
+    """
+    Validate a SQL query locally by preparing it (`EXPLAIN`) on a read-only SQLite connection.
+    An authorizer denies every action but reads while the statement is compiled, so writes are rejected
+    even when they start with a `WITH` clause.
+
+    Args:
+        engine (Engine): Engine of the database the query will run against.
+        query (str): The generated SQL query.
+
+    Returns:
+        tuple: (True, "") when valid, (False, error) when invalid, (None, reason) when it can't be checked locally.
+    """
+
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return None, f"No local validator for {engine.dialect.name}."
+    if not _READ_ONLY_SQL_RE.match(query or ""):
+        return False, "Only read queries (SELECT/WITH) are allowed."
+    try:
+        conn = sqlite3.connect(f"file:{engine.url.database}?mode=ro", uri=True)
+        try:
+            conn.set_authorizer(_read_only_authorizer)
+            # sqlite3 refuses to prepare more than one statement, which also rules out piggybacked writes
+            conn.execute(f"EXPLAIN {query.strip().rstrip(';')}")
+        finally:
+            conn.close()
+        return True, ""
+    except sqlite3.DatabaseError as e:
+        if "not authorized" in str(e):
+            return False, "Only read queries (SELECT/WITH) are allowed."
+        return False, str(e)
+    except (sqlite3.Error, sqlite3.Warning) as e:
+        return False, str(e)
+
+
+def validate_mongo(command: str, collections: list) -> tuple:
+    """
+    Validate a `db.collection.aggregate([...])` command by parsing its pipeline structure.
+
+    Args:
+        command (str): The generated MongoDB query.
+        collections (list): Names of the collections that may be queried.
+
+    Returns:
+        tuple: (True, "") when valid, (False, error) when invalid.
+    """
+
+    try:
+        collection, pipeline = parse_aggregate(command)
+    except ValueError as e:
+        return False, str(e)
+    if collection not in collections:
+        return False, f"Collection {collection} does not exist!"
+    for position, stage in enumerate(pipeline):
+        if not isinstance(stage, dict) or len(stage) != 1:
+            return False, f"Stage {position} must be a document with exactly one operator."
+        operator = next(iter(stage))
+        if operator not in MONGO_READ_STAGES:
+            return False, f"Stage {position} uses unsupported operator {operator}."
+        if operator in ("$limit", "$skip") and (not isinstance(stage[operator], int) or stage[operator] < 0):
+            return False, f"{operator} expects a non-negative integer."
+    return True, ""
@@ -1,72 +1,67 @@
-import os
 import warnings
 import pandas as pd
-import json
-import plotly.express as px
-import plotly.io as pio
+import asyncio
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_experimental.tools import PythonAstREPLTool
-from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
 from fastmcp import FastMCP
-from agents import llm
+from agents.chart_agent import generate_chart, encode_figure, CHART_MAX_TRACE_POINTS
+from agents.results import decode_frame, content_fingerprint
+from agents.cache import normalize_question, make_key
+from agents.singleflight import SingleFlight
+from agents.sandbox import get_sandbox
+from agents.metrics import set_trace, failure, observe_rows, observe_payload, add_routes
 
 
 warnings.filterwarnings("ignore", category=UserWarning)
 load_dotenv()
 
 chart_mcp = FastMCP(name="ChartAgent", host="0.0.0.0", port=8003)
+add_routes(chart_mcp)
+
+in_flight = SingleFlight("create_chart")
 
 @chart_mcp.tool()
-def create_chart(user_prompt: str, df: list):
+async def create_chart(user_prompt: str, df: list = None, data: dict = None, trace_id: str = None,
+                       max_points: int = CHART_MAX_TRACE_POINTS):
     """
     Create a chart based on user prompt and DataFrame.
     
     Args:
         user_prompt (str): The user's question or prompt for the chart.
-        df (list): DataFrame data as a list of dictionaries.
+        df (list): DataFrame data as a list of dictionaries (legacy payload).
+        data (dict): DataFrame as a columnar envelope (Arrow/Parquet bytes or a spill file reference), see `agents.results`.
+        trace_id (str): ID correlating the stage metrics of one request across servers.
+        max_points (int): Point budget per scatter/line trace, larger ones are downsampled. 0 keeps full resolution.
 
     Returns:
-        str: JSON representation of the Plotly figure.
+        dict: The compact Plotly figure, see `agents.chart_agent.encode_figure`.
         str: The generated Python code used to create the chart.
     """
-    try:
-        df = pd.DataFrame(df)
-        fig = ""
-        tool = PythonAstREPLTool(locals={"fig": fig}, globals={"df": df})
-        llm_with_tools = llm.bind_tools([tool], tool_choice=tool.name)
-        parser = JsonOutputKeyToolsParser(key_name=tool.name, first_tool_only=True)
+    set_trace(trace_id)
 
-        system = f"""You only have access to a pandas dataframe `df`.
-        Here is the output of `df.head()` for reference:
+    def load() -> tuple:
+        frame = decode_frame(data, consume=True) if data else pd.DataFrame(df)
+        return frame, content_fingerprint(frame)
 
-        \`\`\`
-        {df.head().to_markdown()}
-        \`\`\`
+    def build(frame: pd.DataFrame) -> tuple:
+        observe_rows("create_chart", len(frame))
+        fig, code = generate_chart(user_prompt, frame)
+        return encode_figure(fig, max_points), code
 
-        Do NOT generate or simulate new data.
-        Given a user question, write the Python code to generate a Plotly figure object using the dataframe `df` as reference for code generation.
-        Only create any new variables for intermediate steps required for plotting.
-        Return ONLY the valid Python code with Plotly figure object and nothing else.
-        Do not call `fig.show()`, `plt.show()` functions.
-        Don't assume you have access to any libraries other than built-in Python ones, pandas, and plotly.
-        """
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system),
-            ("human", "{question}")
-        ])
-        chain = prompt | llm_with_tools | parser
-        result = chain.invoke({"question": user_prompt}, verbose=True)
-        # print("\n####################################\n")
-        # print(result['query'])
-        # print("\n####################################\n")
-        fig = tool.invoke(result['query'])
-        return pio.to_json(fig), result['query']
+    try:
+        # Identical prompts over the same data in flight share one chart (and its LLM call), the data is
+        # compared by content as every "ref" envelope names its own spill file
+        frame, content = await asyncio.to_thread(load)
+        key = make_key(normalize_question(user_prompt), max_points, content)
+        figure, code = await in_flight.do(key, lambda: asyncio.to_thread(build, frame))
+        observe_payload("create_chart", len(figure["data"]))
+        return figure, code
     except Exception as e:
         print("❌ Error in create_chart:", e)
+        failure("create_chart")
         return None, None
 
 
 if __name__ == "__main__":
+    # Start the chart code workers before accepting requests
+    get_sandbox()
     chart_mcp.run(transport="http")
\ No newline at end of file
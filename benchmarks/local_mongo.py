@@ -0,0 +1,69 @@
+import asyncio
+import mongomock
+from agents.loader import load_mongo, DATA_DIR
+
+
+class _AsyncCursor():
+    """Async iteration over the documents of a mongomock cursor."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+
+    def __aiter__(self):
+        return self
+
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+    async def to_list(self, length: int = None) -> list:
+        documents = list(self._cursor)
+        return documents[:length] if length else documents
+
+
+class _AsyncCollection():
+    def __init__(self, collection):
+        self._collection = collection
+
+
+    async def aggregate(self, pipeline: list, **kwargs) -> _AsyncCursor:
+        # batchSize is a wire protocol option, mongomock has no batches
+        kwargs.pop("batchSize", None)
+        return _AsyncCursor(await asyncio.to_thread(self._collection.aggregate, pipeline, **kwargs))
+
+
+class _AsyncDatabase():
+    def __init__(self, database):
+        self._database = database
+
+
+    def __getitem__(self, name: str) -> _AsyncCollection:
+        return _AsyncCollection(self._database[name])
+
+
+class AsyncMockClient():
+    """The part of `pymongo.AsyncMongoClient` used by the MongoDB agent, over a shared mongomock client."""
+
+    def __init__(self, client: mongomock.MongoClient):
+        self._client = client
+
+
+    def __getitem__(self, name: str) -> _AsyncDatabase:
+        return _AsyncDatabase(self._client[name])
+
+
+    async def close(self) -> None:
+        pass
+
+
+def local_mongo(data_dir: str = DATA_DIR) -> mongomock.MongoClient:
+    """In-process MongoDB stand-in loaded with the `data_store` CSVs, see `agents.loader`."""
+
+    client = mongomock.MongoClient()
+    load_mongo(client, data_dir, mode="replace")
+    return client
@@ -0,0 +1,327 @@
+"""
+Offline end-to-end benchmarks of the agent pipelines, with a scripted chat model, `sales.db` and an in-process MongoDB.
+
+    python -m benchmarks.run                          # run the workloads and compare with the stored baseline
+    python -m benchmarks.run --update-baseline        # store the numbers as the new baseline
+    python -m benchmarks.run --only sql_orders_per_product_cold --repeat 50 --llm-latency 0.3
+"""
+import os
+import io
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from unittest import mock
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# No network and no state left behind: the servers run in process, the caches live in a temporary directory
+os.environ.setdefault("SQL_URI", "sqlite:///sales.db")
+os.environ.setdefault("MONGO_URI", "mongodb://benchmark.invalid")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_VERSION", "2024-06-01")
+os.environ.setdefault("OPENAI_ENDPOINT", "https://benchmark.invalid")
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ["QUERY_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="genai-bench-"), "query_cache.db")
+
+import agents
+from benchmarks.fake_llm import ScriptedChatModel
+
+# Installed before the agent modules bind `from agents import llm`
+agents.llm = ScriptedChatModel()
+
+import pandas as pd
+import agents.schema
+import agents.mongo_agent
+from agents.sql_agent import sql_mcp
+from agents.mongo_agent import mongo_mcp
+from agents.viz_agent import chart_mcp
+from agents.cache import cache_instances
+from agents.results import decode_frame
+from agents.metrics import new_trace_id, set_trace, trace
+from agents.orchestrator import OrchestratorService, orchestrate, render_chart
+from benchmarks.local_mongo import local_mongo, AsyncMockClient
+
+
+WORKLOADS_FILE = os.getenv("BENCH_WORKLOADS", os.path.join(BENCH_DIR, "workloads.jsonl"))
+BASELINE_FILE = os.getenv("BENCH_BASELINE", os.path.join(BENCH_DIR, "baseline.json"))
+# Allowed relative regression of latency percentiles, throughput and peak memory over the baseline
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.25"))
+# Absolute latency (ms) and memory (MB) slack, keeps sub-millisecond stages from failing on noise
+BENCH_SLACK_MS = float(os.getenv("BENCH_SLACK_MS", "2"))
+BENCH_SLACK_MB = float(os.getenv("BENCH_SLACK_MB", "1"))
+
+TARGETS = ("run_sql", "run_mongo", "create_chart", "orchestrate")
+CHECKED_PERCENTILES = ("p50", "p95")
+
+
+def load_workloads(path: str, only: list = None) -> list:
+    """
+    Read the workloads of a JSONL file, one JSON object per line (blank lines and `#` comments are skipped).
+
+    Every workload has a `name`, a `target` (run_sql, run_mongo, create_chart or orchestrate) and a `question`,
+    and scripts the model answers with `query`/`columns` (the generated query) and `code` (the chart code).
+    Optional: `intent`, `db_choice` (orchestrate), `data_sql` (rows plotted by create_chart), `page_size`,
+    `repeat`, `cache` (false empties the caches before every run, so the model is always asked).
+
+    Raises:
+        ValueError: If a workload has no name or an unknown target.
+    """
+
+    workloads = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            workload = json.loads(line)
+            if not workload.get("name") or workload.get("target") not in TARGETS:
+                raise ValueError(f"Invalid workload: {line.strip()}")
+            if not only or workload["name"] in only:
+                workloads.append(workload)
+    return workloads
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(samples: dict) -> dict:
+    """Per stage p50/p95/p99 latencies (ms) of the recorded samples (seconds)."""
+    return {
+        stage: {"n": len(values), **{f"p{p}": round(percentile(values, p) * 1000, 3) for p in (50, 95, 99)}}
+        for stage, values in sorted(samples.items())
+    }
+
+
+class Benchmark():
+    """Runs workloads against the real MCP servers, connected in memory to one OrchestratorService."""
+
+    def __init__(self, llm_latency: float = 0.0, concurrency: int = 1, verbose: bool = False):
+        self.concurrency = concurrency
+        self.verbose = verbose
+        agents.llm.latency = llm_latency
+        self.service = OrchestratorService(servers={
+            "SQL": {"url": sql_mcp},
+            "Mongo": {"url": mongo_mcp},
+            "Chart": {"url": chart_mcp},
+        })
+        self._frames = {}
+
+
+    def _frame(self, sql: str) -> pd.DataFrame:
+        """Rows plotted by a create_chart workload, read once from the SQL database."""
+        if sql not in self._frames:
+            self._frames[sql] = pd.read_sql_query(sql, os.environ["SQL_URI"])
+        return self._frames[sql]
+
+
+    async def _call(self, workload: dict, trace_id: str):
+        set_trace(trace_id)
+        target, question = workload["target"], workload["question"]
+        intent = workload.get("intent", "database")
+
+        if target in ("run_sql", "run_mongo"):
+            server = "SQL" if target == "run_sql" else "Mongo"
+            arguments = {"query": question, "intent": intent, "page_size": workload.get("page_size", 0)}
+            state = json.loads((await self.service.call_tool(server, target, arguments)).content[0].text)
+            if not state.get("data"):
+                raise RuntimeError(f"{target} returned no data for: {question}")
+            rows = len(decode_frame(state["data"]))
+            while state.get("page_token"):
+                state = json.loads((await self.service.call_tool(server, "fetch_page", {"page_token": state["page_token"]})).content[0].text)
+                rows += len(decode_frame(state["data"])) if state.get("data") else 0
+            return rows
+
+        if target == "create_chart":
+            fig, _ = await render_chart(question, self._frame(workload["data_sql"]), self.service.call_tool)
+            return fig
+
+        result, _ = await orchestrate(workload.get("db_choice", "SQL"), question, intent, self.service.call_tool)
+        if result is None:
+            raise RuntimeError(f"orchestrate returned nothing for: {question}")
+        return result
+
+
+    def _run_once(self, workload: dict) -> tuple:
+        """Run a workload once, returning its end to end wall time and the spans of its trace."""
+
+        if workload.get("cache") is False:
+            for cache in list(cache_instances):
+                cache.invalidate()
+        trace_id = new_trace_id()
+        start = time.perf_counter()
+        self.service.submit(self._call(workload, trace_id)).result()
+        return time.perf_counter() - start, trace(trace_id)
+
+
+    def _run_batch(self, workload: dict, count: int) -> list:
+        """Run a workload `count` times with up to `concurrency` runs in flight."""
+
+        results = []
+        for offset in range(0, count, self.concurrency):
+            if self.concurrency == 1:
+                results.append(self._run_once(workload))
+                continue
+            if workload.get("cache") is False:
+                for cache in list(cache_instances):
+                    cache.invalidate()
+            window = []
+            for _ in range(min(self.concurrency, count - offset)):
+                trace_id = new_trace_id()
+                window.append((trace_id, time.perf_counter(), self.service.submit(self._call(workload, trace_id))))
+            for trace_id, start, future in window:
+                future.result()
+                results.append((time.perf_counter() - start, trace(trace_id)))
+        return results
+
+
+    def run(self, workload: dict, repeat: int, warmup: int) -> dict:
+        """
+        Benchmark one workload: `warmup` untimed runs, `repeat` timed runs, then one run under tracemalloc.
+
+        Returns:
+            dict: Per stage latency percentiles (the end to end time as stage "total"), throughput (runs/s)
+                and peak traced memory (MB).
+        """
+
+        output = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            self._run_batch(workload, warmup)
+            start = time.perf_counter()
+            results = self._run_batch(workload, repeat)
+            elapsed = time.perf_counter() - start
+
+            # Memory is measured apart, tracing allocations slows every stage down
+            tracemalloc.start()
+            try:
+                tracemalloc.reset_peak()
+                self._run_once(workload)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        samples = {"total": []}
+        for seconds, spans in results:
+            samples["total"].append(seconds)
+            for span in spans:
+                samples.setdefault(span["stage"], []).append(span["seconds"])
+        return {
+            "stages": summarize(samples),
+            "throughput": round(repeat / elapsed, 3),
+            "peak_mb": round(peak / 2 ** 20, 3),
+        }
+
+
+    def close(self) -> None:
+        self.service.close()
+
+
+def compare(results: dict, baseline: dict, tolerance: float = BENCH_TOLERANCE,
+            slack_ms: float = BENCH_SLACK_MS, slack_mb: float = BENCH_SLACK_MB) -> list:
+    """
+    Compare results with a stored baseline.
+
+    Returns:
+        list: One message per regression: a p50/p95 latency or the peak memory above the baseline plus
+            `tolerance` (and the absolute slack), or a throughput below the baseline minus `tolerance`.
+    """
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for stage, stats in result["stages"].items():
+            for p in CHECKED_PERCENTILES:
+                expected = base["stages"].get(stage, {}).get(p)
+                if expected is not None and stats[p] > expected * (1 + tolerance) + slack_ms:
+                    regressions.append(f"{name} {stage} {p}: {stats[p]:.3f} ms (baseline {expected:.3f} ms)")
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name} throughput: {result['throughput']:.3f}/s (baseline {base['throughput']:.3f}/s)")
+        if result["peak_mb"] > base["peak_mb"] * (1 + tolerance) + slack_mb:
+            regressions.append(f"{name} peak memory: {result['peak_mb']:.3f} MB (baseline {base['peak_mb']:.3f} MB)")
+    return regressions
+
+
+def report(results: dict) -> str:
+    lines = []
+    for name, result in results.items():
+        lines.append(f"\n{name}: {result['throughput']:.2f} runs/s, peak {result['peak_mb']:.2f} MB")
+        lines.append(f"  {'stage':<20}{'n':>6}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+        for stage, stats in result["stages"].items():
+            lines.append(f"  {stage:<20}{stats['n']:>6}{stats['p50']:>12.3f}{stats['p95']:>12.3f}{stats['p99']:>12.3f}")
+    return "\n".join(lines)
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workloads", default=WORKLOADS_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--only", nargs="*", help="Names of the workloads to run.")
+    parser.add_argument("--repeat", type=int, help="Timed runs per workload, overrides the workload `repeat`.")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed runs per workload.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Runs in flight at once.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds slept per model call.")
+    parser.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE)
+    parser.add_argument("--output", help="Also write the results as JSON to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the agents.")
+    args = parser.parse_args(argv)
+
+    workloads = load_workloads(args.workloads, args.only)
+    if not workloads:
+        parser.error("No workloads to run.")
+    agents.llm.script = {w["question"]: w for w in workloads}
+
+    mongo = local_mongo()
+    with mock.patch.object(agents.schema, "MongoClient", lambda uri, **kwargs: mongo), \
+         mock.patch.object(agents.mongo_agent, "AsyncMongoClient", lambda uri, **kwargs: AsyncMockClient(mongo)):
+        benchmark = Benchmark(args.llm_latency, max(args.concurrency, 1), args.verbose)
+        results = {}
+        try:
+            for workload in workloads:
+                repeat = args.repeat or workload.get("repeat", 20)
+                print(f"⏱️ {workload['name']} ({workload['target']}, {repeat} runs)...", flush=True)
+                results[workload["name"]] = benchmark.run(workload, repeat, args.warmup)
+        finally:
+            benchmark.close()
+
+    print(report(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"\n✅ Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\n⚠️ No baseline at {args.baseline}, run with --update-baseline to store one.")
+        return
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print("\n❌ Regressions past the baseline:")
+        for regression in regressions:
+            print("  " + regression)
+        sys.exit(1)
+    print("\n✅ No regression past the baseline.")
+
+
+if __name__ == "__main__":
+    main()
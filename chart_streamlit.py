@@ -1,60 +1,31 @@
-import os
 import warnings
-import pandas as pd
-import plotly.express as px
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_experimental.tools import PythonAstREPLTool
-from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
 import streamlit as st
+from agents import llm
+from agents.chart_agent import create_chart
+from agents.sql_agent import SQLAgent
+from agents.common import State
+from agents.results import decode_frame
+from agents.file_store import ingest_file, preview, store_uri
 
 
 warnings.filterwarnings("ignore", category=UserWarning)
 load_dotenv()
 
 
-def create_chart(user_prompt: str, df: pd.DataFrame):
-    llm = AzureChatOpenAI(
-        openai_api_key=os.getenv("OPENAI_API_KEY"),
-        api_version=os.getenv("OPENAI_API_VERSION"),
-        azure_endpoint=os.getenv("OPENAI_ENDPOINT"),
-        model="gpt-4o",
-        temperature=0
-        # timeout=None
-    )
+@st.cache_resource
+def get_file_agent(database: str) -> SQLAgent:
+    """SQL agent of an uploaded file store, shared by all reruns."""
+    return SQLAgent(llm=llm, uri=store_uri(database))
+
 
-    fig = ""
-    tool = PythonAstREPLTool(locals={"fig": fig}, globals={"df": df})
-    llm_with_tools = llm.bind_tools([tool], tool_choice=tool.name)
-    parser = JsonOutputKeyToolsParser(key_name=tool.name, first_tool_only=True)
-
-    system = f"""You only have access to a pandas dataframe `df`.
-    Here is the output of `df.head()` for reference:
-
-    \`\`\`
-    {df.head().to_markdown()}
-    \`\`\`
-
-    Do NOT generate or simulate new data.
-    Given a user question, write the Python code to generate a Plotly figure object using the dataframe `df` as reference for code generation.
-    Only create any new variables for intermediate steps required for plotting.
-    Return ONLY the valid Python code with Plotly figure object and nothing else.
-    Do not call `fig.show()`, `plt.show()` functions.
-    Don't assume you have access to any libraries other than built-in Python ones, pandas, and plotly.
-    """
-
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system),
-        ("human", "{question}")
-    ])
-    chain = prompt | llm_with_tools | parser
-    result = chain.invoke({"question": user_prompt}, verbose=True)
-    print("\n####################################\n")
-    print(result['query'])
-    print("\n####################################\n")
-    fig = tool.invoke(result['query'])
-    return fig
+def ingest_upload(uploaded_file) -> str:
+    """Load an upload into its SQLite store once per file, reruns reuse the store path."""
+    stores = st.session_state.setdefault("file_stores", {})
+    if uploaded_file.file_id not in stores:
+        with st.spinner("Loading file..."):
+            stores[uploaded_file.file_id] = ingest_file(uploaded_file, uploaded_file.name)
+    return stores[uploaded_file.file_id]
 
 
 st.set_page_config(page_title="Data Query & Visualization App", layout="wide")
@@ -65,19 +36,17 @@ st.title("📊 Data Query & Visualization App")
 uploaded_file = st.file_uploader("Upload a CSV or Excel file", type=["csv", "xlsx"])
 
 if uploaded_file:
-    # Read file into DataFrame
+    # Load the file into an indexed SQLite store once, questions are answered by the SQL agent
     try:
-        if uploaded_file.name.endswith(".csv"):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
+        database = ingest_upload(uploaded_file)
+        preview_df, num_rows = preview(database)
     except Exception as e:
         st.error(f"Error reading file: {e}")
         st.stop()
 
-    st.success("✅ File uploaded successfully!")
+    st.success(f"✅ File uploaded successfully! {num_rows} rows loaded.")
     st.write("### Data Preview:")
-    st.dataframe(df)
+    st.dataframe(preview_df)
 
     # 2. Query input
     st.write("### Run a Pandas Query")
@@ -92,6 +61,14 @@ if uploaded_file:
             # st.dataframe(filtered_df)
             # 4. Plotly chart
             st.write("### Plotly Chart")
+            agent = get_file_agent(database)
+            state = State()
+            state["question"] = query_str
+            state["intent"] = "chart"
+            state.update(agent.write_query(state))
+            state.update(agent.check_query(state))
+            state.update(agent.execute_query(state))
+            df = decode_frame(state.get("data"))
             fig = create_chart(query_str, df)
             st.plotly_chart(fig, use_container_width=True)
         except Exception as e:
@@ -1,13 +1,43 @@
 import warnings
-import asyncio
-import pandas as pd
 import streamlit as st
-from agents.common import detect_intent
-from agents.orchestrator import orchestrate
+from agents.orchestrator import OrchestratorService
+from agents.paging import concat_pages
+from agents.common import intent_hint
+from agents.file_store import ingest_file, preview
+from agents.history import ChatHistory
+from agents.metrics import new_trace_id
 
 
 warnings.filterwarnings("ignore", category=UserWarning)
 
+
+@st.cache_resource
+def get_orchestrator() -> OrchestratorService:
+    """One orchestrator (event loop + MCP sessions) per Streamlit server process, shared by all reruns."""
+    return OrchestratorService()
+
+
+def ingest_upload(uploaded_file) -> str:
+    """Load an upload into its SQLite store once per file, reruns reuse the store path."""
+    stores = st.session_state.setdefault("file_stores", {})
+    if uploaded_file.file_id not in stores:
+        with st.spinner("Loading file..."):
+            stores[uploaded_file.file_id] = ingest_file(uploaded_file, uploaded_file.name)
+    return stores[uploaded_file.file_id]
+
+
+def render_result(msg: dict, content, nested: bool = False) -> None:
+    """Render an assistant result, the code is shown inline when already inside an expander."""
+    if msg["type"] == "chart":
+        st.plotly_chart(content, use_container_width=True)
+        if nested:
+            st.code(msg["code"], language="python")
+        else:
+            with st.expander("Show Python Code"):
+                st.code(msg["code"], language="python")
+    else:
+        st.dataframe(content)
+
 ## *******************************************************  Streamlit app setup  *******************************************************
 st.set_page_config(page_title="Data Query & Visualization App", layout="wide")
 
@@ -18,10 +48,30 @@ option = st.sidebar.selectbox(
     "Choose an option:",
     ("-", "MongoDB", "SQL", "File Upload")
 )
+# Large scatter/line traces are downsampled for transport unless every point is asked for
+full_resolution = st.sidebar.toggle("Full resolution charts", value=False)
 
-# Initialize session state for chat
+# Initialize session state for chat, only the last turns are kept in memory
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = ChatHistory()
+
+
+database = None
+if option == "File Upload":
+    # The upload is loaded once into an indexed SQLite store and queried by the SQL agent
+    uploaded_file = st.sidebar.file_uploader("Upload a file", type=["csv", "xlsx"])
+    if uploaded_file is None:
+        st.sidebar.info("Please upload a file to continue.")
+        st.stop()
+    try:
+        database = ingest_upload(uploaded_file)
+    except Exception as e:
+        st.error(f"Error reading file: {e}")
+        st.stop()
+    preview_df, num_rows = preview(database)
+    st.success(f"✅ File uploaded successfully! {num_rows} rows loaded.")
+    st.write("### Data Preview:")
+    st.dataframe(preview_df)
 
 
 if option != "-":
@@ -29,16 +79,16 @@ if option != "-":
     # Display existing messages
     st.write("📜 Chat with Assistant")
 
-    for msg in st.session_state.messages:
+    for i, msg in enumerate(st.session_state.messages):
         if msg["role"] == "user":
             st.markdown(msg["content"])
+        elif ChatHistory.is_spilled(msg):
+            # Older results are read back from disk only when asked for
+            with st.expander(f"Earlier result: {msg.get('question', '')}"):
+                if st.checkbox("Load result", key=f"history-{i}"):
+                    render_result(msg, st.session_state.messages.load(msg), nested=True)
         else:
-            if msg["type"] == "chart":
-                st.plotly_chart(msg["content"], use_container_width=True)
-                with st.expander("Show Python Code"):
-                    st.code(msg["code"], language="python")
-            else:
-                st.dataframe(msg["content"])
+            render_result(msg, msg["content"])
 
     # Chat input
     if prompt := st.chat_input("Type your message here..."):
@@ -47,28 +97,44 @@ if option != "-":
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        intent = detect_intent(prompt)
-        response, code = asyncio.run(orchestrate(
-            db_choice=option,
-            query=prompt,
-            intent=intent
-        ))
-        if intent =="chart":
-            msg = {"role": "assistant", "type": intent, "content": response, "code": code}
-            st.session_state.messages.append({"role": "assistant", "type": intent, "content": response, "code": code})
-        else:
-             st.session_state.messages.append({"role": "assistant", "type": intent, "content": response})
-
+        # Intent detection runs concurrently with the data pipeline, pages are shown as they arrive
+        service = get_orchestrator()
         with st.chat_message("assistant"):
+            # One trace ID correlates the stage metrics of this answer on every server
+            trace_id = new_trace_id()
+            intent_future = service.detect_intent(prompt)
+            placeholder = st.empty()
+            pages = []
+            # A confident local "chart" fetches the aggregated series right away
+            for page in service.iter_pages(option, prompt, intent=intent_hint(prompt), database=database, trace_id=trace_id):
+                pages.append(page)
+                if intent_future.done() and intent_future.result() not in ("database", "chart"):
+                    break
+                placeholder.dataframe(concat_pages(pages))
+            intent = intent_future.result()
+            response, code = concat_pages(pages), None
+            if intent == "chart":
+                placeholder.empty()
+                response, code = service.render_chart(prompt, response, trace_id=trace_id,
+                                                       full_resolution=full_resolution)
+            elif intent == "database":
+                placeholder.dataframe(response)
+            else:
+                placeholder.empty()
+                response = None
+
             if intent == "chart":
                 st.plotly_chart(response, use_container_width=True)
                 with st.expander("Show Python Code"):
                     st.code(code, language="python")
-            elif intent == "database":
-                st.dataframe(response)
-            else:
+            elif intent != "database":
                 st.write("Unsupported intent type. Please try again with a valid query.")
 
+        if intent =="chart":
+            st.session_state.messages.append({"role": "assistant", "type": intent, "content": response, "code": code})
+        else:
+             st.session_state.messages.append({"role": "assistant", "type": intent, "content": response})
+
 
 # Prompts:
 # What are the names of the top 3 users with highest total purchase amount (quantity * price)?
@@ -1,15 +1,54 @@
 import warnings
-import pandas as pd
 import streamlit as st
 from agents import llm
-from agents.chart_agent import create_chart
+from agents.chart_agent import create_chart, CHART_MAX_TRACE_POINTS
 from agents.sql_agent import SQLAgent
 from agents.mongo_agent import MongoDBAgent
 from agents.common import State, detect_intent
+from agents.paging import concat_pages
+from agents.results import decode_frame
+from agents.file_store import ingest_file, preview, store_uri
+from agents.history import ChatHistory
 
 
 warnings.filterwarnings("ignore", category=UserWarning)
 
+
+@st.cache_resource
+def get_file_agent(database: str) -> SQLAgent:
+    """SQL agent of an uploaded file store, shared by all reruns."""
+    return SQLAgent(llm=llm, uri=store_uri(database))
+
+
+def ingest_upload(uploaded_file) -> str:
+    """Load an upload into its SQLite store once per file, reruns reuse the store path."""
+    stores = st.session_state.setdefault("file_stores", {})
+    if uploaded_file.file_id not in stores:
+        with st.spinner("Loading file..."):
+            stores[uploaded_file.file_id] = ingest_file(uploaded_file, uploaded_file.name)
+    return stores[uploaded_file.file_id]
+
+
+def render_history() -> None:
+    """Render the chat history, older results are read back from disk only when asked for."""
+    history = st.session_state.messages
+    for i, msg in enumerate(history):
+        if msg["role"] == "user":
+            st.markdown(msg["content"])
+        elif ChatHistory.is_spilled(msg):
+            with st.expander(f"Earlier result: {msg.get('question', '')}"):
+                if st.checkbox("Load result", key=f"history-{i}"):
+                    content = history.load(msg)
+                    if msg.get("type", "chart") == "chart":
+                        st.plotly_chart(content, use_container_width=True)
+                    else:
+                        st.dataframe(content)
+        elif msg.get("type", "chart") == "chart":
+            st.plotly_chart(msg["content"], use_container_width=True)
+        else:
+            st.dataframe(msg["content"])
+
+
 ## *******************************************************  Streamlit app setup  *******************************************************
 st.set_page_config(page_title="Data Query & Visualization App", layout="wide")
 
@@ -20,10 +59,13 @@ option = st.sidebar.selectbox(
     "Choose an option:",
     ("-", "MongoDB", "SQL", "File Upload")
 )
+# Large scatter/line traces are downsampled unless every point is asked for
+full_resolution = st.sidebar.toggle("Full resolution charts", value=False)
+max_points = 0 if full_resolution else CHART_MAX_TRACE_POINTS
 
-# Initialize session state for chat
+# Initialize session state for chat, only the last turns are kept in memory
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = ChatHistory()
 
 agent, state = None, None
 
@@ -32,39 +74,39 @@ if option == "File Upload":
     # File upload
     uploaded_file = st.sidebar.file_uploader("Upload a file", type=["csv", "xlsx"])
 
-    file_content = None
+    database = None
     if uploaded_file:
-        # Read file into DataFrame
+        # Load the file into an indexed SQLite store once, questions are answered by the SQL agent
         try:
-            if uploaded_file.name.endswith(".csv"):
-                df = pd.read_csv(uploaded_file)
-                file_content = df.head().to_string()
+            database = ingest_upload(uploaded_file)
+            preview_df, num_rows = preview(database)
+            st.success(f"✅ File uploaded successfully! {num_rows} rows loaded.")
+            st.write("### Data Preview:")
+            st.dataframe(preview_df)
         except Exception as e:
             st.error(f"Error reading file: {e}")
-            # st.stop()
-
-    if file_content:
-        st.success("✅ File uploaded successfully!")
-        st.write("### Data Preview:")
-        st.dataframe(df)
+            database = None
 
     # Display existing messages
     st.write("📜 Chat with Assistant")
 
-    for msg in st.session_state.messages:
-        if msg["role"] == "user":
-            st.markdown(msg["content"])
-        else:
-            st.plotly_chart(msg["content"], use_container_width=True)
+    render_history()
 
     # Chat input
-    if prompt := st.chat_input("Type your message here..."):
+    if database and (prompt := st.chat_input("Type your message here...")):
         # Add user message
         st.session_state.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        fig = create_chart(prompt, df)
+        agent = get_file_agent(database)
+        state = State()
+        state["question"] = prompt
+        state["intent"] = "chart"
+        state.update(agent.write_query(state))
+        state.update(agent.check_query(state))
+        state.update(agent.execute_query(state))
+        fig = create_chart(prompt, decode_frame(state.get("data")), max_points)
         
         # Add assistant message
         st.session_state.messages.append({"role": "assistant", "content": fig})
@@ -78,14 +120,7 @@ if option == "SQL":
     # Display existing messages
     st.write("📜 Chat with Assistant")
 
-    for msg in st.session_state.messages:
-        if msg["role"] == "user":
-            st.markdown(msg["content"])
-        else:
-            if msg["type"] == "chart":
-                st.plotly_chart(msg["content"], use_container_width=True)
-            else:
-                st.dataframe(msg["content"])
+    render_history()
 
     # Chat input
     if prompt := st.chat_input("Type your message here..."):
@@ -97,32 +132,39 @@ if option == "SQL":
         state["question"] = prompt
 
         intent = detect_intent(prompt)
+        state["intent"] = intent
 
         result = agent.write_query(state)
         state.update(result)
         result1 = agent.check_query(state)
         state.update(result1)
-        result2 = agent.execute_query(state)
-        state.update(result2)
-        # print("✅ execute_query output:", result2["result"], "\n columns:", state.get("columns", []))
-        
-        df = pd.DataFrame(data=eval(state.get("result")), columns=state.get("columns"))
-        fig = None
-        if intent =="chart":
-            fig = create_chart(prompt, df)
-            msg = {"role": "assistant", "type": intent, "content": fig}
-            st.session_state.messages.append({"role": "assistant", "type": intent, "content": fig})
-        else:
-             st.session_state.messages.append({"role": "assistant", "type": intent, "content": df})
-
+        # Pages are shown as they are read from the cursor
+        pages = []
         with st.chat_message("assistant"):
+            placeholder = st.empty()
+            if intent in ("database", "chart"):
+                try:
+                    for page in agent.execute_query_pages(state):
+                        pages.append(page)
+                        if intent == "database":
+                            placeholder.dataframe(concat_pages(pages))
+                except Exception as e:
+                    print(" ❌ Query Execution failure:\n", e)
+            df = concat_pages(pages)
+            fig = None
             if intent == "chart":
+                fig = create_chart(prompt, df, max_points)
                 st.plotly_chart(fig, use_container_width=True)
             elif intent == "database":
-                st.dataframe(df)
+                placeholder.dataframe(df)
             else:
                 st.write("Unsupported intent type. Please try again with a valid query.")
 
+        if intent =="chart":
+            st.session_state.messages.append({"role": "assistant", "type": intent, "content": fig})
+        else:
+             st.session_state.messages.append({"role": "assistant", "type": intent, "content": df})
+
 if option == "MongoDB":
     agent = MongoDBAgent(llm=llm)
     state = State()
@@ -130,14 +172,7 @@ if option == "MongoDB":
     # Display existing messages
     st.write("📜 Chat with Assistant")
 
-    for msg in st.session_state.messages:
-        if msg["role"] == "user":
-            st.markdown(msg["content"])
-        else:
-            if msg["type"] == "chart":
-                st.plotly_chart(msg["content"], use_container_width=True)
-            else:
-                st.dataframe(msg["content"])
+    render_history()
 
     # Chat input
     if prompt := st.chat_input("Type your message here..."):
@@ -149,32 +184,39 @@ if option == "MongoDB":
         state["question"] = prompt
 
         intent = detect_intent(prompt)
+        state["intent"] = intent
 
         result = agent.write_query(state)
         state.update(result)
         result1 = agent.check_query(state)
         state.update(result1)
-        result2 = agent.execute_query(state)
-        state.update(result2)
-        # print("✅ execute_query output:", result2["result"], "\n columns:", state.get("columns", []))
-        
-        df = pd.DataFrame(data=eval(state.get("result")))
-        fig = None
-        if intent =="chart":
-            fig = create_chart(prompt, df)
-            msg = {"role": "assistant", "type": intent, "content": fig}
-            st.session_state.messages.append({"role": "assistant", "type": intent, "content": fig})
-        else:
-             st.session_state.messages.append({"role": "assistant", "type": intent, "content": df})
-        
+        # Pages are shown as they are read from the cursor
+        pages = []
         with st.chat_message("assistant"):
+            placeholder = st.empty()
+            if intent in ("database", "chart"):
+                try:
+                    for page in agent.execute_query_pages(state):
+                        pages.append(page)
+                        if intent == "database":
+                            placeholder.dataframe(concat_pages(pages))
+                except Exception as e:
+                    print(" ❌ Query Execution failure:\n", e)
+            df = concat_pages(pages)
+            fig = None
             if intent == "chart":
+                fig = create_chart(prompt, df, max_points)
                 st.plotly_chart(fig, use_container_width=True)
             elif intent == "database":
-                st.dataframe(df)
+                placeholder.dataframe(df)
             else:
                 st.write("Unsupported intent type. Please try again with a valid query.")
 
+        if intent =="chart":
+            st.session_state.messages.append({"role": "assistant", "type": intent, "content": fig})
+        else:
+             st.session_state.messages.append({"role": "assistant", "type": intent, "content": df})
+
 # Prompts:
 # What are the names of the top 3 users with highest total purchase amount (quantity * price)?
 # Plot a bar chart showing the total number of orders for each user.
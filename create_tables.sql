@@ -1,5 +1,5 @@
 -- Create a table for Users
-CREATE TABLE Users (
+CREATE TABLE IF NOT EXISTS Users (
     user_id INTEGER PRIMARY KEY,
     first_name TEXT NOT NULL,
     last_name TEXT NOT NULL,
@@ -9,7 +9,7 @@ CREATE TABLE Users (
 );
 
 -- Create a table for Orders
-CREATE TABLE Orders (
+CREATE TABLE IF NOT EXISTS Orders (
     order_id INTEGER PRIMARY KEY,
     user_id INTEGER NOT NULL,
     product_name TEXT NOT NULL,
@@ -18,3 +18,8 @@ CREATE TABLE Orders (
     order_date DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES Users(user_id)
 );
+
+-- Indexes of the joins, filters and group-bys on Orders
+CREATE INDEX IF NOT EXISTS idx_orders_user_id ON Orders (user_id);
+CREATE INDEX IF NOT EXISTS idx_orders_order_date ON Orders (order_date);
+CREATE INDEX IF NOT EXISTS idx_orders_product_name ON Orders (product_name);
@@ -0,0 +1,15 @@
+import base64
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def values():
+    """Values of a figure attribute read back from JSON, plotly keeps numeric arrays as base64 typed arrays."""
+
+    def decode(attribute):
+        if isinstance(attribute, dict) and "bdata" in attribute:
+            return np.frombuffer(base64.b64decode(attribute["bdata"]), dtype=attribute["dtype"]).tolist()
+        return list(attribute)
+
+    return decode
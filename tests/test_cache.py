@@ -0,0 +1,49 @@
+from agents.cache import PersistentCache, normalize_question, make_key
+
+
+def test_normalize_question():
+    assert normalize_question("  How many   Users? ") == "how many users"
+    assert normalize_question(None) == ""
+
+
+def test_make_key_separates_parts():
+    assert make_key("ab", "c") != make_key("a", "bc")
+
+
+def test_get_and_set(tmp_path):
+    cache = PersistentCache("test", str(tmp_path / "cache.db"))
+    assert cache.get("q") is None
+    cache.set("q", {"query": "SELECT 1", "columns": ["1"]})
+    assert cache.get("q") == {"query": "SELECT 1", "columns": ["1"]}
+    assert cache.stats() == {"namespace": "test", "hits": 1, "misses": 1, "size": 1}
+
+
+def test_expired_entries_are_dropped(tmp_path, monkeypatch):
+    cache = PersistentCache("test", str(tmp_path / "cache.db"), ttl=10)
+    now = 1000.0
+    monkeypatch.setattr("agents.cache.time.time", lambda: now)
+    cache.set("q", 1)
+    now += 11
+    assert cache.get("q") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    cache = PersistentCache("test", str(tmp_path / "cache.db"), max_entries=2)
+    clock = iter(range(100))
+    monkeypatch.setattr("agents.cache.time.time", lambda: float(next(clock)))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_namespaces_do_not_collide(tmp_path):
+    path = str(tmp_path / "cache.db")
+    sql, mongo = PersistentCache("sql", path), PersistentCache("mongo", path)
+    sql.set("q", "SELECT 1")
+    mongo.invalidate()
+    assert mongo.get("q") is None
+    assert sql.get("q") == "SELECT 1"
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import pytest
+from agents.chart_agent import lttb, density_sample, downsample_figure, encode_figure, decode_figure
+
+
+def test_lttb_keeps_the_endpoints_and_the_point_count():
+    x = np.arange(10000)
+    y = np.sin(x / 100.0)
+    kept = lttb(x, y, 500)
+    assert len(kept) == 500
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert (np.diff(kept) > 0).all()
+
+
+def test_lttb_keeps_the_peaks():
+    y = np.zeros(1000)
+    y[437] = 50.0
+    assert 437 in lttb(np.arange(1000), y, 50)
+
+
+def test_lttb_below_the_threshold_keeps_everything():
+    assert list(lttb(np.arange(5), np.arange(5), 10)) == [0, 1, 2, 3, 4]
+
+
+def test_density_sample_stays_within_the_budget_and_keeps_outliers():
+    rng = np.random.default_rng(0)
+    x, y = np.append(rng.normal(size=20000), 40.0), np.append(rng.normal(size=20000), 40.0)
+    kept = density_sample(x, y, 400)
+    assert 0 < len(kept) <= 400
+    assert len(x) - 1 in kept
+
+
+def test_downsample_figure_reduces_large_line_traces_only():
+    df = pd.DataFrame({"x": np.arange(3000), "y": np.random.default_rng(1).normal(size=3000)})
+    fig = px.line(df, x="x", y="y")
+    assert downsample_figure(fig, 100) == {0: (3000, 100)}
+    assert len(fig.data[0].x) == 100
+    assert downsample_figure(px.bar(df.head(10), x="x", y="y"), 5) == {}
+
+
+def test_encode_figure_round_trip(values):
+    df = pd.DataFrame({
+        "day": pd.date_range("2024-01-01", periods=4, freq="D"),
+        "orders": [3, 5, 2, 8],
+    })
+    fig = px.line(df, x="day", y="orders")
+    payload = encode_figure(fig, 0)
+    assert payload["format"] == "plotly+zlib" and payload["reduced"] == {}
+    decoded = decode_figure(payload)
+    assert values(decoded.data[0].y) == [3, 5, 2, 8]
+    assert decoded.layout.xaxis.type == "date"
+    days = pd.to_datetime(values(decoded.data[0].x), unit="ms")
+    assert list(days) == list(df["day"])
+
+
+def test_decode_figure_accepts_plain_json_and_rejects_unknown_formats(values):
+    fig = px.bar(x=["a", "b"], y=[1, 2])
+    assert values(decode_figure(fig.to_json()).data[0].y) == [1, 2]
+    with pytest.raises(ValueError):
+        decode_figure({"format": "png"})
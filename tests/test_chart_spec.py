@@ -0,0 +1,47 @@
+import pandas as pd
+from agents.chart_spec import resolve_chart_spec, build_chart, CHART_SPEC_MIN_CONFIDENCE
+
+
+ORDERS = pd.DataFrame({
+    "user_id": [1, 1, 2, 3],
+    "product_name": ["Seeds", "Olives", "Seeds", "Tea"],
+    "quantity": [2, 1, 5, 3],
+})
+
+
+def test_count_per_group():
+    spec = resolve_chart_spec("Plot a bar chart showing the total number of orders for each user.", ORDERS)
+    assert (spec["chart_type"], spec["x"], spec["agg"]) == ("bar", "user_id", "count")
+    fig, code = build_chart(spec, ORDERS)
+    assert list(fig.data[0].y) == [2, 1, 1]
+    assert "groupby" in code
+
+
+def test_already_aggregated_count_column_is_plotted():
+    totals = pd.DataFrame({"user_id": [1, 2], "total_orders": [2, 1]})
+    spec = resolve_chart_spec("Plot a bar chart showing the total number of orders per user", totals)
+    assert (spec["y"], spec["agg"]) == ("total_orders", "sum")
+
+
+def test_lone_value_column_is_plotted_instead_of_row_counts():
+    revenue = pd.DataFrame({"product_name": ["Seeds", "Tea"], "revenue": [120.0, 30.5]})
+    spec = resolve_chart_spec("Pie chart by product name", revenue)
+    assert (spec["chart_type"], spec["y"], spec["agg"]) == ("pie", "revenue", "sum")
+
+
+def test_unknown_values_leave_the_chart_to_the_llm():
+    data = pd.DataFrame({"product_name": ["Seeds", "Tea"], "revenue": [120.0, 30.5], "cost": [80.0, 10.0]})
+    spec = resolve_chart_spec("Bar chart by product name", data)
+    assert spec["confidence"] < CHART_SPEC_MIN_CONFIDENCE
+
+
+def test_mean_of_named_column():
+    spec = resolve_chart_spec("Line chart of the average quantity per product", ORDERS)
+    assert (spec["x"], spec["y"], spec["agg"]) == ("product_name", "quantity", "mean")
+    assert spec["confidence"] >= CHART_SPEC_MIN_CONFIDENCE
+
+
+def test_prompts_without_a_chart_or_a_known_column():
+    assert resolve_chart_spec("How many orders per user?", ORDERS) is None
+    assert resolve_chart_spec("Bar chart per warehouse", ORDERS) is None
+    assert resolve_chart_spec("Bar chart per user", ORDERS.iloc[:0]) is None
@@ -0,0 +1,60 @@
+import io
+import sqlite3
+import pytest
+import agents.file_store as file_store
+from agents.file_store import ingest_file, preview, table_name
+
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_store, "FILE_STORE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def column_types(path: str) -> dict:
+    conn = sqlite3.connect(path)
+    try:
+        return {row[1]: row[2] for row in conn.execute('PRAGMA table_info("sales")')}
+    finally:
+        conn.close()
+
+
+def load(text: str, chunk_rows: int = 2) -> str:
+    return ingest_file(io.BytesIO(text.encode("utf-8")), "Sales.csv", chunk_rows=chunk_rows)
+
+
+def test_table_name():
+    assert table_name("Sales 2024.csv") == "sales_2024"
+    assert table_name("2024.xlsx") == "t_2024"
+
+
+def test_same_content_reuses_the_store():
+    text = "id,amount\n1,2.5\n2,3.5\n"
+    assert load(text) == load(text)
+
+
+def test_integer_column_widened_to_real_on_a_later_chunk():
+    path = load("id,amount\n1,2\n2,3\n3,4.5\n")
+    assert column_types(path)["amount"] == "REAL"
+    df, count = preview(path)
+    assert count == 3 and df["amount"].tolist() == [2, 3, 4.5]
+
+
+def test_unparsed_numbers_widen_the_column_to_text():
+    path = load("id,code\n1,10\n2,20\n3,A123\n")
+    assert column_types(path)["code"] == "TEXT"
+    df, _ = preview(path)
+    assert df["code"].tolist() == ["10", "20", "A123"]
+
+
+def test_unparsed_timestamps_widen_the_column_to_text():
+    path = load("id,day\n1,2024-01-02\n2,2024-01-03\n3,soon\n")
+    assert column_types(path)["day"] == "TEXT"
+    df, _ = preview(path)
+    assert df["day"].tolist() == ["2024-01-02 00:00:00", "2024-01-03 00:00:00", "soon"]
+
+
+def test_empty_file_is_rejected(store_dir):
+    with pytest.raises(ValueError):
+        load("id,amount\n")
+    assert not list(store_dir.glob("*.tmp"))
@@ -0,0 +1,31 @@
+import pandas as pd
+import plotly.express as px
+from agents.history import ChatHistory
+
+
+def test_oldest_results_are_spilled_and_loaded_back(tmp_path, values):
+    history = ChatHistory(live_turns=1, directory=str(tmp_path))
+    df = pd.DataFrame({"user": ["a", "b"], "orders": [3, 5]})
+    fig = px.bar(df, x="user", y="orders")
+    history.append({"role": "user", "content": "orders per user"})
+    history.append({"role": "assistant", "type": "dataframe", "content": df})
+    history.append({"role": "user", "content": "chart it"})
+    history.append({"role": "assistant", "type": "chart", "content": fig})
+
+    table, chart = history.messages[1], history.messages[3]
+    assert table["question"] == "orders per user"
+    assert ChatHistory.is_spilled(table) and not ChatHistory.is_spilled(chart)
+    pd.testing.assert_frame_equal(history.load(table), df)
+    assert history.load(chart) is fig
+
+    history.append({"role": "assistant", "type": "chart", "content": px.bar(df, x="user", y="orders")})
+    assert ChatHistory.is_spilled(chart)
+    assert values(history.load(chart).data[0].y) == [3, 5]
+
+
+def test_clear_removes_the_spilled_files(tmp_path):
+    history = ChatHistory(live_turns=0, directory=str(tmp_path))
+    history.append({"role": "assistant", "type": "dataframe", "content": pd.DataFrame({"x": [1]})})
+    history.clear()
+    assert len(history) == 0
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,33 @@
+import pytest
+from agents.intent import intent_classifier, INTENT_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "Hello!",
+    "thanks",
+    "Tell me a joke",
+    "Write me a poem about the sea",
+    "What's the weather like today?",
+])
+def test_small_talk_is_answered_by_the_rules(text):
+    assert intent_classifier.classify(text) == ("other", 0.9)
+
+
+@pytest.mark.parametrize("text", [
+    "Hi, which products did user 12 order?",
+    "What is the weather impact on sales?",
+    "Show total sales per joke category",
+    "List the poem titles sold last month",
+    "Which customers ordered pumpkin pie?",
+])
+def test_data_questions_mentioning_small_talk_words_are_not_dropped(text):
+    label, confidence = intent_classifier.classify(text)
+    assert label == "database" or confidence < INTENT_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "Plot a pie chart of orders by gender",
+    "Draw a histogram of order quantities",
+])
+def test_chart_requests(text):
+    assert intent_classifier.classify(text) == ("chart", 0.95)
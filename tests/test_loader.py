@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from agents.loader import load_sql, _sql_statement, _run_batches
+
+
+def test_upsert_statement():
+    statement = _sql_statement("Users", ["user_id", "email"], "user_id", "upsert")
+    assert statement.endswith("ON CONFLICT (user_id) DO UPDATE SET email = excluded.email")
+    assert "ON CONFLICT" not in _sql_statement("Users", ["user_id", "email"], "user_id", "replace")
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_run_batches_counts_every_row(workers):
+    batches = (pd.DataFrame({"x": range(n)}) for n in (3, 4, 5, 6, 7))
+    assert _run_batches(batches, len, workers) == 25
+
+
+def test_load_sql_upserts_and_replaces(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sales.db'}")
+    first = load_sql(engine, "data_store", batch_size=50)
+    assert first["Users"] == len(pd.read_csv("data_store/users.csv"))
+    assert first["Orders"] == len(pd.read_csv("data_store/orders.csv"))
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE Users SET email = 'changed' WHERE user_id = 1"))
+    load_sql(engine, "data_store", batch_size=50, workers=1, mode="upsert")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT email FROM Users WHERE user_id = 1")).scalar() != "changed"
+        assert conn.execute(text("SELECT COUNT(*) FROM Orders")).scalar() == first["Orders"]
+
+    assert load_sql(engine, "data_store", batch_size=50, mode="replace") == first
+    engine.dispose()
@@ -0,0 +1,75 @@
+import asyncio
+import pandas as pd
+import pytest
+from agents.paging import PageStore, concat_pages
+
+
+class Cursor():
+    """Async page iterator recording whether it was closed."""
+
+    def __init__(self, pages: int, page_size: int = 2):
+        self.pages = [pd.DataFrame({"x": range(page_size)}) for _ in range(pages)]
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.pages:
+            raise StopAsyncIteration
+        return self.pages.pop(0)
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_pages_are_read_until_a_short_page():
+    async def run():
+        store, cursor = PageStore(), Cursor(2)
+        pages = []
+        page, token = await store.start(cursor, 2)
+        while token:
+            pages.append(page)
+            page, token = await store.next(token)
+        return pages, page, cursor.closed
+
+    pages, last, closed = asyncio.run(run())
+    assert len(pages) == 2 and last is None and closed
+
+
+def test_close_releases_the_cursor():
+    async def run():
+        store, cursor = PageStore(), Cursor(3)
+        _, token = await store.start(cursor, 2)
+        closed = await store.close(token)
+        with pytest.raises(ValueError):
+            await store.next(token)
+        return closed, cursor.closed, await store.close(token)
+
+    assert asyncio.run(run()) == (True, True, False)
+
+
+def test_oldest_cursor_is_closed_at_max_open():
+    async def run():
+        store = PageStore(max_open=2)
+        cursors = [Cursor(3) for _ in range(3)]
+        for cursor in cursors:
+            await store.start(cursor, 2)
+        return [cursor.closed for cursor in cursors]
+
+    assert asyncio.run(run()) == [True, False, False]
+
+
+def test_sweep_closes_expired_cursors():
+    async def run():
+        store, cursor = PageStore(ttl=0.01, sweep_interval=0.02), Cursor(3)
+        await store.start(cursor, 2)
+        await asyncio.sleep(0.1)
+        return cursor.closed
+
+    assert asyncio.run(run())
+
+
+def test_concat_pages():
+    assert concat_pages([None]).empty
+    assert len(concat_pages([pd.DataFrame({"x": [1]}), None, pd.DataFrame({"x": [2]})])) == 2
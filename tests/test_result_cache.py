@@ -0,0 +1,53 @@
+import pandas as pd
+from agents.result_cache import ResultCache, ResultCollector, normalize_sql, normalize_pipeline, iter_slices
+
+
+def test_normalize_sql_keeps_quoted_text():
+    assert normalize_sql("SELECT  *\n FROM Users WHERE name = 'a  b' ;") == "SELECT * FROM Users WHERE name = 'a  b'"
+
+
+def test_normalize_pipeline_keeps_stage_order():
+    assert normalize_pipeline("orders", [{"$match": {}}, {"$limit": 1}]) != normalize_pipeline(
+        "orders", [{"$limit": 1}, {"$match": {}}])
+
+
+def test_entries_are_served_for_their_data_version_only():
+    cache, df = ResultCache("test"), pd.DataFrame({"x": [1, 2]})
+    cache.set("q", df, "v1")
+    pd.testing.assert_frame_equal(cache.get("q", "v1"), df)
+    assert cache.get("q", "v2") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_results_are_evicted_by_size():
+    df = pd.DataFrame({"x": range(100)})
+    size = ResultCache("probe")
+    size.set("q", df, "v")
+    cache = ResultCache("test", max_bytes=size.bytes * 2)
+    cache.set("a", df, "v")
+    cache.set("b", df, "v")
+    cache.get("a", "v")
+    cache.set("c", df, "v")
+    assert cache.get("b", "v") is None
+    assert cache.get("a", "v") is not None and cache.get("c", "v") is not None
+
+
+def test_oversized_and_mixed_results():
+    cache = ResultCache("test", max_entry_bytes=1)
+    cache.set("big", pd.DataFrame({"x": range(100)}), "v")
+    assert cache.get("big", "v") is None
+    mixed = ResultCache("test")
+    mixed.set("docs", pd.DataFrame({"doc": [{"a": 1}, "text"]}), "v")
+    # Values Arrow can't hold come back in their wire form
+    assert mixed.get("docs", "v")["doc"].tolist() == ["{'a': 1}", "text"]
+
+
+def test_collector_caches_streamed_pages():
+    cache = ResultCache("test")
+    collector = ResultCollector(cache, "q", "v")
+    pages = list(iter_slices(pd.DataFrame({"x": range(5)}), 2))
+    assert [len(p) for p in pages] == [2, 2, 1]
+    for page in pages:
+        collector.add(page)
+    collector.store()
+    assert cache.get("q", "v")["x"].tolist() == [0, 1, 2, 3, 4]
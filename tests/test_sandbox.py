@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+from agents.sandbox import ChartSandbox, SandboxError, execute_chart_code
+
+
+DF = pd.DataFrame({"user": ["a", "b"], "orders": [3, 5]})
+
+
+def test_execute_chart_code_returns_the_last_expression_or_fig():
+    expression = "import plotly.express as px\npx.bar(df, x='user', y='orders')"
+    assignment = "import plotly.express as px\nfig = px.bar(df, x='user', y='orders')"
+    assert list(execute_chart_code(expression, DF).data[0].y) == [3, 5]
+    assert list(execute_chart_code(assignment, DF).data[0].y) == [3, 5]
+    assert execute_chart_code("total = df['orders'].sum()", DF) is None
+
+
+@pytest.fixture(scope="module")
+def sandbox():
+    sandbox = ChartSandbox(workers=1, timeout=20, start_method="spawn")
+    yield sandbox
+    sandbox.close()
+
+
+def test_sandbox_runs_chart_code_in_a_worker(sandbox, values):
+    fig = sandbox.run("import plotly.express as px\npx.bar(df, x='user', y='orders')", DF)
+    assert values(fig.data[0].y) == [3, 5]
+    assert sandbox.run("raise ValueError('bad code')", DF) is None
+
+
+def test_sandbox_kills_runs_past_the_timeout(sandbox):
+    with pytest.raises(SandboxError):
+        sandbox.run("while True:\n    pass", DF, timeout=1)
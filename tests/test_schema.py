@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+from agents.schema import SQLSchemaContext
+
+
+def make_context():
+    # An in-memory database has no `PRAGMA data_version` to follow, its row counts are polled
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE Users (user_id INTEGER PRIMARY KEY, email TEXT)"))
+        conn.execute(text("CREATE TABLE Orders (order_id INTEGER PRIMARY KEY, user_id INTEGER)"))
+        conn.execute(text("INSERT INTO Users VALUES (1, 'a@example.com')"))
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    return SQLSchemaContext(engine), statements
+
+
+def test_referenced_tables():
+    schema, _ = make_context()
+    assert schema.referenced_tables("SELECT COUNT(*) FROM orders") == ["Orders"]
+    assert schema.referenced_tables("SELECT * FROM sales_view") is None
+
+
+def test_data_version_counts_only_referenced_tables():
+    schema, statements = make_context()
+    schema.data_version("SELECT email FROM Users")
+    counts = [statement for statement in statements if "COUNT(*)" in statement]
+    assert counts == ['SELECT COUNT(*) FROM "Users"']
+
+
+def test_data_version_follows_the_referenced_tables(monkeypatch):
+    monkeypatch.setattr("agents.schema.DATA_CHECK_INTERVAL", 0)
+    schema, _ = make_context()
+    users, orders = schema.data_version("SELECT * FROM Users"), schema.data_version("SELECT * FROM Orders")
+    with schema.engine.begin() as conn:
+        conn.execute(text("INSERT INTO Orders VALUES (1, 1)"))
+    assert schema.data_version("SELECT * FROM Users") == users
+    assert schema.data_version("SELECT * FROM Orders") != orders
+
+
+def test_concurrent_polls_count_once():
+    schema, statements = make_context()
+    threads = [threading.Thread(target=schema.data_version, args=("SELECT * FROM Users",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum("COUNT(*)" in statement for statement in statements) == 1
+
+
+def test_async_execution_versions_the_query_like_the_sync_one(tmp_path, monkeypatch):
+    from agents.sql_agent import SQLAgent
+
+    path = tmp_path / "sales.db"
+    with create_engine(f"sqlite:///{path}").begin() as conn:
+        conn.execute(text("CREATE TABLE Users (user_id INTEGER PRIMARY KEY, email TEXT)"))
+        conn.execute(text("INSERT INTO Users VALUES (1, 'a@example.com')"))
+    agent = SQLAgent(None, f"sqlite:///{path}")
+    calls = []
+    data_version = agent.schema.data_version
+    monkeypatch.setattr(agent.schema, "data_version", lambda *args: calls.append(args) or data_version(*args))
+    state = {"query": "SELECT email FROM Users", "query_valid": True}
+    hits = agent.results.hits
+
+    agent.execute_query(state)
+    asyncio.run(agent.aexecute_query(state))
+
+    async def read_pages():
+        return [page async for page in agent.aexecute_query_pages(state)]
+
+    asyncio.run(read_pages())
+    assert calls == [(state["query"],)] * 3
+    # The async paths are served the result cached by the sync one
+    assert agent.results.hits - hits == 2
+    agent.close()
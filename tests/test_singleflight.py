@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from agents.singleflight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_result():
+    flight, calls = SingleFlight("test"), []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"rows": 3}
+
+    async def run():
+        results = await asyncio.gather(flight.do("k", call), flight.do("k", call), flight.do("other", call))
+        return results, flight.in_flight()
+
+    results, in_flight = asyncio.run(run())
+    assert len(calls) == 2
+    assert results[0] is results[1]
+    assert in_flight == 0
+
+
+def test_errors_reach_every_caller_and_release_the_key():
+    flight = SingleFlight("test")
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(flight.do("k", call), flight.do("k", call), return_exceptions=True)
+
+    assert [type(r) for r in asyncio.run(run())] == [ValueError, ValueError]
+    assert flight.in_flight() == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_call():
+    flight = SingleFlight("test")
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(flight.do("k", call))
+        second = asyncio.create_task(flight.do("k", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
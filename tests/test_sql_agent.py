@@ -0,0 +1,22 @@
+import asyncio
+import sqlite3
+from agents import sql_agent
+
+
+def test_close_on_the_event_loop_keeps_the_dispose_task(tmp_path):
+    path = tmp_path / "sales.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Users (user_id INTEGER PRIMARY KEY)")
+    conn.close()
+    agent = sql_agent.SQLAgent(None, f"sqlite:///{path}")
+
+    async def close():
+        async with agent.async_engine.connect():
+            pass
+        agent.close()
+        pending = set(sql_agent._dispose_tasks)
+        await asyncio.gather(*pending)
+        return pending
+
+    assert len(asyncio.run(close())) == 1
+    assert not sql_agent._dispose_tasks
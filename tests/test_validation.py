@@ -0,0 +1,47 @@
+import sqlite3
+import pytest
+from sqlalchemy import create_engine
+from agents.validation import validate_sql
+
+
+@pytest.fixture
+def engine(tmp_path):
+    path = tmp_path / "sales.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """CREATE TABLE Users (user_id INTEGER PRIMARY KEY, email TEXT);
+        CREATE TABLE Orders (order_id INTEGER PRIMARY KEY, user_id INTEGER, quantity INTEGER);
+        INSERT INTO Users VALUES (1, 'a@example.com');
+        INSERT INTO Orders VALUES (1, 1, 2);"""
+    )
+    conn.commit()
+    conn.close()
+    return create_engine(f"sqlite:///{path}")
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT user_id, SUM(quantity) FROM Orders GROUP BY user_id",
+    "WITH totals AS (SELECT user_id, SUM(quantity) AS q FROM Orders GROUP BY user_id) SELECT * FROM totals",
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3) SELECT * FROM n",
+])
+def test_read_queries_are_valid(engine, query):
+    assert validate_sql(engine, query) == (True, "")
+
+
+@pytest.mark.parametrize("query", [
+    "WITH x AS (SELECT 1) DELETE FROM Orders WHERE order_id IN (SELECT * FROM x)",
+    "WITH t AS (SELECT 1) UPDATE Users SET email = 'x'",
+    "WITH t AS (SELECT 1) INSERT INTO Users (user_id) SELECT * FROM t",
+    "DELETE FROM Orders",
+    "DROP TABLE Orders",
+])
+def test_writes_are_rejected(engine, query):
+    valid, error = validate_sql(engine, query)
+    assert valid is False
+    assert error
+
+
+def test_rejected_write_leaves_data_untouched(engine):
+    validate_sql(engine, "WITH x AS (SELECT 1) DELETE FROM Orders")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM Orders").scalar() == 1
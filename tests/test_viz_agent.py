@@ -0,0 +1,36 @@
+import time
+import asyncio
+import pandas as pd
+import plotly.express as px
+from agents import viz_agent
+from agents.results import encode_frame, content_fingerprint
+
+
+def test_content_fingerprint_ignores_the_envelope():
+    df = pd.DataFrame({"user": ["a", "b"], "orders": [3, 5]})
+    assert content_fingerprint(df) == content_fingerprint(df.copy())
+    assert content_fingerprint(df) != content_fingerprint(df.assign(orders=[3, 6]))
+    nested = pd.DataFrame({"doc": [{"a": 1}, {"a": 2}]})
+    assert content_fingerprint(nested) != content_fingerprint(pd.DataFrame({"doc": [{"a": 1}, {"a": 3}]}))
+
+
+def test_identical_ref_requests_share_one_chart(monkeypatch):
+    calls = []
+
+    def generate_chart(prompt, frame):
+        calls.append(prompt)
+        time.sleep(0.2)
+        return px.bar(frame, x="user", y="orders"), "fig = px.bar(df, x='user', y='orders')"
+
+    monkeypatch.setattr(viz_agent, "generate_chart", generate_chart)
+    create_chart = getattr(viz_agent.create_chart, "fn", viz_agent.create_chart)
+    df = pd.DataFrame({"user": ["a", "b"], "orders": [3, 5]})
+
+    async def run():
+        return await asyncio.gather(*(
+            create_chart("Bar chart of orders per user", data=encode_frame(df, "ref")) for _ in range(2)
+        ))
+
+    (first, _), (second, _) = asyncio.run(run())
+    assert calls == ["Bar chart of orders per user"]
+    assert first == second